@@ -0,0 +1,68 @@
+# Cost of archiving the items deleted by the table TTL, per stream batch size.
+#
+# Builds REMOVE records from the stream fixture and archives them with Archive, batch by
+# batch, into an in-memory store. Reports the number of objects written (S3 PUT requests)
+# and the stored size per 1000 items, and the CPU time per item, for a batch size of 1
+# (one object per deleted item) up to the 1000 records of the DDBArchive event source.
+#
+#   python benchmarks/archive.py --items 20000
+import copy
+import time
+import random
+import argparse
+
+import support
+from database_stream import archive
+
+WORDS = 'merci bonjour coaching séance programme nutrition objectif semaine motivation question'.split()
+
+class MemoryStore:
+
+    def __init__(self):
+        self.objects = {}
+
+    def put(self, key, data):
+        self.objects[key] = data
+
+def records(count, seed=1):
+    rng = random.Random(seed)
+    insert = next(r for r in support.load_event('event-streaming-multiple.json')['Records'] if r['eventName'] == 'INSERT')
+    result = []
+    for i in range(count):
+        image = copy.deepcopy(insert['dynamodb']['NewImage'])
+        image['sk'] = { 'S': f'user{i}@example.com' }
+        image['message'] = { 'S': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(5, 80))) }
+        result.append({
+            'eventName': 'REMOVE',
+            'userIdentity': dict(archive.TTL_IDENTITY),
+            'dynamodb': {
+                'ApproximateCreationDateTime': 1603709167 + i,
+                'Keys': { 'pk': image['pk'], 'sk': image['sk'] },
+                'OldImage': image,
+                'SequenceNumber': str(3133900000000004608185000 + i),
+            },
+        })
+    return result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=20000)
+    args = parser.parse_args()
+
+    expired = records(args.items)
+    raw = sum(len(archive.line(r).encode('utf-8')) for r in expired)
+    print(f'{args.items} expired items, {raw / args.items:.0f} bytes per JSON line')
+    for batch_size in (1, 10, 100, 1000):
+        store = MemoryStore()
+        writer = archive.Archive(store)
+        start = time.process_time()
+        for i in range(0, len(expired), batch_size):
+            writer.write(expired[i:i + batch_size])
+        elapsed = time.process_time() - start
+        stored = sum(len(data) for data in store.objects.values())
+        print(f'  batch {batch_size:>5}: {len(store.objects) * 1000 / args.items:7.1f} PUT per 1000 items '
+              f'{stored * 1000 / args.items / 1024:8.1f} KB stored per 1000 items ({stored / raw:4.0%} of JSON) '
+              f'cpu={elapsed / args.items * 1e6:6.1f}µs per item')
+
+if __name__ == '__main__':
+    main()
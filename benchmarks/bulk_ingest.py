@@ -0,0 +1,53 @@
+# Ingestion throughput of the single item route vs. the bulk route, against DynamoDB Local.
+#
+#   ./create_table.sh
+#   python benchmarks/bulk_ingest.py --submissions 2000
+import os
+import copy
+import time
+import argparse
+from urllib.parse import urlencode
+
+import support
+from form_data_collect import app
+
+def form(i):
+    return urlencode({ 'pk': 'bench.bulk_page', 'sk': 'email', 'name': f'user {i}', 'email': f'user{i}@example.com' })
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--submissions', type=int, default=2000)
+    parser.add_argument('--per-request', type=int, default=1000, help='submissions per bulk request')
+    parser.add_argument('--table', default='nata-data-collection-form')
+    args = parser.parse_args()
+
+    os.environ['TABLE_NAME'] = args.table
+    os.environ['MAX_BULK_SUBMISSIONS'] = str(args.per_request)
+    os.environ.pop('AWS_EXECUTION_ENV', None)
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'local')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'local')
+
+    template = support.load_event('event-api.json')
+    template['isBase64Encoded'] = False
+    forms = [ form(i) for i in range(args.submissions) ]
+
+    start = time.perf_counter()
+    for body in forms:
+        event = copy.deepcopy(template)
+        event['body'] = body
+        app.lambda_handler(event, None)
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(0, len(forms), args.per_request):
+        event = copy.deepcopy(template)
+        event['routeKey'] = app.BULK_ROUTE
+        event['body'] = '\n'.join(forms[i:i + args.per_request])
+        app.lambda_handler(event, None)
+    batched = time.perf_counter() - start
+
+    print(f'single item route : {args.submissions / single:10.1f} submissions/s ({single:.2f}s)')
+    print(f'bulk route        : {args.submissions / batched:10.1f} submissions/s ({batched:.2f}s)')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+# Cold start of both Lambda handlers: handler module import time and first invoke.
+#
+# Every measurement runs in a fresh interpreter. Import times come from
+# `python -X importtime`, the first invoke is timed inside the same process,
+# against DynamoDB Local for the form function and a local SNS stand-in for
+# the stream function.
+#
+#   ./create_table.sh
+#   python benchmarks/coldstart.py --runs 5
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+import support
+from tests.standins import SNSStandIn
+
+PROBE = '''
+import sys, json, time
+sys.path.insert(0, {src!r})
+start = time.perf_counter()
+import {module} as app
+imported = time.perf_counter()
+with open({event!r}) as f:
+    event = json.load(f)
+app.lambda_handler(event, None)
+invoked = time.perf_counter()
+print(json.dumps({{ 'import': imported - start, 'first_invoke': invoked - imported }}))
+'''
+
+HANDLERS = [
+    ('form_data_collect.app', 'event-api.json'),
+    ('database_stream.app', 'event-streaming.json'),
+]
+
+def importtime(module):
+    """ cumulative import time of the handler module and its heaviest dependencies, in ms """
+    code = f'import sys; sys.path.insert(0, {support.SRC!r}); import {module}'
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            capture_output=True, text=True, check=True).stderr
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line.split(':', 1)[1].split('|')
+        entries.append((name.strip(), int(self_us) / 1000.0, int(cumulative_us) / 1000.0))
+    total = next(c for name, _, c in entries if name == module)
+    heaviest = sorted(entries, key=lambda e: e[1], reverse=True)[:5]
+    return total, heaviest
+
+def probe(module, event, env):
+    code = PROBE.format(src=support.SRC, module=module, event=os.path.join(support.EVENTS, event))
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True, env=env).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.pop('AWS_EXECUTION_ENV', None)
+    env.setdefault('AWS_ACCESS_KEY_ID', 'local')
+    env.setdefault('AWS_SECRET_ACCESS_KEY', 'local')
+    env['TABLE_NAME'] = env.get('TABLE_NAME', 'nata-data-collection-form')
+    env['SNS_TOPIC_ARN'] = 'arn:aws:sns:eu-central-1:123456789012:DataCollectionTopic'
+    env.pop('UNIT_TEST_PROFILE', None)
+
+    with SNSStandIn() as sns:
+        env['SNS_ENDPOINT_URL'] = sns.endpoint
+
+        for module, event in HANDLERS:
+            total, heaviest = importtime(module)
+            print(f'{module}: -X importtime cumulative {total:.1f}ms, heaviest modules (self time):')
+            for name, self_ms, _ in heaviest:
+                print(f'    {name:<40} {self_ms:7.1f}ms')
+
+            runs = [ probe(module, event, env) for _ in range(args.runs) ]
+            support.report(f'{module} import', [ r['import'] for r in runs ])
+            support.report(f'{module} first invoke', [ r['first_invoke'] for r in runs ])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+# Write units saved by COMPRESSION, and what compressing and decompressing costs.
+#
+# Items are built by prepare_item from the API fixture, with the projected and with the
+# full event (EVENT_PROJECTION=ALL), and from synthetic submissions with a free text
+# message of 200 bytes to 20 KB. Reports the mean item size and WCU per put_item (1 KB
+# units) for each setting, the CPU time of encode_item and of reading the item back.
+#
+#   python benchmarks/compression.py --items 2000
+import os
+import math
+import time
+import random
+import argparse
+
+import support
+from event_projection import item_size
+from common import codec
+from form_data_collect import app, dynamodb
+
+WORDS = ('merci bonjour coaching séance programme nutrition objectif semaine motivation question '
+         'disponible rendez-vous entreprise équipe leadership stress sommeil énergie habitude').split()
+
+def message(rng, size):
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)
+
+def items(count, seed=1):
+    rng = random.Random(seed)
+    event = support.load_event('event-api.json')
+    os.environ.pop('COMPRESSION', None)
+    result = { 'fixture, projected event': [], 'fixture, full event': [], 'long text, projected event': [] }
+    for i in range(count):
+        data = { 'pk': 'nata.coach.landing_page', 'sk': 'email', 'name': 'seb', 'email': f'user{i}@example.com' }
+        os.environ['EVENT_PROJECTION'] = app.projection.DEFAULT_EVENT_PROJECTION
+        result['fixture, projected event'].append(app.prepare_item(event, dict(data)))
+        result['long text, projected event'].append(app.prepare_item(event, dict(data, message=message(rng, int(200 * 100 ** rng.random())))))
+        os.environ['EVENT_PROJECTION'] = 'ALL'
+        result['fixture, full event'].append(app.prepare_item(event, dict(data)))
+    os.environ.pop('EVENT_PROJECTION')
+    return result
+
+def wcu(item):
+    return int(math.ceil(item_size(item) / 1024.0))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=2000)
+    args = parser.parse_args()
+
+    settings = [ ('off', None) ]
+    for threshold in (256, 1024):
+        for level in (1, 6):
+            settings.append((f'zlib {level}, >= {threshold}B', codec.Codec(threshold, codec.ZLIB, level)))
+    try:
+        import zstandard
+        settings.append(('zstd 3, >= 256B', codec.Codec(256, codec.ZSTD, 3)))
+    except ImportError:
+        print('zstandard is not installed, zstd is not measured')
+
+    for label, originals in items(args.items).items():
+        print(label)
+        baseline = sum(wcu(item) for item in originals)
+        for name, compression in settings:
+            start = time.perf_counter()
+            encoded = originals if compression is None else [ compression.encode_item(item) for item in originals ]
+            encode_time = time.perf_counter() - start
+            # what a reader pays: the typed item back to Python values
+            typed = [ dynamodb.serialize_item(item) for item in encoded ]
+            start = time.perf_counter()
+            for item in typed:
+                dynamodb.deserialize_item(item)
+            decode_time = time.perf_counter() - start
+            units = sum(wcu(item) for item in encoded)
+            size = sum(item_size(item) for item in encoded) / len(encoded)
+            print(f'  {name:<20} {size:8.0f} bytes {units / len(encoded):5.2f} WCU ({1 - units / baseline:4.0%} saved) '
+                  f'encode={encode_time / len(encoded) * 1e6:7.1f}µs read={decode_time / len(encoded) * 1e6:7.1f}µs per item')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+# Stream image decoder vs. boto3 TypeDeserializer.
+#
+# The events/event-streaming-multiple.json records are replicated to --records
+# images. "notification fields" reads pk, name and sk only, which is what the
+# stream handler needs, "full" materialises every attribute including the
+# nested event map.
+#
+#   python benchmarks/decoder.py --records 10000
+import argparse
+
+import support
+from boto3.dynamodb.types import TypeDeserializer
+from database_stream.decoder import Image
+
+FIELDS = ('pk', 'name', 'sk')
+
+def synthesise(count):
+    event = support.load_event('event-streaming-multiple.json')
+    templates = [ r['dynamodb']['NewImage'] for r in event['Records'] ]
+    return [ templates[i % len(templates)] for i in range(count) ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--records', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    images = synthesise(args.records)
+    deserializer = TypeDeserializer()
+
+    def boto3_full():
+        return [ { k: deserializer.deserialize(v) for k, v in typed.items() } for typed in images ]
+
+    def boto3_fields():
+        # TypeDeserializer has no lazy mode, every consumer decodes the whole image
+        return [ [ d[f] for f in FIELDS ] for d in boto3_full() ]
+
+    def decoder_full():
+        return [ Image(typed).to_dict() for typed in images ]
+
+    def decoder_fields():
+        return [ [ image.get(f) for f in FIELDS ] for image in map(Image, images) ]
+
+    assert boto3_fields() == decoder_fields()
+
+    support.report('TypeDeserializer, full', [support.timed(boto3_full) for _ in range(args.repeat)])
+    support.report('decoder, full', [support.timed(decoder_full) for _ in range(args.repeat)])
+    support.report('TypeDeserializer, notif. fields', [support.timed(boto3_fields) for _ in range(args.repeat)])
+    support.report('decoder, notification fields', [support.timed(decoder_fields) for _ in range(args.repeat)])
+
+if __name__ == '__main__':
+    main()
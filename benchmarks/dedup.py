@@ -0,0 +1,73 @@
+# Deduplication hit rate and saved writes on a replay of submissions with retries.
+#
+# Every submission is replayed --retries extra times (double clicks, front-end
+# retries), the writes reaching DynamoDB Local are counted for each DEDUP_MODE.
+#
+#   python benchmarks/dedup.py --submissions 200 --retries 2
+import os
+import copy
+import time
+import argparse
+from urllib.parse import urlencode
+
+import support
+from form_data_collect import app
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--submissions', type=int, default=200)
+    parser.add_argument('--retries', type=int, default=2)
+    parser.add_argument('--table', default='nata-data-collection-form')
+    args = parser.parse_args()
+
+    os.environ['TABLE_NAME'] = args.table
+    os.environ.pop('AWS_EXECUTION_ENV', None)
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'local')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'local')
+
+    template = support.load_event('event-api.json')
+    template['isBase64Encoded'] = False
+
+    events = []
+    for i in range(args.submissions):
+        body = urlencode({ 'pk': 'bench.dedup_page', 'sk': 'email', 'name': f'user {i}', 'email': f'user{i}@example.com' })
+        for _ in range(1 + args.retries):
+            event = copy.deepcopy(template)
+            event['body'] = body
+            events.append(event)
+
+    table = app.dynamodb_table(args.table)
+    for mode in ('off', 'local', 'conditional'):
+        os.environ['DEDUP_MODE'] = mode
+        app.dedup.cache.clear()
+        app.dedup.stats.reset()
+
+        # count the calls actually sent to DynamoDB
+        put_item = table.put_item
+        calls = []
+        def counting_put_item(**kwargs):
+            calls.append(1)
+            return put_item(**kwargs)
+        table.put_item = counting_put_item
+
+        start = time.perf_counter()
+        for event in events:
+            app.lambda_handler(copy.deepcopy(event), None)
+        elapsed = time.perf_counter() - start
+        table.put_item = put_item
+
+        stats = app.dedup.stats.as_dict()
+        print(f'{mode:<12} requests={len(events)} put_item={len(calls)} '
+              f'hit_rate={stats["hit_rate"]:.2f} saved_writes={stats["saved_writes"]} elapsed={elapsed:.2f}s')
+
+        # a new container: the conditional write still catches duplicates across instances
+        if mode == 'conditional':
+            app.dedup.cache.clear()
+            app.dedup.stats.reset()
+            for event in events[:args.retries + 1]:
+                app.lambda_handler(copy.deepcopy(event), None)
+            stats = app.dedup.stats.as_dict()
+            print(f'{"cold cache":<12} replays={args.retries + 1} conditional_hits={stats["conditional_hits"]} local_hits={stats["local_hits"]}')
+
+if __name__ == '__main__':
+    main()
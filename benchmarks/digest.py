@@ -0,0 +1,62 @@
+# SNS publish calls for a burst of sign-ups, per batch vs. digest mode.
+#
+# Replays the events/event-streaming-multiple.json records as --batches stream
+# batches spread over --minutes simulated minutes, on --pages landing pages.
+# SNS is a local stand-in and the digest buffer a local file.
+#
+#   python benchmarks/digest.py --batches 2000 --minutes 60
+import os
+import copy
+import tempfile
+import argparse
+
+import support
+from tests.standins import SNSStandIn
+from database_stream import app
+
+def batches(count, pages):
+    event = support.load_event('event-streaming-multiple.json')
+    for i in range(count):
+        batch = copy.deepcopy(event)
+        for n, record in enumerate(batch['Records']):
+            record['dynamodb']['NewImage']['pk'] = { 'S': f'page-{(i + n) % pages}' }
+            record['dynamodb']['NewImage']['sk'] = { 'S': f'user-{i}-{n}@example.com' }
+        yield batch
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--batches', type=int, default=2000)
+    parser.add_argument('--minutes', type=int, default=60)
+    parser.add_argument('--pages', type=int, default=3)
+    parser.add_argument('--window', type=int, default=900, help='DIGEST_WINDOW, in seconds')
+    args = parser.parse_args()
+
+    os.environ['SNS_TOPIC_ARN'] = 'arn:aws:sns:eu-central-1:123456789012:DataCollectionTopic'
+    os.environ.pop('UNIT_TEST_PROFILE', None)
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'local')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'local')
+    os.environ['DIGEST_WINDOW'] = str(args.window)
+    os.environ['DIGEST_MAX_SIZE'] = '1000'
+
+    clock = [ 0.0 ]
+    app.now = lambda: clock[0]
+    step = args.minutes * 60.0 / args.batches
+
+    with SNSStandIn() as sns, tempfile.TemporaryDirectory() as tmp:
+        os.environ['SNS_ENDPOINT_URL'] = sns.endpoint
+        os.environ['DIGEST_FILE'] = os.path.join(tmp, 'digest.json')
+
+        for mode in ('off', 'on'):
+            os.environ['DIGEST_MODE'] = mode
+            published = len(sns.published)
+            clock[0] = 0.0
+            for batch in batches(args.batches, args.pages):
+                app.lambda_handler(batch, None)
+                clock[0] += step
+            # the final scheduled flush
+            clock[0] += args.window
+            app.lambda_handler({ 'source': 'aws.events' }, None)
+            print(f'DIGEST_MODE={mode:<4} batches={args.batches} publish calls={len(sns.published) - published}')
+
+if __name__ == '__main__':
+    main()
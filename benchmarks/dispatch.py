@@ -0,0 +1,66 @@
+# Stream batch latency with several notification targets, delivered one after the other
+# (DISPATCH_MAX_WORKERS=1) or concurrently.
+#
+# Every page of the batch has its own route: a JSON SNS topic (PublishBatch), an SQS queue
+# (SendMessageBatch) and a webhook, all local stand-ins answering after --latency seconds.
+# Reports the batch latency and the latency of each target type.
+#
+#   python benchmarks/dispatch.py --batches 100 --latency 0.02
+import os
+import copy
+import json
+import argparse
+
+import support
+from tests.standins import SNSStandIn, SQSStandIn, WebhookStandIn
+from database_stream import app
+
+PAGES = [ 'nata.coach.landing_page', 'nata.coach.newsletter', 'nata.coach.webinar' ]
+
+def batch(size):
+    template = next(r for r in support.load_event('event-streaming-multiple.json')['Records'] if r['eventName'] == 'INSERT')
+    records = []
+    for i in range(size):
+        record = copy.deepcopy(template)
+        record['dynamodb']['NewImage']['pk'] = { 'S': PAGES[i % len(PAGES)] }
+        record['dynamodb']['NewImage']['sk'] = { 'S': f'user{i}@example.com' }
+        record['dynamodb']['SequenceNumber'] = str(10 ** 20 + i)
+        records.append(record)
+    return { 'Records': records }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batches', type=int, default=100)
+    parser.add_argument('--batch-size', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.02, help='stand-in latency in seconds')
+    args = parser.parse_args()
+
+    os.environ.update({ 'METRICS_SINK': 'off', 'AWS_ACCESS_KEY_ID': 'local', 'AWS_SECRET_ACCESS_KEY': 'local',
+                        'SNS_TOPIC_ARN': 'arn:aws:sns:eu-central-1:000000000000:default' })
+    os.environ.pop('UNIT_TEST_PROFILE', None)
+    event = batch(args.batch_size)
+
+    with SNSStandIn(args.latency) as sns, SQSStandIn(args.latency) as sqs, WebhookStandIn(args.latency) as webhook:
+        os.environ['SNS_ENDPOINT_URL'] = sns.endpoint
+        os.environ['SQS_ENDPOINT_URL'] = sqs.endpoint
+        os.environ['NOTIFICATION_ROUTES'] = json.dumps({ page: [
+            { 'type': 'sns', 'topic_arn': f'arn:aws:sns:eu-central-1:000000000000:{page}', 'format': 'json' },
+            { 'type': 'sqs', 'queue_url': f'{sqs.endpoint}/000000000000/{page}' },
+            { 'type': 'webhook', 'url': f'{webhook.endpoint}/{page}' },
+        ] for page in PAGES })
+
+        for workers in [ 1, 4, 16 ]:
+            os.environ['DISPATCH_MAX_WORKERS'] = str(workers)
+            app.lambda_handler(event, None)
+            targets = {}
+            def run():
+                response = app.lambda_handler(event, None)
+                assert response['status'] == 'OK', response
+                for target in response['targets']:
+                    targets.setdefault(target['target'].split(':')[0], []).append(target['ms'] / 1000)
+            support.report(f'{workers:>2} workers, batch', [ support.timed(run) for _ in range(args.batches) ])
+            for kind, samples in sorted(targets.items()):
+                support.report(f'{workers:>2} workers, {kind}', samples)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+# Cold vs. warm request cost of form_data_collect against DynamoDB Local.
+#
+# "cold" drops the cached boto3 session/resource/Table before every request,
+# which is what every request paid before the module level cache existed.
+#
+#   ./create_table.sh
+#   python benchmarks/dynamodb_cache.py --requests 200
+import os
+import argparse
+
+import support
+from form_data_collect import app
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--table', default='nata-data-collection-form')
+    args = parser.parse_args()
+
+    os.environ['TABLE_NAME'] = args.table
+    os.environ.pop('AWS_EXECUTION_ENV', None)
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'local')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'local')
+
+    event = support.load_event('event-api.json')
+
+    def cold():
+        app.reset_cache()
+        app.lambda_handler(event, None)
+
+    def warm():
+        app.lambda_handler(event, None)
+
+    # one request to warm up DynamoDB Local itself
+    warm()
+
+    support.report('cold (new session per request)', [support.timed(cold) for _ in range(args.requests)])
+    support.report('warm (cached table)', [support.timed(warm) for _ in range(args.requests)])
+
+if __name__ == '__main__':
+    main()
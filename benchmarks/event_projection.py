@@ -0,0 +1,69 @@
+# Item size and write throughput with the full API Gateway event vs. a projected one.
+#
+# Sizes follow the DynamoDB item size rules, WCU is the number of 1 KB write units
+# for one put_item. With --requests, items are also written to DynamoDB Local.
+#
+#   python benchmarks/event_projection.py --requests 500
+import os
+import math
+import argparse
+from decimal import Decimal
+
+import support
+from form_data_collect import app
+
+def value_size(value):
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    if isinstance(value, bool) or value is None:
+        return 1
+    if isinstance(value, (int, float, Decimal)):
+        digits = len(str(abs(value)).replace('.', '').lstrip('0')) or 1
+        return int(math.ceil(digits / 2.0)) + 1
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return 3 + sum(len(k.encode('utf-8')) + value_size(v) + 1 for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return 3 + sum(value_size(v) + 1 for v in value)
+    raise TypeError(type(value))
+
+def item_size(item):
+    return sum(len(k.encode('utf-8')) + value_size(v) for k, v in item.items())
+
+def build_item(event, projection, raw):
+    os.environ['EVENT_PROJECTION'] = projection
+    os.environ['EVENT_RAW_STORAGE'] = raw
+    data = { 'pk': 'nata.coach.landing_page', 'sk': 'email', 'name': 'seb', 'email': 'seb@stormacq.com' }
+    return app.prepare_item(event, data)
+
+CONFIGURATIONS = [
+    ('full event', 'ALL', 'none'),
+    ('projected event', app.projection.DEFAULT_EVENT_PROJECTION, 'none'),
+    ('projected + compressed raw', app.projection.DEFAULT_EVENT_PROJECTION, 'compressed'),
+]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=0, help='put_item calls per configuration against DynamoDB Local')
+    parser.add_argument('--table', default='nata-data-collection-form')
+    args = parser.parse_args()
+
+    event = support.load_event('event-api.json')
+    for label, projection, raw in CONFIGURATIONS:
+        size = item_size(build_item(event, projection, raw))
+        print(f'{label:<28} {size:6d} bytes {int(math.ceil(size / 1024.0))} WCU')
+
+    if args.requests:
+        os.environ['TABLE_NAME'] = args.table
+        os.environ.pop('AWS_EXECUTION_ENV', None)
+        os.environ.setdefault('AWS_ACCESS_KEY_ID', 'local')
+        os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'local')
+        for label, projection, raw in CONFIGURATIONS:
+            os.environ['EVENT_PROJECTION'] = projection
+            os.environ['EVENT_RAW_STORAGE'] = raw
+            samples = [ support.timed(app.lambda_handler, event, None) for _ in range(args.requests) ]
+            support.report(label, samples)
+
+if __name__ == '__main__':
+    main()
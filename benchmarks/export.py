@@ -0,0 +1,68 @@
+# Export throughput against DynamoDB Local: parallel Scan with 1 to --segments segments,
+# with and without a projection skipping the stored event, and a per page Query.
+#
+# --seed writes --items submissions first (about 1KB each, with a projected event),
+# spread over 10 pages. Exports are written as JSON lines to /dev/null.
+#
+#   ./create_table.sh
+#   python benchmarks/export.py --seed --items 100000
+import os
+import time
+import argparse
+
+import support
+from form_data_collect import app, bulk, dynamodb, export
+
+TABLE = 'nata-data-collection-form'
+
+def seed(count):
+    resource = app.dynamodb_resource()
+    event = support.load_event('event-api.json')
+    batch = []
+    for i in range(count):
+        batch.append({
+            'pk': f'bench.export_page_{i % 10}', 'sk': f'user{i}@example.com', 'created_at': 1603709167 + i,
+            'name': f'user {i}', 'email': f'user{i}@example.com', 'event': app.projection.project_event(event)
+        })
+        if len(batch) == 1000:
+            bulk.batch_write(resource, TABLE, batch)
+            batch = []
+    bulk.batch_write(resource, TABLE, batch)
+
+def run(label, items):
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as output:
+        count = export.export(items, export.JSONLinesWriter(output))
+    elapsed = time.perf_counter() - start
+    print(f'{label:<40} items={count:<8} {elapsed:7.2f}s {count / elapsed:9.0f} items/s')
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seed', action='store_true')
+    parser.add_argument('--items', type=int, default=100000)
+    parser.add_argument('--segments', type=int, default=8)
+    args = parser.parse_args()
+
+    os.environ.pop('AWS_EXECUTION_ENV', None)
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'local')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'local')
+
+    if args.seed:
+        start = time.perf_counter()
+        seed(args.items)
+        print(f'seeded {args.items} items in {time.perf_counter() - start:.1f}s')
+
+    from botocore.config import Config
+    client = dynamodb.create_client(app.REGION_NAME, app.DDB_LOCAL_ENDPOINT, Config(max_pool_connections=args.segments))
+    table = dynamodb.Table(client, TABLE)
+    fields = export.projection(export.DEFAULT_FIELDS)
+
+    run('scan, all attributes, 1 segment', export.parallel_scan(table, 1))
+    segments = 1
+    while segments <= args.segments:
+        run(f'scan, projection, {segments} segments', export.parallel_scan(table, segments, **fields))
+        segments *= 2
+    run('query one page, projection', export.page_items(table, 'bench.export_page_0', **fields))
+
+if __name__ == '__main__':
+    main()
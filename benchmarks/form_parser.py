@@ -0,0 +1,48 @@
+# Form body parsing: parse_qs plus list unwrapping (the previous handler code) vs. the
+# single pass formparser, across payload sizes, and the cost of rejecting an oversized
+# base64 body vs. decoding and parsing it.
+#
+#   python benchmarks/form_parser.py --iterations 2000
+import base64
+import argparse
+from urllib.parse import parse_qs, urlencode
+
+import support
+from form_data_collect import formparser
+
+def form(fields, length):
+    return urlencode({ 'pk': 'nata.coach.landing_page', 'sk': 'email', 'email': 'seb@stormacq.com',
+                       **{ f'field{i}': 'é' * (length // 2) + 'x y' for i in range(fields) } })
+
+def parse_qs_unwrapped(body):
+    data = parse_qs(body)
+    return { k: v if type(v) != list else v[0] for k, v in data.items() }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    limits = formparser.Limits(max_body_size=10 * 1024 * 1024, max_fields=10000, max_field_length=100000)
+    for fields, length in [ (3, 10), (20, 50), (100, 200), (1000, 1000) ]:
+        body = form(fields, length)
+        n = max(10, args.iterations // fields)
+        assert formparser.parse_urlencoded(body, limits) == parse_qs_unwrapped(body)
+        label = f'{len(body) // 1024}KB/{fields + 3} fields'
+        support.report(f'parse_qs {label}', [ support.timed(parse_qs_unwrapped, body) for _ in range(n) ])
+        support.report(f'formparser {label}', [ support.timed(formparser.parse_urlencoded, body, limits) for _ in range(n) ])
+
+    # a hostile 5MB body against the default 64KB limit
+    event = { 'body': base64.b64encode(form(1000, 5000).encode('utf-8')).decode('ascii'), 'isBase64Encoded': True }
+    def unbounded():
+        parse_qs_unwrapped(base64.b64decode(event['body']).decode('utf-8'))
+    def bounded():
+        try:
+            formparser.decode_body(event, formparser.Limits().max_body_size)
+        except formparser.LimitExceeded:
+            pass
+    support.report('5MB body, decode and parse_qs', [ support.timed(unbounded) for _ in range(10) ])
+    support.report('5MB body, rejected', [ support.timed(bounded) for _ in range(10) ])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+# Ingest of one viral page with and without write sharding (SHARD_COUNT).
+#
+# DynamoDB Local does not throttle, so writes go through a stand-in enforcing the
+# DynamoDB per partition key limit (1000 write units per second) on a simulated clock:
+# submissions arrive at --rate per second for --seconds, writes that find their
+# partition key over the limit are throttled, the others are written to DynamoDB Local.
+# The page is then read back with the parallel fan-out query.
+#
+#   ./create_table.sh
+#   python benchmarks/hot_partition.py --rate 3000 --seconds 3
+import os
+import time
+import argparse
+
+import support
+from form_data_collect import app, query
+
+PARTITION_WCU = 1000
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+    def __call__(self):
+        return self.now
+
+class ThrottledTable:
+    """ a token bucket of PARTITION_WCU per partition key in front of a real table """
+
+    def __init__(self, table, clock):
+        self.table = table
+        self.clock = clock
+        self.buckets = {}
+        self.throttled = 0
+
+    def put_item(self, Item, **kwargs):
+        from botocore.exceptions import ClientError
+
+        tokens, last = self.buckets.get(Item['pk'], (PARTITION_WCU, 0.0))
+        now = self.clock()
+        tokens = min(PARTITION_WCU, tokens + (now - last) * PARTITION_WCU)
+        if tokens < 1:
+            self.buckets[Item['pk']] = (tokens, now)
+            self.throttled += 1
+            raise ClientError({ 'Error': { 'Code': 'ProvisionedThroughputExceededException' } }, 'PutItem')
+        self.buckets[Item['pk']] = (tokens - 1, now)
+        return self.table.put_item(Item=Item, **kwargs)
+
+def ingest(page, rate, seconds, table_name):
+    from botocore.exceptions import ClientError
+
+    clock = Clock()
+    table = ThrottledTable(app.dynamodb_table(table_name), clock)
+    app.dynamodb_table = lambda name: table
+
+    total = int(rate * seconds)
+    written = 0
+    start = time.perf_counter()
+    for i in range(total):
+        clock.now = i / rate
+        try:
+            app.write_data(table_name, {}, { 'pk': page, 'sk': 'email', 'email': f'user{i}@example.com' })
+            written += 1
+        except ClientError:
+            pass
+    elapsed = time.perf_counter() - start
+    return total, written, table.throttled, elapsed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rate', type=int, default=3000, help='submissions per second, simulated')
+    parser.add_argument('--seconds', type=int, default=3)
+    parser.add_argument('--shards', type=int, default=4)
+    parser.add_argument('--table', default='nata-data-collection-form')
+    args = parser.parse_args()
+
+    os.environ.pop('AWS_EXECUTION_ENV', None)
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'local')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'local')
+    dynamodb_table = app.dynamodb_table
+
+    for shards in (1, args.shards):
+        page = f'bench.viral_page_{shards}'
+        os.environ['SHARD_COUNT'] = str(shards)
+        app.dynamodb_table = dynamodb_table
+        total, written, throttled, elapsed = ingest(page, args.rate, args.seconds, args.table)
+        print(f'SHARD_COUNT={shards:<3} submissions={total} written={written} throttled={throttled} '
+              f'({100.0 * throttled / total:.1f}%) throttle-free ceiling={shards * PARTITION_WCU}/s')
+
+        app.dynamodb_table = dynamodb_table
+        start = time.perf_counter()
+        items = query.query_page(app.dynamodb_table(args.table), page, ProjectionExpression='pk, sk')
+        print(f'  read back {len(items)} items in {(time.perf_counter() - start) * 1000:.1f}ms '
+              f'({shards} parallel queries)')
+
+if __name__ == '__main__':
+    main()
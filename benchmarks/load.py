@@ -0,0 +1,169 @@
+# Load test of both Lambda handlers, in-process, with events synthesised from the fixtures.
+#
+# --requests API events are built from events/event-api.json (different pages, names,
+# emails, body sizes, source IPs) and --batches stream batches from
+# events/event-streaming-multiple.json (1 to --max-batch records, mostly INSERTs).
+# Every configuration runs in fresh worker processes, --processes of them with --threads
+# threads each, so their peak memory (max RSS) is measured separately. The form function
+# writes to DynamoDB Local (or the in-memory DynamoDB stand-in with --dynamodb standin),
+# the stream function publishes to a local SNS stand-in.
+#
+# A configuration is a name followed by environment variables, e.g.
+#
+#   ./create_table.sh
+#   python benchmarks/load.py --requests 5000 --batches 500 \
+#       --config baseline --config "dedup:DEDUP_MODE=local" --config "debug:LOG_LEVEL=DEBUG"
+import os
+import copy
+import time
+import base64
+import random
+import resource
+import argparse
+from urllib.parse import urlencode
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import multiprocessing
+
+import support
+from tests.standins import SNSStandIn, DynamoDBStandIn
+
+PAGES = [ 'nata.coach.landing_page', 'nata.coach.newsletter', 'nata.coach.webinar', 'bench.load_page' ]
+NAMES = [ 'seb', 'nata', 'Sébastien', 'Nataliya', 'Zoë', 'José', '李雷', 'O\'Brien' ]
+
+def api_events(count, seed):
+    rng = random.Random(seed)
+    template = support.load_event('event-api.json')
+    events = []
+    for i in range(count):
+        event = copy.deepcopy(template)
+        name = rng.choice(NAMES)
+        fields = { 'pk': rng.choice(PAGES), 'sk': 'email', 'name': name, 'email': f'user{seed}-{i}@example.com' }
+        # a few forms carry a message, up to a few KB
+        if rng.random() < 0.2:
+            fields['message'] = name * rng.randint(10, 500)
+        body = urlencode(fields)
+        event['body'] = base64.b64encode(body.encode('utf-8')).decode('ascii')
+        event['headers']['content-length'] = str(len(body))
+        event['requestContext']['http']['sourceIp'] = f'10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}'
+        event['requestContext']['requestId'] = f'load-{seed}-{i}'
+        events.append(event)
+    return events
+
+def stream_batches(count, max_batch, seed):
+    rng = random.Random(seed)
+    template = support.load_event('event-streaming-multiple.json')['Records']
+    sequence = 10 ** 20 * (seed + 1)
+    batches = []
+    for b in range(count):
+        records = []
+        for r in range(rng.randint(1, max_batch)):
+            record = copy.deepcopy(rng.choice(template))
+            sequence += 1
+            image = record['dynamodb']['NewImage']
+            email = f'user{seed}-{b}-{r}@example.com'
+            image['pk'] = { 'S': rng.choice(PAGES) }
+            image['sk'] = { 'S': email }
+            image['email'] = { 'S': email }
+            image['name'] = { 'S': rng.choice(NAMES) }
+            record['dynamodb']['Keys'] = { 'pk': image['pk'], 'sk': image['sk'] }
+            record['dynamodb']['SequenceNumber'] = str(sequence)
+            record['eventName'] = 'INSERT' if rng.random() < 0.9 else 'MODIFY'
+            records.append(record)
+        batches.append({ 'Records': records })
+    return batches
+
+def worker(job):
+    """ runs in a fresh process: builds its share of events and drives the handlers """
+    environment, kind, count, threads, max_batch, seed = job
+    os.environ.update(environment)
+    from form_data_collect import app as form_app
+    from database_stream import app as stream_app
+
+    if kind == 'api':
+        handler, events = form_app.lambda_handler, api_events(count, seed)
+    else:
+        handler, events = stream_app.lambda_handler, stream_batches(count, max_batch, seed)
+
+    # one warm-up invocation, cold start is measured by coldstart.py
+    handler(events[0], None)
+
+    def invoke(event):
+        start = time.perf_counter()
+        response = handler(event, None)
+        elapsed = time.perf_counter() - start
+        ok = response.get('statusCode', 200) < 500 and not str(response.get('status', 'OK')).startswith('ERROR')
+        return elapsed, ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(invoke, events[1:]))
+    elapsed = time.perf_counter() - start
+
+    return {
+        'latencies': [ r[0] for r in results ],
+        'errors': sum(1 for r in results if not r[1]),
+        'elapsed': elapsed,
+        # kilobytes on Linux
+        'max_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+def run(name, environment, kind, total, args):
+    jobs = [ (environment, kind, total // args.processes + 1, args.threads, args.max_batch, args.seed * 1000 + p)
+             for p in range(args.processes) ]
+    # spawn: every configuration starts from fresh interpreters, with its own environment
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=args.processes, mp_context=context) as pool:
+        results = list(pool.map(worker, jobs))
+
+    latencies = [ l for r in results for l in r['latencies'] ]
+    elapsed = max(r['elapsed'] for r in results)
+    errors = sum(r['errors'] for r in results)
+    support.report(f'{name} {kind}', latencies)
+    print(f'{"":<32} throughput={len(latencies) / elapsed:8.0f}/s errors={errors} '
+          f'peak memory={max(r["max_rss"] for r in results) / 1024:.0f}MB per process')
+
+def parse_config(text):
+    name, _, variables = text.partition(':')
+    environment = {}
+    for assignment in filter(None, variables.split(',')):
+        key, _, value = assignment.partition('=')
+        environment[key.strip()] = value.strip()
+    return name, environment
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000, help='API events')
+    parser.add_argument('--batches', type=int, default=200, help='stream batches')
+    parser.add_argument('--max-batch', type=int, default=25, help='records per stream batch, at most')
+    parser.add_argument('--processes', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4, help='threads per process')
+    parser.add_argument('--dynamodb', choices=('local', 'standin'), default='local')
+    parser.add_argument('--config', action='append', help='NAME[:VAR=VALUE,...], repeatable')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    base = {
+        'TABLE_NAME': 'nata-data-collection-form',
+        'SNS_TOPIC_ARN': 'arn:aws:sns:eu-central-1:000000000000:load',
+        'AWS_ACCESS_KEY_ID': os.environ.get('AWS_ACCESS_KEY_ID', 'local'),
+        'AWS_SECRET_ACCESS_KEY': os.environ.get('AWS_SECRET_ACCESS_KEY', 'local'),
+        'METRICS_SINK': 'off',
+        'LOG_LEVEL': 'WARNING',
+    }
+    configs = [ parse_config(c) for c in (args.config or [ 'baseline' ]) ]
+
+    with SNSStandIn() as sns, DynamoDBStandIn() as dynamodb:
+        base['SNS_ENDPOINT_URL'] = sns.endpoint
+        if args.dynamodb == 'standin':
+            base['DYNAMODB_ENDPOINT_URL'] = dynamodb.endpoint
+        print(f'{args.processes} processes x {args.threads} threads, DynamoDB {args.dynamodb}')
+        for name, environment in configs:
+            environment = dict(base, **environment)
+            if args.requests:
+                run(name, environment, 'api', args.requests, args)
+            if args.batches:
+                run(name, environment, 'stream', args.batches, args)
+        print(f'{len(sns.published)} SNS messages published')
+
+if __name__ == '__main__':
+    main()
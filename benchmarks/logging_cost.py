@@ -0,0 +1,65 @@
+# CPU time of both handlers with LOG_LEVEL=INFO vs. DEBUG, on the fixture events.
+#
+# DynamoDB and SNS are replaced by no-op stand-ins so only the handler's own work is
+# measured. Log records go through a handler writing to /dev/null, as the Lambda
+# runtime formats every emitted record before sending it to CloudWatch Logs.
+#
+#   python benchmarks/logging_cost.py --invocations 5000
+import os
+import time
+import logging
+import argparse
+
+import support
+from form_data_collect import app as form_app
+from database_stream import app as stream_app
+
+class NoopTable:
+    def put_item(self, Item, **kwargs):
+        return { 'ResponseMetadata': { 'HTTPStatusCode': 200, 'RetryAttempts': 0 } }
+
+class NoopSNS:
+    def publish(self, **kwargs):
+        return { 'MessageId': '00000000-0000-0000-0000-000000000000', 'ResponseMetadata': { 'HTTPStatusCode': 200, 'RetryAttempts': 0 } }
+
+def run(handler, event, invocations):
+    samples = []
+    for _ in range(invocations):
+        start = time.process_time()
+        handler(event, None)
+        samples.append(time.process_time() - start)
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--invocations', type=int, default=5000)
+    args = parser.parse_args()
+
+    os.environ.update({
+        'TABLE_NAME': 'nata-data-collection-form',
+        'SNS_TOPIC_ARN': 'arn:aws:sns:eu-central-1:000000000000:topic',
+        'METRICS_SINK': 'off',
+    })
+    form_app.dynamodb_table = lambda name: NoopTable()
+    # both the digest publish and the notification targets get their client from sns_client()
+    sns = NoopSNS()
+    stream_app.sns_client = lambda: sns
+
+    sink = logging.StreamHandler(open(os.devnull, 'w'))
+    sink.setFormatter(logging.Formatter('[%(levelname)s]\t%(asctime)s\t%(message)s'))
+    for log in (form_app.log, stream_app.log):
+        log.addHandler(sink)
+        log.propagate = False
+
+    cases = [
+        ('form', form_app.lambda_handler, support.load_event('event-api.json')),
+        ('stream', stream_app.lambda_handler, support.load_event('event-streaming-multiple.json')),
+    ]
+    for level in ('INFO', 'DEBUG'):
+        os.environ['LOG_LEVEL'] = level
+        for name, handler, event in cases:
+            run(handler, event, 100)
+            support.report(f'{name} LOG_LEVEL={level}', run(handler, event, args.invocations))
+
+if __name__ == '__main__':
+    main()
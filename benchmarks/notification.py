@@ -0,0 +1,75 @@
+# Rendering cost of the stream notification for large batches.
+#
+# Compares the per-record string concatenation NotificationRenderer replaced with the
+# renderer, on the events/event-streaming-multiple.json INSERT records, replicated to
+# --records items. CPython resizes `message = message + ...` in place when nothing else
+# references the string, the "no in-place" variant shows the quadratic cost when it can't.
+# The handler decodes the images for routing whatever the renderer, the renderer is
+# timed on decoded images, and with the decoding for reference.
+#
+#   python benchmarks/notification.py --records 10000
+import copy
+import argparse
+
+import support
+from database_stream.decoder import Image
+from database_stream.notification import NotificationRenderer
+
+# the loop of the original handler, without the publish
+def concatenate(records):
+    insert_count = 0
+    message = ""
+    for r in records:
+        if r['eventName'] == 'INSERT':
+            insert_count += 1
+            data = r['dynamodb']['NewImage']
+            message = message + f"Page :\t{data['pk']['S']}\nName :\t{data['name']['S']}\nEmail :\t{data['sk']['S']}\n\n"
+    plural = 's' if insert_count > 1 else ''
+    return f"You have {insert_count} new subscription{plural}", message + "\nSent with ❤️ from the ☁️"
+
+# same loop, but a second reference to the message defeats CPython's in-place
+# concatenation optimisation (as on other interpreters): every iteration copies
+def concatenate_shared(records):
+    insert_count = 0
+    message = ""
+    for r in records:
+        if r['eventName'] == 'INSERT':
+            insert_count += 1
+            data = r['dynamodb']['NewImage']
+            previous = message
+            message = previous + f"Page :\t{data['pk']['S']}\nName :\t{data['name']['S']}\nEmail :\t{data['sk']['S']}\n\n"
+    plural = 's' if insert_count > 1 else ''
+    return f"You have {insert_count} new subscription{plural}", message + "\nSent with ❤️ from the ☁️"
+
+def synthesise(count):
+    event = support.load_event('event-streaming-multiple.json')
+    inserts = [ r for r in event['Records'] if r['eventName'] == 'INSERT' ]
+    records = []
+    for i in range(count):
+        record = copy.deepcopy(inserts[i % len(inserts)])
+        record['dynamodb']['NewImage']['sk'] = { 'S': f'subscriber-{i}@example.com' }
+        records.append(record)
+    return records
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--records', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    records = synthesise(args.records)
+    images = [ Image(r['dynamodb']['NewImage']) for r in records ]
+    renderer = NotificationRenderer()
+
+    def decode_and_render(records):
+        return renderer.render([ Image(r['dynamodb']['NewImage']) for r in records ])
+
+    assert renderer.render(images) == concatenate(records)
+
+    support.report('string concatenation', [support.timed(concatenate, records) for _ in range(args.repeat)])
+    support.report('concatenation, no in-place', [support.timed(concatenate_shared, records) for _ in range(args.repeat)])
+    support.report('NotificationRenderer', [support.timed(renderer.render, images) for _ in range(args.repeat)])
+    support.report('renderer, with decoding', [support.timed(decode_and_render, records) for _ in range(args.repeat)])
+
+if __name__ == '__main__':
+    main()
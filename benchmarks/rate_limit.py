@@ -0,0 +1,94 @@
+# Write rate reaching DynamoDB while a few sources flood /form, per RATE_LIMIT_MODE.
+#
+# --containers worker processes stand for Lambda containers, each with its own in-memory
+# buckets. In every container, --bots threads submit as fast as they can from --bot-ips
+# addresses, while --people addresses submit once every --interval seconds. Writes go to
+# the DynamoDB stand-in, which also holds the shared counters of RATE_LIMIT_MODE=dynamodb.
+# Reports, per mode, the answers each kind of source got and the PutItem rate.
+#
+#   python benchmarks/rate_limit.py --seconds 5 --containers 4
+import os
+import copy
+import time
+import random
+import argparse
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import support
+from tests.standins import DynamoDBStandIn
+
+def worker(job):
+    environment, seconds, bots, bot_ips, people, interval, seed = job
+    os.environ.update(environment)
+    from form_data_collect import app
+
+    template = support.load_event('event-api.json')
+    def event(ip):
+        result = copy.deepcopy(template)
+        result['requestContext']['http']['sourceIp'] = ip
+        return result
+    end = time.monotonic() + seconds
+
+    def bot(index):
+        statuses = Counter()
+        flood = event(f'203.0.113.{index % bot_ips + 1}')
+        while time.monotonic() < end:
+            statuses[app.lambda_handler(flood, None)['statusCode']] += 1
+        return 'bot', statuses
+
+    def person(index):
+        rng = random.Random(seed * 1000 + index)
+        statuses = Counter()
+        submission = event(f'10.{seed}.{index // 250}.{index % 250 + 1}')
+        time.sleep(rng.uniform(0, interval))
+        while time.monotonic() < end:
+            statuses[app.lambda_handler(submission, None)['statusCode']] += 1
+            time.sleep(interval)
+        return 'person', statuses
+
+    with ThreadPoolExecutor(max_workers=bots + people) as pool:
+        futures = [ pool.submit(bot, i) for i in range(bots) ] + [ pool.submit(person, i) for i in range(people) ]
+        return [ f.result() for f in futures ]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--containers', type=int, default=4)
+    parser.add_argument('--bots', type=int, default=4, help='flooding threads per container')
+    parser.add_argument('--bot-ips', type=int, default=3, help='addresses the bots share')
+    parser.add_argument('--people', type=int, default=10, help='legitimate submitters per container')
+    parser.add_argument('--interval', type=float, default=2, help='seconds between two submissions of a person')
+    parser.add_argument('--modes', default='off,local,dynamodb')
+    args = parser.parse_args()
+
+    base = {
+        'TABLE_NAME': 'nata-data-collection-form',
+        'RATE_LIMIT_TABLE_NAME': 'nata-data-collection-rate-limit',
+        'AWS_ACCESS_KEY_ID': 'local',
+        'AWS_SECRET_ACCESS_KEY': 'local',
+        'METRICS_SINK': 'off',
+        'LOG_LEVEL': 'WARNING',
+    }
+    print(f'{args.containers} containers, {args.bots} bots on {args.bot_ips} addresses and {args.people} people each, {args.seconds}s')
+    context = multiprocessing.get_context('spawn')
+    for mode in args.modes.split(','):
+        with DynamoDBStandIn() as dynamodb:
+            environment = dict(base, RATE_LIMIT_MODE=mode, DYNAMODB_ENDPOINT_URL=dynamodb.endpoint)
+            jobs = [ (environment, args.seconds, args.bots, args.bot_ips, args.people, args.interval, seed) for seed in range(args.containers) ]
+            with ProcessPoolExecutor(max_workers=args.containers, mp_context=context) as pool:
+                results = [ r for container in pool.map(worker, jobs) for r in container ]
+            writes = sum(1 for operation, _ in dynamodb.requests if operation == 'PutItem')
+
+        statuses = { 'bot': Counter(), 'person': Counter() }
+        for kind, counts in results:
+            statuses[kind].update(counts)
+        line = f'{mode:<9} PutItem={writes / args.seconds:8.1f}/s'
+        for kind, counts in statuses.items():
+            total = sum(counts.values())
+            line += f'  {kind}: {total / args.seconds:7.1f} req/s, {counts[200] / max(total, 1):6.1%} written'
+        print(line)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+# "Sign-ups of page X since yesterday": Query of the whole page with a FilterExpression on
+# created_at vs. a Query of the pk + created_at index.
+#
+# --seed writes --items submissions to one page, one every minute over the previous
+# days. Both approaches are run for several time ranges, reporting the time taken and
+# the number of items DynamoDB read (ScannedCount, what a Query is billed for).
+#
+#   ./create_table.sh
+#   python benchmarks/since_query.py --seed --items 20000
+import os
+import time
+import argparse
+
+import support
+from form_data_collect import app, bulk, query
+
+TABLE = 'nata-data-collection-form'
+PAGE = 'bench.since_page'
+NOW = 1603709167
+
+def seed(count):
+    resource = app.dynamodb_resource()
+    event = app.projection.project_event(support.load_event('event-api.json'))
+    items = [ { 'pk': PAGE, 'sk': f'user{i}@example.com', 'created_at': NOW - (count - i) * 60,
+                'name': f'user {i}', 'email': f'user{i}@example.com', 'event': event } for i in range(count) ]
+    for start in range(0, count, 1000):
+        bulk.batch_write(resource, TABLE, items[start:start + 1000])
+
+def count_pages(table, **kwargs):
+    items = scanned = 0
+    while True:
+        response = table.query(**kwargs)
+        items += len(response['Items'])
+        scanned += response.get('ScannedCount', len(response['Items']))
+        if 'LastEvaluatedKey' not in response:
+            return items, scanned
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def filtered(table, since):
+    return count_pages(table, KeyConditionExpression='pk = :pk', FilterExpression='created_at >= :since',
+                       ExpressionAttributeValues={ ':pk': PAGE, ':since': since })
+
+def indexed(table, since):
+    return count_pages(table, IndexName=query.CREATED_AT_INDEX, KeyConditionExpression='pk = :pk AND created_at >= :since',
+                       ExpressionAttributeValues={ ':pk': PAGE, ':since': since })
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seed', action='store_true')
+    parser.add_argument('--items', type=int, default=20000)
+    args = parser.parse_args()
+
+    os.environ.pop('AWS_EXECUTION_ENV', None)
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'local')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'local')
+
+    if args.seed:
+        seed(args.items)
+
+    table = app.dynamodb_table(TABLE)
+    for label, seconds in [ ('last hour', 3600), ('last day', 86400), ('last week', 7 * 86400) ]:
+        since = NOW - seconds
+        for name, fn in [ ('filter', filtered), ('index', indexed) ]:
+            start = time.perf_counter()
+            items, scanned = fn(table, since)
+            elapsed = time.perf_counter() - start
+            print(f'{label:<10} {name:<7} items={items:<6} read={scanned:<6} {elapsed * 1000:9.1f}ms')
+
+if __name__ == '__main__':
+    main()
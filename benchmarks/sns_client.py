@@ -0,0 +1,44 @@
+# Per-batch latency of database_stream with and without the cached SNS client.
+#
+# "uncached" drops the cached client before every batch, which is what every
+# batch paid before the module level cache existed. SNS is replaced by a local
+# stand-in so the numbers measure client construction and connection reuse only.
+#
+#   python benchmarks/sns_client.py --batches 200
+import os
+import argparse
+
+import support
+from tests.standins import SNSStandIn
+from database_stream import app
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--batches', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.0, help='simulated SNS latency in seconds')
+    args = parser.parse_args()
+
+    os.environ['SNS_TOPIC_ARN'] = 'arn:aws:sns:eu-central-1:123456789012:DataCollectionTopic'
+    os.environ.pop('UNIT_TEST_PROFILE', None)
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'local')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'local')
+
+    event = support.load_event('event-streaming-multiple.json')
+
+    with SNSStandIn(latency=args.latency) as sns:
+        os.environ['SNS_ENDPOINT_URL'] = sns.endpoint
+
+        def uncached():
+            app.reset_cache()
+            app.lambda_handler(event, None)
+
+        def cached():
+            app.lambda_handler(event, None)
+
+        cached()
+        support.report('uncached (new client per batch)', [support.timed(uncached) for _ in range(args.batches)])
+        support.report('cached client', [support.timed(cached) for _ in range(args.batches)])
+        print(f'{len(sns.published)} messages published')
+
+if __name__ == '__main__':
+    main()
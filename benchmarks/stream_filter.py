@@ -0,0 +1,94 @@
+# Invocations saved by the stream FilterCriteria, on a replayed mixed stream.
+#
+# Synthesises --records stream records as the table produces them: INSERTs of new
+# submissions, MODIFYs when a submitter sends the form again (put_item overwrites), REMOVEs,
+# and items of test pages. The stream is cut into batches of --batch-size records the way
+# the event source mapping does, once without filtering (every record reaches the
+# handler, which drops them itself) and once with the template pattern applied before
+# batching, as Lambda does. Both replays run the handler against the SNS stand-in.
+#
+#   python benchmarks/stream_filter.py --records 20000
+import os
+import copy
+import time
+import random
+import argparse
+
+import support
+from tests.standins import SNSStandIn
+
+def stream(count, seed=1):
+    rng = random.Random(seed)
+    template = next(r for r in support.load_event('event-streaming-multiple.json')['Records'] if r['eventName'] == 'INSERT')
+    submitted = []
+    records = []
+    for i in range(count):
+        record = copy.deepcopy(template)
+        draw = rng.random()
+        if submitted and draw < 0.35:
+            # the same submitter again
+            name, pk, sk = 'MODIFY', *rng.choice(submitted)
+        elif submitted and draw < 0.45:
+            name, pk, sk = 'REMOVE', *rng.choice(submitted)
+        else:
+            page = 'nata.coach.landing_page' if rng.random() < 0.8 else 'bench.load_page'
+            name, pk, sk = 'INSERT', page, f'user{i}@example.com'
+            submitted.append((pk, sk))
+        keys = { 'pk': { 'S': pk }, 'sk': { 'S': sk } }
+        record['eventName'] = name
+        record['dynamodb']['Keys'] = keys
+        record['dynamodb']['SequenceNumber'] = str(10 ** 20 + i)
+        if name == 'REMOVE':
+            del record['dynamodb']['NewImage']
+        else:
+            record['dynamodb']['NewImage'].update(keys, email=keys['sk'])
+        records.append(record)
+    return records
+
+def batches(records, size):
+    return [ { 'Records': records[i:i + size] } for i in range(0, len(records), size) ]
+
+def replay(handler, events):
+    start = time.perf_counter()
+    messages = 0
+    for event in events:
+        messages += handler(event, None)['messages']
+    return time.perf_counter() - start, messages
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=10, help='BatchSize of the event source mapping')
+    args = parser.parse_args()
+
+    with open(os.path.join(os.path.dirname(__file__), '..', 'template.yaml')) as f:
+        # the Default of the StreamFilterPattern parameter, a single line
+        pattern = next(line.split(':', 1)[1].strip()[1:-1] for line in f if line.strip().startswith("Default: '{"))
+
+    with SNSStandIn() as sns:
+        os.environ.update({
+            'SNS_TOPIC_ARN': 'arn:aws:sns:eu-central-1:000000000000:filter',
+            'SNS_ENDPOINT_URL': sns.endpoint,
+            'STREAM_FILTER': pattern,
+            'METRICS_SINK': 'off',
+            'AWS_ACCESS_KEY_ID': 'local',
+            'AWS_SECRET_ACCESS_KEY': 'local',
+        })
+        from database_stream import app, filters
+
+        records = stream(args.records)
+        kept = filters.record_filter().apply(records)
+        counts = { name: sum(1 for r in records if r['eventName'] == name) for name in ('INSERT', 'MODIFY', 'REMOVE') }
+        print(f'{len(records)} records: {counts}, {len(kept)} match the pattern')
+
+        app.lambda_handler(batches(kept, args.batch_size)[0], None)
+        unfiltered = batches(records, args.batch_size)
+        filtered = batches(kept, args.batch_size)
+        for label, events in [ ('no FilterCriteria', unfiltered), ('FilterCriteria', filtered) ]:
+            elapsed, messages = replay(app.lambda_handler, events)
+            print(f'{label:<20} invocations={len(events):<7} records delivered={sum(len(e["Records"]) for e in events):<7} '
+                  f'notified={messages:<7} handler time={elapsed:6.2f}s')
+        print(f'invocations saved: {1 - len(filtered) / len(unfiltered):.0%}')
+
+if __name__ == '__main__':
+    main()
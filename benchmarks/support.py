@@ -0,0 +1,38 @@
+# helpers shared by the benchmark scripts in this directory
+import os
+import sys
+import json
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, 'src')
+EVENTS = os.path.join(ROOT, 'events')
+
+# make the Lambda packages importable the same way the Lambda runtime does
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+# the AWS stand-ins are shared with the tests, see tests/standins.py
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+def load_event(name):
+    with open(os.path.join(EVENTS, name)) as f:
+        return json.load(f)
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - start
+
+def report(label, samples):
+    ms = [s * 1000 for s in samples]
+    print(f"{label:<32} n={len(ms):<6} "
+          f"p50={percentile(ms, 50):8.3f}ms p90={percentile(ms, 90):8.3f}ms "
+          f"p99={percentile(ms, 99):8.3f}ms total={sum(ms):10.1f}ms")
@@ -0,0 +1,77 @@
+# User facing latency of the form function, synchronous put_item vs. write-behind,
+# with a simulated slow DynamoDB backend.
+#
+# The backend stand-in answers in --latency seconds, with a --tail-ratio share of
+# calls taking --tail seconds. In write-behind mode submissions go to the local
+# queue stand-in, which is then drained with BatchWriteItem.
+#
+#   python benchmarks/write_behind.py --requests 500
+import os
+import copy
+import time
+import random
+import argparse
+from urllib.parse import urlencode
+
+import support
+from form_data_collect import app, consumer, writebehind
+
+class SlowBackend:
+
+    def __init__(self, latency, tail, tail_ratio):
+        self.latency = latency
+        self.tail = tail
+        self.tail_ratio = tail_ratio
+        self.items = 0
+
+    def _wait(self):
+        time.sleep(self.tail if random.random() < self.tail_ratio else self.latency)
+
+    # Table
+    def put_item(self, Item, **kwargs):
+        self._wait()
+        self.items += 1
+        return {}
+
+    # Resource
+    def batch_write_item(self, RequestItems):
+        self._wait()
+        self.items += sum(len(r) for r in RequestItems.values())
+        return { 'UnprocessedItems': {} }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.01)
+    parser.add_argument('--tail', type=float, default=0.3)
+    parser.add_argument('--tail-ratio', type=float, default=0.02)
+    args = parser.parse_args()
+
+    os.environ['TABLE_NAME'] = 'nata-data-collection-form'
+    os.environ['WRITE_QUEUE'] = 'local'
+    random.seed(1)
+
+    backend = SlowBackend(args.latency, args.tail, args.tail_ratio)
+    app.dynamodb_table = lambda table_name: backend
+    app.dynamodb_resource = lambda: backend
+
+    template = support.load_event('event-api.json')
+    template['isBase64Encoded'] = False
+    events = []
+    for i in range(args.requests):
+        event = copy.deepcopy(template)
+        event['body'] = urlencode({ 'pk': 'bench.page', 'sk': 'email', 'name': f'user {i}', 'email': f'user{i}@example.com' })
+        events.append(event)
+
+    for mode in ('sync', 'write-behind'):
+        os.environ['WRITE_MODE'] = mode
+        backend.items = 0
+        samples = [ support.timed(app.lambda_handler, copy.deepcopy(e), None) for e in events ]
+        support.report(f'{mode} request', samples)
+
+    start = time.perf_counter()
+    written, failed = consumer.drain(writebehind.local_queue, os.environ['TABLE_NAME'])
+    print(f'drained {written} items ({failed} failed) in {time.perf_counter() - start:.2f}s with BatchWriteItem')
+
+if __name__ == '__main__':
+    main()
@@ -8,13 +8,32 @@ PID=$(jps | grep DynamoDBLocal.jar | cut -f 1 -d " ")
 LOCAL_DDB="--endpoint-url http://localhost:8000"
 TABLE_NAME="nata-data-collection-form"
 
-aws dynamodb describe-table --table-name $TABLE_NAME $LOCAL_DDB
+# items of a page by creation time, same index as in template.yaml
+CREATED_AT_INDEX='{"IndexName":"pk-created_at-index","KeySchema":[{"AttributeName":"pk","KeyType":"HASH"},{"AttributeName":"created_at","KeyType":"RANGE"}],"Projection":{"ProjectionType":"INCLUDE","NonKeyAttributes":["name","email"]},"ProvisionedThroughput":{"ReadCapacityUnits":5,"WriteCapacityUnits":5}}'
+
+aws dynamodb describe-table --table-name $TABLE_NAME $LOCAL_DDB > /tmp/describe-table.json
 if [ $? != 0 ];
 then
     echo "Creating table "
-    aws dynamodb create-table --table-name $TABLE_NAME --attribute-definitions AttributeName=pk,AttributeType=S AttributeName=sk,AttributeType=S --key-schema AttributeName=pk,KeyType=HASH AttributeName=sk,KeyType=RANGE --provisioned-throughput ReadCapacityUnits=5,WriteCapacityUnits=5 $LOCAL_DDB
+    aws dynamodb create-table --table-name $TABLE_NAME --attribute-definitions AttributeName=pk,AttributeType=S AttributeName=sk,AttributeType=S AttributeName=created_at,AttributeType=N --key-schema AttributeName=pk,KeyType=HASH AttributeName=sk,KeyType=RANGE --global-secondary-indexes "[$CREATED_AT_INDEX]" --provisioned-throughput ReadCapacityUnits=5,WriteCapacityUnits=5 $LOCAL_DDB
+elif ! grep -q pk-created_at-index /tmp/describe-table.json;
+then
+    echo "Adding the created_at index"
+    aws dynamodb update-table --table-name $TABLE_NAME --attribute-definitions AttributeName=pk,AttributeType=S AttributeName=created_at,AttributeType=N --global-secondary-index-updates "[{\"Create\":$CREATED_AT_INDEX}]" $LOCAL_DDB
 else 
     echo "Table already exist, ready to use"
 fi
 
+# submissions expire after expires_at, as in template.yaml
+aws dynamodb update-time-to-live --table-name $TABLE_NAME --time-to-live-specification Enabled=true,AttributeName=expires_at $LOCAL_DDB > /dev/null 2>&1
+
+# shared rate limit counters (RATE_LIMIT_MODE=dynamodb)
+RATE_LIMIT_TABLE_NAME="nata-data-collection-rate-limit"
+aws dynamodb describe-table --table-name $RATE_LIMIT_TABLE_NAME $LOCAL_DDB > /dev/null 2>&1
+if [ $? != 0 ];
+then
+    echo "Creating rate limit table "
+    aws dynamodb create-table --table-name $RATE_LIMIT_TABLE_NAME --attribute-definitions AttributeName=pk,AttributeType=S --key-schema AttributeName=pk,KeyType=HASH --provisioned-throughput ReadCapacityUnits=5,WriteCapacityUnits=5 $LOCAL_DDB
+fi
+
 Echo "To stop DynamoDB Local, type: kill -9 $PID"
\ No newline at end of file
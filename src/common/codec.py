@@ -0,0 +1,121 @@
+import os
+import json
+import zlib
+
+# Compression of large attributes: strings, maps and lists bigger than a threshold are
+# stored as Binary values, a header followed by the compressed UTF-8 text or JSON.
+# DynamoDB bills writes per started KB of item, free text and the stored event compress
+# well. Readers (database_stream.decoder, form_data_collect.dynamodb) decode them
+# transparently, other binary values, e.g. raw_event, are returned as they are.
+#
+#   header: MAGIC, one byte algorithm, one byte kind
+
+# zlib and zstd frames never start with a zero byte
+MAGIC = b'\x00FDC'
+
+ZLIB = 1
+ZSTD = 2
+ALGORITHMS = { 'zlib': ZLIB, 'zstd': ZSTD }
+
+TEXT = 0
+JSON = 1
+
+HEADER_SIZE = len(MAGIC) + 2
+
+# keys, attributes read by conditions and indexes are never compressed
+EXCLUDED = ('pk', 'sk', 'created_at', 'expires_at', 'payload_hash', 'name', 'email')
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError('zstd compression needs the zstandard package, pip install zstandard')
+    return zstandard
+
+def compress(data, algorithm=ZLIB, level=6):
+    if algorithm == ZSTD:
+        return _zstd().ZstdCompressor(level=level).compress(data)
+    return zlib.compress(data, level)
+
+def decompress(data, algorithm):
+    if algorithm == ZSTD:
+        return _zstd().ZstdDecompressor().decompress(data)
+    if algorithm == ZLIB:
+        return zlib.decompress(data)
+    raise ValueError(f'Unknown compression algorithm {algorithm}')
+
+def is_encoded(value):
+    return isinstance(value, (bytes, bytearray)) and value[:len(MAGIC)] == MAGIC
+
+def encode(value, threshold=1024, algorithm=ZLIB, level=6):
+    """ value compressed into bytes when it is a string, map or list of at least threshold bytes
+        and compression makes it smaller, otherwise value itself
+    """
+    if isinstance(value, str):
+        kind, data = TEXT, value.encode('utf-8')
+    elif isinstance(value, (dict, list)):
+        try:
+            kind, data = JSON, json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        except TypeError:
+            # e.g. Decimal, bytes or sets, which would not read back as they were
+            return value
+    else:
+        return value
+    if len(data) < threshold:
+        return value
+    compressed = compress(data, algorithm, level)
+    if len(compressed) + HEADER_SIZE >= len(data):
+        return value
+    return MAGIC + bytes((algorithm, kind)) + compressed
+
+def decode(value):
+    """ the original value of encode() output, anything else as is """
+    if not is_encoded(value):
+        return value
+    value = bytes(value)
+    algorithm, kind = value[len(MAGIC)], value[len(MAGIC) + 1]
+    data = decompress(value[HEADER_SIZE:], algorithm).decode('utf-8')
+    return data if kind == TEXT else json.loads(data)
+
+class Codec:
+    """ Compresses the large attributes of items before they are written """
+
+    def __init__(self, threshold=1024, algorithm=ZLIB, level=6, excluded=EXCLUDED):
+        self.threshold = threshold
+        self.algorithm = algorithm
+        self.level = level
+        self.excluded = frozenset(excluded)
+
+    @classmethod
+    def from_env(cls):
+        """ None unless COMPRESSION is zlib or zstd """
+        name = os.environ.get('COMPRESSION', 'off').lower()
+        if name in ('', 'off', 'none'):
+            return None
+        if name not in ALGORITHMS:
+            raise ValueError(f'Unknown COMPRESSION {name!r}, use off, zlib or zstd')
+        if ALGORITHMS[name] == ZSTD:
+            # fail at the first request rather than on every write
+            _zstd()
+        return cls(
+            threshold=int(os.environ.get('COMPRESSION_THRESHOLD', '1024')),
+            algorithm=ALGORITHMS[name],
+            level=int(os.environ.get('COMPRESSION_LEVEL', '6')),
+        )
+
+    def encode_item(self, item):
+        """ item with its large attributes compressed, a new dict """
+        excluded = self.excluded
+        return { k: v if k in excluded else encode(v, self.threshold, self.algorithm, self.level) for k, v in item.items() }
+
+def decode_item(item):
+    return { k: decode(v) for k, v in item.items() }
+
+_codecs = {}
+
+# codec for the current COMPRESSION settings, None when compression is off
+def codec():
+    key = (os.environ.get('COMPRESSION'), os.environ.get('COMPRESSION_THRESHOLD'), os.environ.get('COMPRESSION_LEVEL'))
+    if key not in _codecs:
+        _codecs[key] = Codec.from_env()
+    return _codecs[key]
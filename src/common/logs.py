@@ -0,0 +1,34 @@
+import os
+import random
+import logging
+import functools
+
+# Log levels come from the environment instead of being forced to DEBUG: a debug call on a
+# disabled level returns before formatting its arguments, as long as they are passed lazily
+# (log.debug('%s', value), not f-strings) and expensive ones (json.dumps) are behind isEnabledFor.
+
+def level():
+    # LOG_LEVEL is a standard level name, INFO when missing or unknown
+    value = getattr(logging, os.environ.get('LOG_LEVEL', 'INFO').upper(), None)
+    return value if isinstance(value, int) else logging.INFO
+
+def get_logger(name):
+    log = logging.getLogger(name)
+    log.setLevel(level())
+    return log
+
+def sample_rate():
+    return float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', '0'))
+
+def debug_sampling(log, random=random.random):
+    """ decorator logging a LOG_DEBUG_SAMPLE_RATE fraction of the invocations at DEBUG level,
+        the others at LOG_LEVEL
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            rate = sample_rate()
+            log.setLevel(logging.DEBUG if rate > 0 and random() < rate else level())
+            return handler(event, context)
+        return wrapper
+    return decorator
@@ -0,0 +1,151 @@
+import os
+import sys
+import json
+import time
+import bisect
+import functools
+from collections import deque
+from contextlib import contextmanager
+
+# Timers around the interesting steps of a handler, emitted once per invocation as a
+# CloudWatch Embedded Metric Format (EMF) log line: CloudWatch Logs turns it into metrics,
+# no PutMetricData call and no extra latency.
+# https://docs.aws.amazon.com/AmazonCloudWatch/latest/monitoring/CloudWatch_Embedded_Metric_Format_Specification.html
+
+DEFAULT_NAMESPACE = 'form-data-collect'
+
+def percentile(samples, pct):
+    """ nearest rank percentile of a sorted list """
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, int(round(pct / 100.0 * (len(samples) - 1))))
+    return samples[index]
+
+class StdoutSink:
+    """ Lambda sends stdout to CloudWatch Logs, where EMF lines are extracted """
+
+    def emit(self, document):
+        sys.stdout.write(json.dumps(document, separators=(',', ':')) + '\n')
+        sys.stdout.flush()
+
+class LocalSink:
+    """ Keeps emitted documents in memory, for tests and benchmarks """
+
+    def __init__(self):
+        self.documents = []
+
+    def emit(self, document):
+        self.documents.append(document)
+
+    def metric(self, name):
+        """ all the values recorded for one metric, across documents """
+        values = []
+        for document in self.documents:
+            value = document.get(name)
+            if value is not None:
+                values.extend(value if isinstance(value, list) else [ value ])
+        return values
+
+    def clear(self):
+        self.documents.clear()
+
+local_sink = LocalSink()
+
+def sink():
+    # METRICS_SINK is stdout (the default), local (in-process LocalSink) or off
+    name = os.environ.get('METRICS_SINK', 'stdout').lower()
+    if name == 'off':
+        return None
+    if name == 'local':
+        return local_sink
+    return StdoutSink()
+
+class Recorder:
+    """ Collects timings for the current invocation, and keeps the last samples of every
+        metric across warm invocations of the container to report percentiles
+    """
+
+    def __init__(self, function_name, window=1024, clock=time.perf_counter):
+        self.function_name = function_name
+        self.window = window
+        self.clock = clock
+        self.current = {}
+        self.units = {}
+        self.samples = {}
+
+    @contextmanager
+    def timer(self, name):
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.record(name, (self.clock() - start) * 1000)
+
+    def record(self, name, value, unit='Milliseconds'):
+        self.current.setdefault(name, []).append(value)
+        self.units[name] = unit
+        # the window in arrival order, to evict the oldest sample, and sorted, so percentiles
+        # need no sort: both are a memmove on a small list
+        window = self.samples.get(name)
+        if window is None:
+            window = self.samples[name] = (deque(), [])
+        arrivals, ordered = window
+        if len(arrivals) == self.window:
+            oldest = arrivals.popleft()
+            del ordered[bisect.bisect_left(ordered, oldest)]
+        arrivals.append(value)
+        bisect.insort(ordered, value)
+
+    def percentiles(self):
+        """ { metric: { p50, p90, p99, count } } over the last samples of this container """
+        result = {}
+        for name, (_, ordered) in self.samples.items():
+            result[name] = {
+                'p50': percentile(ordered, 50),
+                'p90': percentile(ordered, 90),
+                'p99': percentile(ordered, 99),
+                'count': len(ordered)
+            }
+        return result
+
+    def document(self):
+        """ the EMF document for the current invocation """
+        namespace = os.environ.get('METRICS_NAMESPACE', DEFAULT_NAMESPACE)
+        document = {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [ {
+                    'Namespace': namespace,
+                    'Dimensions': [ [ 'Function' ] ],
+                    'Metrics': [ { 'Name': name, 'Unit': self.units[name] } for name in self.current ]
+                } ]
+            },
+            'Function': self.function_name,
+            # not metrics, only properties: searchable in the logs but not billed as custom metrics
+            'percentiles': self.percentiles()
+        }
+        for name, values in self.current.items():
+            document[name] = values[0] if len(values) == 1 else values
+        return document
+
+    def flush(self):
+        target = sink()
+        if target is not None and self.current:
+            target.emit(self.document())
+        self.current = {}
+
+    def reset(self):
+        self.current = {}
+        self.units.clear()
+        self.samples.clear()
+
+    def instrument(self, handler):
+        """ decorator timing a Lambda handler as 'handler' and flushing its metrics when it returns """
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            try:
+                with self.timer('handler'):
+                    return handler(event, context)
+            finally:
+                self.flush()
+        return wrapper
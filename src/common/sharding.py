@@ -0,0 +1,41 @@
+import os
+import zlib
+
+# Write sharding for high volume pages: the items of a sharded page are spread over
+# SHARD_COUNT partition keys, 'page#0' to 'page#N-1', instead of one hot 'page' key.
+# The shard is derived from the sort key, so a given submitter always lands on the same
+# item (put_item still overwrites, conditional writes still see the previous item).
+
+SEPARATOR = '#'
+
+def shard_count():
+    return int(os.environ.get('SHARD_COUNT', '1'))
+
+def sharded_pages():
+    # SHARDED_PAGES is a comma separated list of pages, all pages are sharded when it is empty
+    return { p.strip() for p in os.environ.get('SHARDED_PAGES', '').split(',') if p.strip() }
+
+def is_sharded(pk, count=None):
+    count = shard_count() if count is None else count
+    if count <= 1:
+        return False
+    pages = sharded_pages()
+    return not pages or pk in pages
+
+def shard_pk(pk, sk, count):
+    # crc32 is stable across processes, unlike hash()
+    return f'{pk}{SEPARATOR}{zlib.crc32(sk.encode("utf-8")) % count}'
+
+def shard_pks(pk, count):
+    """ every partition key of a sharded page """
+    return [ f'{pk}{SEPARATOR}{i}' for i in range(count) ]
+
+def base_pk(pk, count=None):
+    """ the page of a (possibly sharded) partition key, the pks of pages that are not sharded
+        are pages themselves even when they end with '#digits' (e.g. 'promo#2024')
+    """
+    page, separator, shard = pk.rpartition(SEPARATOR)
+    if not separator or not shard.isdigit():
+        return pk
+    count = shard_count() if count is None else count
+    return page if int(shard) < count and is_sharded(page, count) else pk
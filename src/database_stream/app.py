@@ -1,26 +1,191 @@
 import os
 import json
-import logging
+import time
 
-import boto3
+from common import logs
+from common import metrics
 
-log = logging.getLogger('database-streaming')
-log.setLevel(logging.DEBUG)
+# boto3 and botocore are only imported when the first client is built:
+# importing them is the largest part of the cold start
+from . import archive
+from . import digest
+from . import decoder
+from . import filters
+from . import dispatch
+from . import notification
+
+# LOG_LEVEL, INFO by default
+log = logs.get_logger('database-streaming')
+
+# step timings, emitted as one EMF line per invocation
+recorder = metrics.Recorder('DDBStreamFunction')
 
 try:
     REGION_NAME = os.environ['AWS_REGION']
-    log.info(f'Going to use region name {REGION_NAME}')
+    log.info('Going to use region name %s', REGION_NAME)
 except KeyError:
     log.warning("No AWS_REGION environment variable defined, using default 'eu-central-1'")
     REGION_NAME = 'eu-central-1'
 
+# the SNS client is expensive to build (credential resolution, endpoint and model
+# loading) but safe to reuse, keep it at module level so warm invocations share it
+# together with its connection pool
+_sns_clients = {}
+_sqs_clients = {}
+_s3_clients = {}
+_tables = {}
+
+def client_config(prefix):
+    from botocore.config import Config
+
+    # tunable through <prefix>_* environment variables, defaults are sized for a 3 secs Lambda timeout
+    return Config(
+        max_pool_connections=int(os.environ.get(f'{prefix}_MAX_POOL_CONNECTIONS', '10')),
+        connect_timeout=float(os.environ.get(f'{prefix}_CONNECT_TIMEOUT', '1')),
+        read_timeout=float(os.environ.get(f'{prefix}_READ_TIMEOUT', '2')),
+        retries={
+            'mode': os.environ.get(f'{prefix}_RETRY_MODE', 'standard'),
+            'total_max_attempts': int(os.environ.get(f'{prefix}_MAX_ATTEMPTS', '3'))
+        }
+    )
+
+def sns_config():
+    return client_config('SNS')
+
+def sqs_config():
+    return client_config('SQS')
+
+def sns_client():
+    profile = os.environ['UNIT_TEST_PROFILE'] if 'UNIT_TEST_PROFILE' in os.environ else None
+    # allows to point to a local SNS stand-in for tests and benchmarks
+    endpoint = os.environ.get('SNS_ENDPOINT_URL')
+    key = (REGION_NAME, profile, endpoint)
+
+    client = _sns_clients.get(key)
+    if client is None:
+        # the low level botocore client, boto3 adds nothing we use here
+        import botocore.session
+        session = botocore.session.Session(profile=profile)
+        client = session.create_client('sns', region_name=REGION_NAME, endpoint_url=endpoint, config=sns_config())
+        _sns_clients[key] = client
+
+    return client
+
+def sqs_client():
+    # only used by NOTIFICATION_ROUTES sqs targets
+    endpoint = os.environ.get('SQS_ENDPOINT_URL')
+    key = (REGION_NAME, endpoint)
+
+    client = _sqs_clients.get(key)
+    if client is None:
+        import botocore.session
+        session = botocore.session.Session()
+        client = session.create_client('sqs', region_name=REGION_NAME, endpoint_url=endpoint, config=sqs_config())
+        _sqs_clients[key] = client
+
+    return client
+
+def s3_client():
+    # only used by ARCHIVE_MODE=s3
+    endpoint = os.environ.get('S3_ENDPOINT_URL')
+    key = (REGION_NAME, endpoint)
+
+    client = _s3_clients.get(key)
+    if client is None:
+        import botocore.session
+        session = botocore.session.Session()
+        client = session.create_client('s3', region_name=REGION_NAME, endpoint_url=endpoint)
+        _s3_clients[key] = client
+
+    return client
+
+def dynamodb_table(table_name):
+    key = (REGION_NAME, table_name)
+
+    table = _tables.get(key)
+    if table is None:
+        # only used by the DynamoDB digest store
+        import boto3
+        session = boto3.Session(region_name=REGION_NAME)
+        table = session.resource('dynamodb').Table(table_name)
+        _tables[key] = table
+
+    return table
+
+# drop cached clients, next call will build a fresh one (used by tests)
+def reset_cache():
+    _sns_clients.clear()
+    _sqs_clients.clear()
+    _s3_clients.clear()
+    _tables.clear()
+
+# wrap in a separate function for easy mocking during tests
+def now():
+    return time.time()
+
+def publish(topic_arn, subject, message):
+    client = sns_client()
+    with recorder.timer('publish'):
+        client.publish(
+            TopicArn=topic_arn,
+            Message=message,
+            Subject=subject
+        )
+
+_ignored_routes = set()
+
+def warn_ignored_routes():
+    # digests are always published to SNS_TOPIC_ARN, logged once per container and NOTIFICATION_ROUTES value
+    routes = os.environ.get('NOTIFICATION_ROUTES')
+    if routes and routes not in _ignored_routes:
+        _ignored_routes.add(routes)
+        log.warning('NOTIFICATION_ROUTES does not apply with DIGEST_MODE=on, digests are published to SNS_TOPIC_ARN')
+
+def publish_digest(topic_arn, renderer, images):
+    """ buffers new items per page and publishes one summary per page due, returns the number of summaries """
+    warn_ignored_routes()
+    buffer = digest.from_env(dynamodb_table, clock=now)
+
+    # only keep what the page template needs, the buffer does not need the stored event
+    trimmed = []
+    for image in images:
+        fields = ('pk',) + renderer.template_for(image.get('pk')).fields
+        trimmed.append({ f: image.typed[f] for f in fields if f in image })
+    buffer.add(trimmed)
+
+    published = 0
+    for pk, page_images in buffer.flush():
+        subject, message = renderer.render([ decoder.Image(typed) for typed in page_images ])
+        if message is None:
+            continue
+        try:
+            publish(topic_arn, subject, message)
+        except Exception as e:
+            # the records are safely buffered, the page is retried on the next flush
+            log.error("Can not publish the digest for page %s", pk)
+            log.exception(e)
+            buffer.restore(pk, page_images)
+            continue
+        published += 1
+
+    return published
+
+def sequence_number(record):
+    return record.get('dynamodb', {}).get('SequenceNumber')
+
+# ReportBatchItemFailures response entries
+def batch_item_failures(records):
+    return [ { 'itemIdentifier': sequence_number(r) } for r in records ]
+
+@recorder.instrument
+@logs.debug_sampling(log)
 def lambda_handler(event, context):
 
-    log.debug(event)
+    log.debug('%s', event)
     
     try:
         SNS_TOPIC_ARN = os.environ['SNS_TOPIC_ARN']
-        log.info(f'Going to use topic {SNS_TOPIC_ARN}')
+        log.debug('Going to use topic %s', SNS_TOPIC_ARN)
     except KeyError:
         log.error("No SNS_TOPIC_ARN environment variable defined, calls will fail with error code 500")
         response = {
@@ -28,44 +193,123 @@ def lambda_handler(event, context):
         }
         return response
 
+    # scheduled invocations carry no records, they only flush the digest buffer
+    records = event.get('Records', [])
+    batch_size = len(records)
+    renderer = notification.renderer()
+    # STREAM_FILTER, already applied by the event source mapping in AWS
+    keep = filters.record_filter().matches
+
+    # records are processed in order and we stop at the first one we can't process: the event
+    # source mapping retries from the sequence number we report, everything before it is checkpointed
+    images = []
+    entries = []
+    # (index, record) of the items deleted by the table TTL
+    expired = []
+    skipped = 0
+    failed = None
+    checkpoint = None
+    render_start = time.perf_counter()
+    for index, record in enumerate(records):
+        try:
+            if not keep(record):
+                skipped += 1
+            elif record['eventName'] == 'REMOVE':
+                if archive.is_expiry(record):
+                    expired.append((index, record))
+                else:
+                    skipped += 1
+            else:
+                image = decoder.Image(record['dynamodb']['NewImage'])
+                entries.append((index, image, renderer.render_one(image)))
+                images.append(image)
+        except Exception as e:
+            log.error("Can not process record %s, the batch stops here", record.get('eventID'))
+            log.exception(e)
+            failed = record
+            break
+        checkpoint = sequence_number(record)
+    insert_count = len(images)
+    # one timing for the whole batch, a timer per record would cost more than rendering it
+    recorder.record('render', (time.perf_counter() - render_start) * 1000)
+    recorder.record('records', batch_size, 'Count')
+    recorder.record('skipped', skipped, 'Count')
+
+    targets = []
+    # (status, exception, index of the record the retry starts at) when the batch must be retried
+    error = None
     try: 
-        batch_size = len(event['Records'])
-        insert_count = 0
-        message = ""
-        for r in event['Records']:
-            if r['eventName'] == 'INSERT':
-                insert_count += 1
-                data = r['dynamodb']['NewImage']
-                message = message + f"Page :\t{data['pk']['S']}\nName :\t{data['name']['S']}\nEmail :\t{data['sk']['S']}\n\n"
-
-        if message != "":
-            plural = 's' if insert_count > 1 else ''
-            subject = f"You have {insert_count} new subscription{plural}"
-            message = message + "\nSent with ❤️ from the ☁️"
-
-            profile = os.environ['UNIT_TEST_PROFILE'] if 'UNIT_TEST_PROFILE' in os.environ else None
-            session = boto3.Session(region_name=REGION_NAME, profile_name=profile)
-            client = session.client('sns')
-            client.publish(
-                TopicArn=SNS_TOPIC_ARN,
-                Message=message,
-                Subject=subject
-            )
+        if digest.enabled():
+            notifications = publish_digest(SNS_TOPIC_ARN, renderer, images)
+        else:
+            # NOTIFICATION_ROUTES, the clients are looked up at call time so that tests can replace them
+            router = dispatch.router(SNS_TOPIC_ARN, lambda: sns_client(), lambda: sqs_client())
+            with recorder.timer('publish'):
+                results = dispatch.dispatch(dispatch.route(router, entries), renderer)
+            for result in results:
+                recorder.record(f'publish_{result.target.kind}', result.elapsed * 1000)
+            notifications = sum(r.messages for r in results)
+            targets = [ r.report() for r in results ]
+
+            failures = [ r for r in results if r.error is not None ]
+            if failures:
+                for result in failures:
+                    log.error("Can not deliver %d records to %s: %r", len(result.group.images), result.target.name, result.error)
+                # the records before the first one not delivered are checkpointed, targets which
+                # received later records get them again with the retry
+                error = (f'ERROR, can not deliver to {len(failures)} of {len(results)} targets',
+                         repr(failures[0].error), min(r.group.first for r in failures))
 
     except Exception as e: 
         log.error("Can not post message to topic")
         log.exception(e)
+        # nothing was sent, the whole batch has to be retried
+        error = ('ERROR, can not post message to topic', repr(e), 0)
+
+    # expired items are archived once the notifications are sent, and only those before the
+    # retry point: the others come back with the retry and would be archived twice
+    if error is not None:
+        expired = [ (index, record) for index, record in expired if index < error[2] ]
+    archived = 0
+    if expired:
+        try:
+            # ARCHIVE_MODE, expired items are only dropped when archiving is off
+            store = archive.from_env(lambda: s3_client())
+            if store is not None:
+                with recorder.timer('archive'):
+                    store.write([ record for _, record in expired ])
+                archived = len(expired)
+        except Exception as e:
+            log.error("Can not archive %d expired items", len(expired))
+            log.exception(e)
+            # notified records after the first expired one are notified again with the retry
+            if error is None or expired[0][0] < error[2]:
+                error = ('ERROR, can not archive expired items', repr(e), expired[0][0])
+
+    if error is not None:
+        status, exception, first = error
         response = {
-            'status' : 'ERROR, can not post message to topic',
-            'exception': repr(e)
+            'status' : status,
+            'exception': exception,
+            'targets': targets,
+            # scheduled invocations have no record to retry
+            'batchItemFailures': batch_item_failures(records[first:first + 1])
         }
         return response
 
     response = {
-        'status' : 'OK',
+        'status' : 'OK' if failed is None else 'PARTIAL',
         'batchSize' : batch_size,
-        'messages' : insert_count
+        'messages' : insert_count,
+        'skipped' : skipped,
+        'archived' : archived,
+        'notifications' : notifications,
+        'targets' : targets,
+        'checkpoint' : checkpoint,
+        'batchItemFailures': batch_item_failures([ failed ] if failed is not None else [])
     }
-    log.debug(response)
+    if failed is not None:
+        log.warning('Processed up to sequence number %s, retrying from %s', checkpoint, sequence_number(failed))
+    log.debug('%s', response)
 
     return response
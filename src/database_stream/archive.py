@@ -0,0 +1,110 @@
+import os
+import io
+import gzip
+import time
+
+from . import decoder
+from . import dispatch
+
+# Archive of the items deleted by the table TTL (see RETENTION_DAYS): their REMOVE stream
+# records carry the OldImage, written as gzip compressed JSON lines, one object per stream
+# batch, cut in parts of ARCHIVE_MAX_BYTES uncompressed bytes. Object names are derived from
+# the sequence numbers of the first and last archived records, whatever else the batch holds:
+# a retry archiving the same records overwrites what it already wrote.
+#
+#   <prefix>/2020/10/26/3133900000000004608185093-3133900000000004608185412-0000.jsonl.gz
+
+# TTL deletions are made by the DynamoDB service, not by a user
+TTL_IDENTITY = { 'type': 'Service', 'principalId': 'dynamodb.amazonaws.com' }
+
+def is_expiry(record):
+    return record.get('eventName') == 'REMOVE' and record.get('userIdentity') == TTL_IDENTITY
+
+def line(record):
+    """ one JSON line: the deleted item, decompressed, with its sequence number and deletion time """
+    image = decoder.Image(record['dynamodb'].get('OldImage') or record['dynamodb']['Keys'])
+    return dispatch.to_json({
+        'sequence_number': record['dynamodb'].get('SequenceNumber'),
+        'deleted_at': record['dynamodb'].get('ApproximateCreationDateTime'),
+        'item': image.to_dict(),
+    }) + '\n'
+
+class S3Store:
+
+    def __init__(self, client, bucket):
+        self.client = client
+        self.bucket = bucket
+
+    def put(self, key, data):
+        self.client().put_object(Bucket=self.bucket, Key=key, Body=data,
+                                 ContentType='application/x-ndjson', ContentEncoding='gzip')
+
+class LocalStore:
+    """ a local directory standing in for the bucket, for tests and local runs """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def put(self, key, data):
+        path = os.path.join(self.directory, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+class Archive:
+
+    def __init__(self, store, prefix='expired', max_bytes=16 * 1024 * 1024, clock=time.time):
+        self.store = store
+        self.prefix = prefix.strip('/')
+        self.max_bytes = max_bytes
+        self.clock = clock
+
+    def _key(self, day, first, last, part):
+        return f'{self.prefix}/{day}/{first}-{last}-{part:04d}.jsonl.gz'
+
+    def write(self, records):
+        """ archives the records, returns the names of the objects written """
+        if not records:
+            return []
+        first = records[0]['dynamodb'].get('SequenceNumber', 'unknown')
+        last = records[-1]['dynamodb'].get('SequenceNumber', 'unknown')
+        # the day of the first deletion rather than today, a retry writes the same objects
+        day = time.strftime('%Y/%m/%d', time.gmtime(records[0]['dynamodb'].get('ApproximateCreationDateTime') or self.clock()))
+        keys = []
+        buffer = io.BytesIO()
+        output = gzip.GzipFile(fileobj=buffer, mode='wb')
+        size = 0
+        for record in records:
+            data = line(record).encode('utf-8')
+            if size and size + len(data) > self.max_bytes:
+                output.close()
+                keys.append(self._key(day, first, last, len(keys)))
+                self.store.put(keys[-1], buffer.getvalue())
+                buffer = io.BytesIO()
+                output = gzip.GzipFile(fileobj=buffer, mode='wb')
+                size = 0
+            output.write(data)
+            size += len(data)
+        output.close()
+        keys.append(self._key(day, first, last, len(keys)))
+        self.store.put(keys[-1], buffer.getvalue())
+        return keys
+
+def mode():
+    # off, s3 (ARCHIVE_BUCKET) or local (ARCHIVE_DIRECTORY)
+    return os.environ.get('ARCHIVE_MODE', 'off').lower()
+
+def from_env(s3_client):
+    """ the Archive for the current settings, None when archiving is off """
+    current = mode()
+    if current == 'off':
+        return None
+    if current == 's3':
+        store = S3Store(s3_client, os.environ['ARCHIVE_BUCKET'])
+    elif current == 'local':
+        store = LocalStore(os.environ.get('ARCHIVE_DIRECTORY', '/tmp/archive'))
+    else:
+        raise ValueError(f'Unknown ARCHIVE_MODE {current!r}, use off, s3 or local')
+    return Archive(store, os.environ.get('ARCHIVE_PREFIX', 'expired'), int(os.environ.get('ARCHIVE_MAX_BYTES', str(16 * 1024 * 1024))))
@@ -0,0 +1,110 @@
+import base64
+from decimal import Decimal
+from collections.abc import Mapping
+
+from common import codec
+
+def _number(text):
+    # integers are by far the most common numbers we store (e.g. created_at), keep them as int
+    try:
+        return int(text)
+    except ValueError:
+        return Decimal(text)
+
+def _binary(value):
+    # binary values are base64 encoded in the stream record JSON
+    return base64.b64decode(value) if isinstance(value, str) else bytes(value)
+
+def decode(attribute):
+    """ converts one typed attribute value, e.g. { 'S': 'text' }, into a native Python value
+
+        maps are returned as lazy Image objects, their attributes are only decoded when read
+    """
+    if 'S' in attribute:
+        return attribute['S']
+    if 'N' in attribute:
+        return _number(attribute['N'])
+    if 'M' in attribute:
+        return Image(attribute['M'])
+    if 'BOOL' in attribute:
+        return attribute['BOOL']
+    if 'NULL' in attribute:
+        return None
+    if 'L' in attribute:
+        return [ decode(v) for v in attribute['L'] ]
+    if 'SS' in attribute:
+        return set(attribute['SS'])
+    if 'NS' in attribute:
+        return { _number(v) for v in attribute['NS'] }
+    if 'B' in attribute:
+        # attributes compressed by common.codec are returned decompressed
+        return codec.decode(_binary(attribute['B']))
+    if 'BS' in attribute:
+        return { _binary(v) for v in attribute['BS'] }
+    raise TypeError(f'Unsupported DynamoDB attribute value {attribute!r}')
+
+class Image(Mapping):
+    """ Read-only mapping over a stream NewImage / OldImage
+
+        values are decoded on first access and cached, attributes never read are never decoded
+        and strings, the bulk of what we store, are returned as is
+    """
+
+    __slots__ = ('typed', '_values')
+
+    def __init__(self, typed):
+        self.typed = typed
+        # decoded values cache, only allocated once a non string value is read
+        self._values = None
+
+    def __getitem__(self, name):
+        attribute = self.typed[name]
+        if 'S' in attribute:
+            return attribute['S']
+        return self._decode(name, attribute)
+
+    def get(self, name, default=None):
+        attribute = self.typed.get(name)
+        if attribute is None:
+            return default
+        if 'S' in attribute:
+            return attribute['S']
+        return self._decode(name, attribute)
+
+    def _decode(self, name, attribute):
+        values = self._values
+        if values is None:
+            values = self._values = {}
+        elif name in values:
+            return values[name]
+        value = decode(attribute)
+        values[name] = value
+        return value
+
+    def __contains__(self, name):
+        return name in self.typed
+
+    def __iter__(self):
+        return iter(self.typed)
+
+    def __len__(self):
+        return len(self.typed)
+
+    def to_dict(self):
+        """ fully materialised copy, with nested maps as plain dicts """
+        return { name: _materialise(self[name]) for name in self.typed }
+
+    def __repr__(self):
+        return f'Image({self.typed!r})'
+
+def _materialise(value):
+    if isinstance(value, Image):
+        return value.to_dict()
+    if isinstance(value, list):
+        return [ _materialise(v) for v in value ]
+    return value
+
+def new_image(record):
+    """ the NewImage of a stream record, or None (e.g. REMOVE records) """
+    typed = record.get('dynamodb', {}).get('NewImage')
+    return None if typed is None else Image(typed)
@@ -0,0 +1,118 @@
+import os
+import json
+import time
+
+from common import sharding
+
+class FileDigestStore:
+    """ Buffers pending images per page in a local JSON file
+
+        survives warm invocations (e.g. in /tmp), for tests and single container deployments
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save(self, buffers):
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(buffers, f)
+        os.replace(tmp, self.path)
+
+    def add(self, pk, images, now):
+        buffers = self._load()
+        buffer = buffers.setdefault(pk, { 'since': now, 'images': [] })
+        buffer['images'].extend(images)
+        self._save(buffers)
+
+    def pending(self):
+        """ returns { pk: (since, count) } """
+        return { pk: (b['since'], len(b['images'])) for pk, b in self._load().items() }
+
+    def take(self, pk):
+        buffers = self._load()
+        buffer = buffers.pop(pk, None)
+        self._save(buffers)
+        return buffer['images'] if buffer else []
+
+class DynamoDBDigestStore:
+    """ Buffers pending images per page in a DynamoDB table keyed on pk, shared by all containers """
+
+    def __init__(self, table):
+        self.table = table
+
+    def add(self, pk, images, now):
+        self.table.update_item(
+            Key={ 'pk': pk },
+            UpdateExpression='SET images = list_append(if_not_exists(images, :empty), :images), since = if_not_exists(since, :now) ADD image_count :count',
+            ExpressionAttributeValues={ ':empty': [], ':images': images, ':now': now, ':count': len(images) }
+        )
+
+    def pending(self):
+        result = {}
+        kwargs = { 'ProjectionExpression': 'pk, since, image_count' }
+        while True:
+            response = self.table.scan(**kwargs)
+            for item in response['Items']:
+                result[item['pk']] = (int(item['since']), int(item['image_count']))
+            if 'LastEvaluatedKey' not in response:
+                return result
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def take(self, pk):
+        # deleting with ALL_OLD hands the buffer to exactly one caller
+        response = self.table.delete_item(Key={ 'pk': pk }, ReturnValues='ALL_OLD')
+        return response.get('Attributes', {}).get('images', [])
+
+class Digest:
+    """ Accumulates new items per page and releases them once per window or size threshold """
+
+    def __init__(self, store, window=900, max_size=50, clock=time.time):
+        self.store = store
+        self.window = window
+        self.max_size = max_size
+        self.clock = clock
+
+    def add(self, images):
+        now = int(self.clock())
+        pages = {}
+        for image in images:
+            # one summary per page, whatever the shard of its items
+            pages.setdefault(sharding.base_pk(image['pk']['S']), []).append(image)
+        for pk, page_images in pages.items():
+            self.store.add(pk, page_images, now)
+
+    def ready(self, force=False):
+        now = int(self.clock())
+        return [ pk for pk, (since, count) in self.store.pending().items()
+                 if force or now - since >= self.window or count >= self.max_size ]
+
+    def flush(self, force=False):
+        """ returns [ (pk, images) ] for every page due for a summary, and removes them from the buffer """
+        return [ (pk, self.store.take(pk)) for pk in self.ready(force) ]
+
+    def restore(self, pk, images):
+        # put back images whose notification could not be sent, due again at the next flush
+        self.store.add(pk, images, int(self.clock()) - self.window)
+
+def enabled():
+    return os.environ.get('DIGEST_MODE', 'off').lower() == 'on'
+
+def from_env(dynamodb_table=None, clock=time.time):
+    if os.environ.get('DIGEST_STORE', 'file').lower() == 'dynamodb':
+        store = DynamoDBDigestStore(dynamodb_table(os.environ['DIGEST_TABLE_NAME']))
+    else:
+        store = FileDigestStore(os.environ.get('DIGEST_FILE', '/tmp/digest.json'))
+    return Digest(
+        store,
+        window=int(os.environ.get('DIGEST_WINDOW', '900')),
+        max_size=int(os.environ.get('DIGEST_MAX_SIZE', '50')),
+        clock=clock
+    )
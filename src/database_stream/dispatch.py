@@ -0,0 +1,236 @@
+import os
+import json
+import time
+import base64
+import urllib.parse
+import urllib.request
+from decimal import Decimal
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+
+from common import sharding
+
+# Routes new items to their page owners: NOTIFICATION_ROUTES is an optional JSON object
+# mapping a page (pk) to a list of targets, '*' for the pages without a route of their own:
+#
+#   { "nata.coach.landing_page": [ { "type": "sns", "topic_arn": "arn:aws:sns:..." },
+#                                  { "type": "webhook", "url": "https://example.com/hook" } ],
+#     "nata.coach.webinar": [ { "type": "sqs", "queue_url": "https://sqs..." } ] }
+#
+# Pages without a route, and every page when there is no '*' route, notify SNS_TOPIC_ARN.
+# The records of a batch are grouped per target, each target gets one delivery per batch
+# and the deliveries run concurrently.
+
+# entries per PublishBatch / SendMessageBatch call, the API maximum
+BATCH_SIZE = 10
+
+# attributes left out of JSON payloads, the stored API event is large and rarely useful
+EXCLUDED = ('event',)
+
+def _default(value):
+    # decoded stream values json does not know about
+    if isinstance(value, Mapping):
+        return dict(value)
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=str)
+    if isinstance(value, (bytes, bytearray)):
+        return base64.b64encode(value).decode('ascii')
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+def item(image, excluded=EXCLUDED):
+    return { k: image[k] for k in image if k not in excluded }
+
+def to_json(value):
+    return json.dumps(value, default=_default, ensure_ascii=False)
+
+def _chunks(values, size=BATCH_SIZE):
+    for start in range(0, len(values), size):
+        yield start, values[start:start + size]
+
+class DeliveryError(Exception):
+    """ some entries of a batch call were refused """
+
+class Group:
+    """ the records of a batch for one target, in stream order """
+
+    def __init__(self, first):
+        # index of the first record in the stream batch, where a retry has to start
+        self.first = first
+        self.images = []
+        self.parts = []
+
+    def add(self, image, part):
+        self.images.append(image)
+        self.parts.append(part)
+
+class SNSTarget:
+    """ 'summary' publishes the rendered notification, 'json' one message per item with PublishBatch """
+
+    kind = 'sns'
+
+    def __init__(self, client, topic_arn, format='summary'):
+        if format not in ('summary', 'json'):
+            raise ValueError(f'Unknown SNS format {format!r}')
+        self.client = client
+        self.topic_arn = topic_arn
+        self.format = format
+        self.name = f'sns:{topic_arn}'
+
+    def send(self, group, renderer):
+        """ returns the number of messages published """
+        if self.format == 'summary':
+            subject, message = renderer.compose(group.parts)
+            if message is None:
+                return 0
+            self.client().publish(TopicArn=self.topic_arn, Message=message, Subject=subject)
+            return 1
+
+        for start, images in _chunks(group.images):
+            entries = [ { 'Id': str(start + i), 'Message': to_json(item(image)) } for i, image in enumerate(images) ]
+            response = self.client().publish_batch(TopicArn=self.topic_arn, PublishBatchRequestEntries=entries)
+            if response.get('Failed'):
+                raise DeliveryError(f'{len(response["Failed"])} messages refused by {self.name}: {response["Failed"][0]}')
+        return len(group.images)
+
+class SQSTarget:
+    """ one message per item, with SendMessageBatch """
+
+    kind = 'sqs'
+
+    def __init__(self, client, queue_url):
+        self.client = client
+        self.queue_url = queue_url
+        self.name = f'sqs:{queue_url}'
+
+    def send(self, group, renderer):
+        for start, images in _chunks(group.images):
+            entries = [ { 'Id': str(start + i), 'MessageBody': to_json(item(image)) } for i, image in enumerate(images) ]
+            response = self.client().send_message_batch(QueueUrl=self.queue_url, Entries=entries)
+            if response.get('Failed'):
+                raise DeliveryError(f'{len(response["Failed"])} messages refused by {self.name}: {response["Failed"][0]}')
+        return len(group.images)
+
+class WebhookTarget:
+    """ one JSON POST per batch: { "subject": ..., "items": [ ... ] } """
+
+    kind = 'webhook'
+
+    def __init__(self, url, headers=None, timeout=None):
+        self.url = url
+        self.headers = dict(headers or {}, **{ 'Content-Type': 'application/json' })
+        self.timeout = float(os.environ.get('WEBHOOK_TIMEOUT', '2')) if timeout is None else timeout
+        # the URL may carry a secret, only its host is reported
+        self.name = f'webhook:{urllib.parse.urlparse(url).netloc}'
+
+    def send(self, group, renderer):
+        subject, _ = renderer.compose(group.parts)
+        body = to_json({ 'subject': subject, 'items': [ item(image) for image in group.images ] }).encode('utf-8')
+        request = urllib.request.Request(self.url, data=body, headers=self.headers, method='POST')
+        # raises HTTPError on 4xx and 5xx answers
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+        return 1
+
+class Result:
+
+    __slots__ = ('target', 'group', 'messages', 'elapsed', 'error')
+
+    def __init__(self, target, group, messages=0, elapsed=0.0, error=None):
+        self.target = target
+        self.group = group
+        self.messages = messages
+        self.elapsed = elapsed
+        self.error = error
+
+    def report(self):
+        """ the response entry of this delivery """
+        report = { 'target': self.target.name, 'records': len(self.group.images),
+                   'messages': self.messages, 'ms': round(self.elapsed * 1000, 1) }
+        if self.error is not None:
+            report['error'] = repr(self.error)
+        return report
+
+class Router:
+    """ targets of each page, built once per NOTIFICATION_ROUTES value """
+
+    def __init__(self, routes, default_topic_arn, sns_client, sqs_client):
+        self.sns_client = sns_client
+        self.sqs_client = sqs_client
+        # targets described the same way are shared by the pages, they get one delivery per batch
+        self._targets = {}
+        self.routes = { pk: [ self.target(spec) for spec in specs ] for pk, specs in routes.items() if pk != '*' }
+        default = routes.get('*') or [ { 'type': 'sns', 'topic_arn': default_topic_arn } ]
+        self.default = [ self.target(spec) for spec in default ]
+
+    def target(self, spec):
+        key = json.dumps(spec, sort_keys=True)
+        target = self._targets.get(key)
+        if target is None:
+            options = dict(spec)
+            kind = options.pop('type', None)
+            if kind == 'sns':
+                target = SNSTarget(self.sns_client, **options)
+            elif kind == 'sqs':
+                target = SQSTarget(self.sqs_client, **options)
+            elif kind == 'webhook':
+                target = WebhookTarget(**options)
+            else:
+                raise ValueError(f'Unknown notification target type {kind!r}')
+            self._targets[key] = target
+        return target
+
+    def targets_for(self, pk):
+        # the items of a sharded page follow the page route
+        return self.routes.get(sharding.base_pk(pk) if pk else pk, self.default)
+
+def route(router, entries):
+    """ { target: Group } for (index, image, part) entries, in stream order """
+    groups = {}
+    for index, image, part in entries:
+        for target in router.targets_for(image.get('pk')):
+            batch = groups.get(target)
+            if batch is None:
+                batch = groups[target] = Group(index)
+            batch.add(image, part)
+    return groups
+
+def _deliver(target, group, renderer):
+    start = time.perf_counter()
+    try:
+        messages = target.send(group, renderer)
+    except Exception as e:
+        return Result(target, group, elapsed=time.perf_counter() - start, error=e)
+    return Result(target, group, messages, time.perf_counter() - start)
+
+_executors = {}
+
+def executor():
+    # DISPATCH_MAX_WORKERS bounds the deliveries running at the same time, the pool is reused across warm invocations
+    workers = int(os.environ.get('DISPATCH_MAX_WORKERS', '8'))
+    pool = _executors.get(workers)
+    if pool is None:
+        pool = _executors[workers] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='dispatch')
+    return pool
+
+def dispatch(groups, renderer):
+    """ delivers every group to its target, concurrently, returns one Result per target in stream order """
+    items = sorted(groups.items(), key=lambda g: g[1].first)
+    if len(items) <= 1:
+        # nothing to overlap, no thread hop
+        return [ _deliver(target, group, renderer) for target, group in items ]
+    futures = [ executor().submit(_deliver, target, group, renderer) for target, group in items ]
+    return [ f.result() for f in futures ]
+
+_routers = {}
+
+# router for the current NOTIFICATION_ROUTES and default topic, reused across warm invocations
+def router(default_topic_arn, sns_client, sqs_client):
+    key = (os.environ.get('NOTIFICATION_ROUTES'), default_topic_arn)
+    result = _routers.get(key)
+    if result is None:
+        routes = json.loads(os.environ.get('NOTIFICATION_ROUTES') or '{}')
+        result = Router(routes, default_topic_arn, sns_client, sqs_client)
+        _routers[key] = result
+    return result
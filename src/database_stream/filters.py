@@ -0,0 +1,162 @@
+import os
+import json
+
+# Lambda event filtering for the stream, evaluated in the handler too.
+#
+# template.yaml passes the same STREAM_FILTER patterns to the event source mapping
+# (FilterCriteria) and to the function: in AWS, records not matching are dropped before
+# the function is invoked, locally and in tests the handler drops them itself with the
+# same semantics. A record is kept when it matches any of the patterns.
+#
+# A pattern mirrors the record structure, every leaf is a list of alternatives:
+#
+#   { "eventName": [ "INSERT" ],
+#     "dynamodb": { "NewImage": { "pk": { "S": [ { "prefix": "nata.coach." } ] },
+#                                 "sk": { "S": [ { "exists": true } ] } } } }
+#
+# Supported matchers: literal values (strings, numbers, booleans, null), prefix, suffix,
+# equals-ignore-case, anything-but (a value, a list or a prefix), exists and numeric.
+
+# without STREAM_FILTER, the records the handler always notified
+DEFAULT_PATTERNS = [ { 'eventName': [ 'INSERT' ] } ]
+
+_MISSING = object()
+
+_OPERATORS = {
+    '=': lambda a, b: a == b,
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+}
+
+def _number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return value
+
+def _literal(expected):
+    if expected is None:
+        return lambda value: value is None
+    if isinstance(expected, bool):
+        return lambda value: value is expected
+    if isinstance(expected, (int, float)):
+        return lambda value: _number(value) is not None and value == expected
+    return lambda value: isinstance(value, str) and value == expected
+
+def _numeric(conditions):
+    if len(conditions) % 2:
+        raise ValueError(f'numeric takes operator / value pairs: {conditions!r}')
+    checks = []
+    for i in range(0, len(conditions), 2):
+        operator, bound = conditions[i], conditions[i + 1]
+        if operator not in _OPERATORS or _number(bound) is None:
+            raise ValueError(f'Invalid numeric condition: {operator!r} {bound!r}')
+        checks.append((_OPERATORS[operator], bound))
+    return lambda value: _number(value) is not None and all(op(value, bound) for op, bound in checks)
+
+def _anything_but(excluded):
+    if isinstance(excluded, dict):
+        if set(excluded) != { 'prefix' }:
+            raise ValueError(f'anything-but only takes a prefix: {excluded!r}')
+        prefix = excluded['prefix']
+        return lambda value: isinstance(value, str) and not value.startswith(prefix)
+    values = excluded if isinstance(excluded, list) else [ excluded ]
+    matchers = [ _literal(v) for v in values ]
+    return lambda value: not any(m(value) for m in matchers)
+
+def _matcher(rule):
+    """ predicate for one alternative of a leaf, None for exists rules (handled by the caller) """
+    if not isinstance(rule, dict):
+        return _literal(rule)
+    if len(rule) != 1:
+        raise ValueError(f'A matcher has exactly one key: {rule!r}')
+    (name, argument), = rule.items()
+    if name == 'prefix':
+        return lambda value: isinstance(value, str) and value.startswith(argument)
+    if name == 'suffix':
+        return lambda value: isinstance(value, str) and value.endswith(argument)
+    if name == 'equals-ignore-case':
+        folded = argument.casefold()
+        return lambda value: isinstance(value, str) and value.casefold() == folded
+    if name == 'anything-but':
+        return _anything_but(argument)
+    if name == 'numeric':
+        return _numeric(argument)
+    raise ValueError(f'Unsupported matcher {name!r}')
+
+def _leaf(rules):
+    if not rules:
+        raise ValueError('A pattern leaf needs at least one value')
+    exists = [ r['exists'] for r in rules if isinstance(r, dict) and 'exists' in r ]
+    matchers = [ _matcher(r) for r in rules if not (isinstance(r, dict) and 'exists' in r) ]
+
+    def match(value):
+        if value is _MISSING:
+            return False in exists
+        if True in exists and not isinstance(value, dict):
+            return True
+        # arrays match when any of their elements does
+        values = value if isinstance(value, list) else [ value ]
+        return any(m(v) for m in matchers for v in values)
+    return match
+
+def _node(pattern):
+    if not isinstance(pattern, dict) or not pattern:
+        raise ValueError(f'A pattern is a non empty JSON object: {pattern!r}')
+    checks = []
+    for key, sub in pattern.items():
+        if isinstance(sub, dict):
+            checks.append((key, _node(sub)))
+        elif isinstance(sub, list):
+            checks.append((key, _leaf(sub)))
+        else:
+            raise ValueError(f'Pattern values are objects or lists: {key!r}')
+
+    def match(record):
+        if not isinstance(record, dict):
+            return False
+        for key, check in checks:
+            value = record.get(key, _MISSING)
+            # a missing object only matches rules like exists: false
+            if value is _MISSING and isinstance(pattern[key], dict):
+                value = {}
+            if not check(value):
+                return False
+        return True
+    return match
+
+class RecordFilter:
+    """ Keeps the stream records matching any of the patterns """
+
+    def __init__(self, patterns):
+        self.patterns = patterns
+        self._matches = [ _node(p) for p in patterns ]
+
+    @classmethod
+    def from_env(cls):
+        return cls(parse(os.environ.get('STREAM_FILTER')))
+
+    def matches(self, record):
+        return any(match(record) for match in self._matches)
+
+    def apply(self, records):
+        return [ r for r in records if self.matches(r) ]
+
+def parse(text):
+    """ patterns from STREAM_FILTER: one pattern, or a list of them, as JSON """
+    if not text:
+        return DEFAULT_PATTERNS
+    patterns = json.loads(text)
+    return patterns if isinstance(patterns, list) else [ patterns ]
+
+_filters = {}
+
+# filter for the current STREAM_FILTER value, reused across warm invocations
+def record_filter():
+    key = os.environ.get('STREAM_FILTER')
+    result = _filters.get(key)
+    if result is None:
+        result = RecordFilter.from_env()
+        _filters[key] = result
+    return result
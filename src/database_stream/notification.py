@@ -0,0 +1,136 @@
+import os
+import json
+from string import Formatter
+
+from common import sharding
+
+DEFAULT_TEMPLATE = "Page :\t{page}\nName :\t{name}\nEmail :\t{sk}\n\n"
+FOOTER = "\nSent with ❤️ from the ☁️"
+
+def _text(value):
+    return '' if value is None else str(value)
+
+_CONVERSIONS = { 's': str, 'r': repr, 'a': ascii }
+
+def _page(image):
+    # the page name, without the write shard suffix of sharded pages (see SHARD_COUNT)
+    pk = image.get('pk')
+    return sharding.base_pk(pk) if isinstance(pk, str) else pk
+
+# fields templates can use when the item has no attribute of that name
+DERIVED = { 'page': _page }
+
+def _default_parts(images):
+    """ DEFAULT_TEMPLATE written out, for the common case of string pk, name and sk attributes
+        with no sharding ({page} is the pk), None when an image needs Template.render()
+    """
+    typed = [ image.typed for image in images if 'page' not in image.typed ]
+    if len(typed) < len(images) or sharding.shard_count() > 1:
+        return None
+    try:
+        return [ f"Page :\t{t['pk']['S']}\nName :\t{t['name']['S']}\nEmail :\t{t['sk']['S']}\n\n" for t in typed ]
+    except KeyError:
+        # a missing or non string attribute
+        return None
+
+class Template:
+    """ A str.format() template, parsed once into its literal and field parts """
+
+    def __init__(self, text):
+        self.text = text
+
+        fields = []
+        # (literal, name, conversion, spec), name is None after the last field
+        parts = []
+        for literal, name, spec, conversion in Formatter().parse(text):
+            if name is not None:
+                if spec and '{' in spec:
+                    raise ValueError(f'Nested format specifications are not supported: {text!r}')
+                if name not in fields:
+                    fields.append(name)
+            parts.append((literal, name, _CONVERSIONS[conversion] if conversion else None, spec))
+
+        self.fields = tuple(fields)
+        self.parts = tuple(parts)
+
+    def render(self, image):
+        """ image is a decoded stream image (see decoder.Image), only the attributes used by the template
+            are read and missing ones render as empty strings
+        """
+        get = image.get
+        result = []
+        for literal, name, conversion, spec in self.parts:
+            result.append(literal)
+            if name is not None:
+                value = get(name)
+                if value is None and name in DERIVED:
+                    value = DERIVED[name](image)
+                value = _text(value)
+                if conversion is not None:
+                    value = conversion(value)
+                result.append(format(value, spec) if spec else value)
+        return ''.join(result)
+
+class NotificationRenderer:
+    """ Builds the notification subject and body for a batch of new items in a single pass """
+
+    def __init__(self, templates=None, default=DEFAULT_TEMPLATE, footer=FOOTER):
+        self.default = Template(default)
+        self.footer = footer
+        self.templates = {}
+        for pk, text in (templates or {}).items():
+            self.register(pk, text)
+
+    @classmethod
+    def from_env(cls):
+        # NOTIFICATION_TEMPLATES is a JSON object mapping a form pk to its template
+        templates = json.loads(os.environ.get('NOTIFICATION_TEMPLATES', '{}'))
+        return cls(templates)
+
+    def register(self, pk, text):
+        self.templates[pk] = Template(text)
+
+    def template_for(self, pk):
+        # the items of a sharded page share the page template
+        return self.templates.get(sharding.base_pk(pk) if pk else pk, self.default)
+
+    def render_one(self, image):
+        return self.template_for(image.get('pk')).render(image)
+
+    def render(self, images):
+        """ images is a list of decoded stream images, returns (subject, message) or (None, None)
+            when there is nothing to notify
+        """
+        templates = self.templates
+        if not templates and self.default.text == DEFAULT_TEMPLATE:
+            parts = _default_parts(images)
+            if parts is not None:
+                return self.compose(parts)
+        if templates:
+            template_for = self.template_for
+            parts = [ template_for(image.get('pk')).render(image) for image in images ]
+        else:
+            render = self.default.render
+            parts = [ render(image) for image in images ]
+        return self.compose(parts)
+
+    def compose(self, parts):
+        """ subject and message from already rendered items, see render_one() """
+        count = len(parts)
+        if count == 0:
+            return None, None
+
+        plural = 's' if count > 1 else ''
+        subject = f"You have {count} new subscription{plural}"
+        return subject, ''.join(parts) + self.footer
+
+_renderers = {}
+
+# renderer for the current NOTIFICATION_TEMPLATES value, reused across warm invocations
+def renderer():
+    key = os.environ.get('NOTIFICATION_TEMPLATES')
+    result = _renderers.get(key)
+    if result is None:
+        result = NotificationRenderer.from_env()
+        _renderers[key] = result
+    return result
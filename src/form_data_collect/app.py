@@ -1,110 +1,408 @@
 import os
 import json
+import math
 import logging
-import base64
-from datetime import datetime
-from urllib.parse import parse_qs
+import time
 
-import boto3 
-import botocore
-import botocore.errorfactory
-from boto3.dynamodb.conditions import Key, Attr
+from common import codec
+from common import logs
+from common import sharding
+from common import metrics
 
-log = logging.getLogger('data-collection-form')
-log.setLevel(logging.DEBUG)
+# boto3 is not used, and botocore is only imported when the first client is built (see dynamodb.py):
+# importing them is the largest part of the cold start
+from . import bulk
+from . import dedup
+from . import dynamodb
+from . import formparser
+from . import projection
+from . import ratelimit
+from . import retention
+from . import retry
+from . import schema
+from . import writebehind
+
+# LOG_LEVEL, INFO by default
+log = logs.get_logger('data-collection-form')
+
+# step timings, emitted as one EMF line per invocation
+recorder = metrics.Recorder('FormDataCollectFunction')
 
 try:
     REGION_NAME = os.environ['AWS_REGION']
-    log.info(f'Going to use region name {REGION_NAME}')
+    log.info('Going to use region name %s', REGION_NAME)
 except KeyError:
     log.warning("No AWS_REGION environment variable defined, using default 'eu-central-1'")
     REGION_NAME = 'eu-central-1'
 
-def dynamodb_resource():
-    result = None 
+BULK_ROUTE = 'POST /form/bulk'
 
-    DDB_LOCAL_ENDPOINT = 'http://localhost:8000'
+DDB_LOCAL_ENDPOINT = 'http://localhost:8000'
 
+# clients are expensive to build (credential resolution, endpoint and model loading)
+# but safe to reuse, so we keep them at module level where they survive across warm
+# invocations of the same container
+_resources = {}
+_tables = {}
+_queues = {}
+
+def dynamodb_endpoint():
+    # allows to point to a local stand-in for tests and benchmarks
+    if 'DYNAMODB_ENDPOINT_URL' in os.environ:
+        return os.environ['DYNAMODB_ENDPOINT_URL']
     # check if we are running on AWS Lambda or locally (for tests)
-    try:
-        LAMBDA_RUNTIME = os.environ['AWS_EXECUTION_ENV']
+    if 'AWS_EXECUTION_ENV' in os.environ:
         # we assume we're running on Lambda
-        session = boto3.Session(region_name=REGION_NAME)
-        result = session.resource('dynamodb')
-    except KeyError:
-        # env var does not exist, assume we're running locally
-        log.info("We're running locally for tests.  Did you start DynamoDB local ?")
-        session = boto3.Session(region_name=REGION_NAME)
-        result = session.resource('dynamodb', endpoint_url=DDB_LOCAL_ENDPOINT)
+        return None
+    # env var does not exist, assume we're running locally
+    return DDB_LOCAL_ENDPOINT
+
+def dynamodb_config():
+    from botocore.config import Config
+
+    # tunable through environment variables, defaults are sized for a 3 secs Lambda timeout
+    # botocore makes a single attempt: retries are made by retry.call(), which knows the invocation deadline
+    return Config(
+        max_pool_connections=int(os.environ.get('DYNAMODB_MAX_POOL_CONNECTIONS', '10')),
+        connect_timeout=float(os.environ.get('DYNAMODB_CONNECT_TIMEOUT', '0.5')),
+        read_timeout=float(os.environ.get('DYNAMODB_READ_TIMEOUT', '1')),
+        retries={
+            'mode': os.environ.get('DYNAMODB_RETRY_MODE', 'standard'),
+            'total_max_attempts': 1
+        }
+    )
+
+def dynamodb_retries():
+    """ retry.call() arguments, an attempt lasts at most the connect plus the read timeout """
+    return {
+        'max_attempts': int(os.environ.get('DYNAMODB_MAX_ATTEMPTS', '3')),
+        'attempt_budget': float(os.environ.get('DYNAMODB_CONNECT_TIMEOUT', '0.5')) + float(os.environ.get('DYNAMODB_READ_TIMEOUT', '1'))
+    }
+
+def dynamodb_resource():
+    endpoint = dynamodb_endpoint()
+    key = (REGION_NAME, endpoint)
+
+    result = _resources.get(key)
+    if result is None:
+        if endpoint is not None:
+            log.info("We're running locally for tests.  Did you start DynamoDB local ?")
+        result = dynamodb.Resource(dynamodb.create_client(REGION_NAME, endpoint, dynamodb_config()))
+        _resources[key] = result
+
+    return result
+
+def dynamodb_table(table_name):
+    key = (REGION_NAME, dynamodb_endpoint(), table_name)
+
+    result = _tables.get(key)
+    if result is None:
+        result = dynamodb_resource().Table(table_name)
+        _tables[key] = result
 
     return result
 
+def rate_limit_config():
+    from botocore.config import Config
+
+    # the shared rate limit is checked on the way to the write, it gives up quickly (the request
+    # is allowed) rather than eat into the time the write needs before the deadline
+    return Config(
+        max_pool_connections=int(os.environ.get('DYNAMODB_MAX_POOL_CONNECTIONS', '10')),
+        connect_timeout=float(os.environ.get('RATE_LIMIT_CONNECT_TIMEOUT', '0.2')),
+        read_timeout=float(os.environ.get('RATE_LIMIT_READ_TIMEOUT', '0.3')),
+        retries={
+            'mode': 'standard',
+            'total_max_attempts': 1
+        }
+    )
+
+def rate_limit_table(table_name):
+    # RATE_LIMIT_MODE=dynamodb, a client of its own for the shorter timeouts
+    endpoint = dynamodb_endpoint()
+    key = (REGION_NAME, endpoint, table_name, 'rate-limit')
+
+    result = _tables.get(key)
+    if result is None:
+        result = dynamodb.Resource(dynamodb.create_client(REGION_NAME, endpoint, rate_limit_config())).Table(table_name)
+        _tables[key] = result
+
+    return result
+
+def write_queue_config():
+    from botocore.config import Config
+
+    # WRITE_QUEUE_* environment variables, as for DynamoDB a single attempt per retry.call() attempt:
+    # a send must give up early enough to answer a 503 before the function times out
+    return Config(
+        max_pool_connections=int(os.environ.get('WRITE_QUEUE_MAX_POOL_CONNECTIONS', '10')),
+        connect_timeout=float(os.environ.get('WRITE_QUEUE_CONNECT_TIMEOUT', '0.5')),
+        read_timeout=float(os.environ.get('WRITE_QUEUE_READ_TIMEOUT', '1')),
+        retries={
+            'mode': 'standard',
+            'total_max_attempts': 1
+        }
+    )
+
+def write_queue_retries():
+    """ retry.call() arguments of the write-behind send """
+    return {
+        'service': 'SQS',
+        'max_attempts': int(os.environ.get('WRITE_QUEUE_MAX_ATTEMPTS', '3')),
+        'attempt_budget': float(os.environ.get('WRITE_QUEUE_CONNECT_TIMEOUT', '0.5')) + float(os.environ.get('WRITE_QUEUE_READ_TIMEOUT', '1'))
+    }
+
+def write_queue():
+    # WRITE_QUEUE=local is an in-process stand-in for tests
+    if os.environ.get('WRITE_QUEUE', 'sqs').lower() == 'local':
+        return writebehind.local_queue
+
+    queue_url = os.environ['WRITE_QUEUE_URL']
+    key = (REGION_NAME, queue_url)
+
+    result = _queues.get(key)
+    if result is None:
+        import botocore.session
+        client = botocore.session.get_session().create_client('sqs', region_name=REGION_NAME, config=write_queue_config())
+        result = writebehind.SQSQueue(client, queue_url)
+        _queues[key] = result
+
+    return result
+
+# drop cached resources and tables, next call will build fresh ones (used by tests)
+def reset_cache():
+    _resources.clear()
+    _tables.clear()
+    _queues.clear()
+
 # wrap in a separate function for easy mocking during tests 
 # https://stackoverflow.com/questions/23988853/how-to-mock-set-system-date-in-pytest
 def now():
-    # return datetime.now()
-    return int(datetime.utcnow().timestamp())
+    return int(time.time())
+
+def prepare_item(event, data):
+    # always a number, it is the sort key of the created_at index
+    data['created_at'] = now()
+    # only keep the interesting parts of the request, the full event is several times the form size
+    data['event'] = projection.project_event(event)
+    if projection.store_raw_event():
+        data['raw_event'] = projection.compress_event(event)
+    data['sk'] = data[data['sk']]
+    # RETENTION_DAYS / RETENTION_POLICY, the table TTL deletes the item after expires_at
+    expires = retention.expires_at(data['pk'], data['created_at'])
+    if expires is not None:
+        data['expires_at'] = expires
+    else:
+        # never taken from the submission, it would decide when the item is deleted
+        data.pop('expires_at', None)
+    # high volume pages spread their items over several partition keys, see SHARD_COUNT
+    shards = sharding.shard_count()
+    if sharding.is_sharded(data['pk'], shards):
+        data['pk'] = sharding.shard_pk(data['pk'], str(data['sk']), shards)
+    # COMPRESSION, large free text fields and the stored event become Binary values
+    compression = codec.codec()
+    if compression is not None:
+        data.update(compression.encode_item(data))
+    return data
+
+# returns False when the submission is a duplicate and was not written
+# raises retry.Unavailable (a TimeoutError) when DynamoDB, or the write-behind queue, can not be reached before the deadline
+def write_data(table_name, event, data, deadline=None):
+    from botocore.exceptions import BotoCoreError, ClientError
+
+    dedup_mode = dedup.mode()
+    key = None
+    if dedup_mode != 'off':
+        dedup.stats.requests += 1
+        key = dedup.fingerprint(data.get('pk'), data.get(data.get('sk')), data)
+        if dedup.cache.seen(key, now(), dedup.window()):
+            dedup.stats.local_hits += 1
+            recorder.record('dedup_local_hit', 1, 'Count')
+            log.info('Duplicate submission, not writing it %s', dedup.stats)
+            return False
+
+    prepare_item(event, data)
 
-def write_data(table_name, event, data):
+    condition = {}
+    if dedup_mode == 'conditional':
+        data['payload_hash'] = key[2]
+        condition = dedup.condition(data['created_at'], key[2])
 
+    if writebehind.mode() == 'write-behind':
+        # the consumer writes it later, duplicates reaching another container are not caught by a condition
+        queue = write_queue()
+        try:
+            with recorder.timer('enqueue'):
+                retry.call(lambda: queue.send(data), deadline, **write_queue_retries())
+        except (BotoCoreError, ClientError) as e:
+            # e.g. a denied or missing queue, the client tries again later rather than getting a 502
+            raise retry.Unavailable(f'Write queue unavailable: {e!r}') from e
+        if key is not None:
+            dedup.cache.add(key, data['created_at'])
+        return True
+
+    table = dynamodb_table(table_name)
     try:
-        data['created_at'] = now()
-        data['event'] = event
-        data['sk'] = data[data['sk']]
+        with recorder.timer('dynamodb'):
+            # a retry after a write which succeeded but timed out is rejected by the condition, as a duplicate
+            response = retry.call(lambda: table.put_item(Item=data, **condition), deadline, **dynamodb_retries())
+    except ClientError as e:
+        if not condition or e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        dedup.stats.conditional_hits += 1
+        recorder.record('dedup_conditional_hit', 1, 'Count')
+        dedup.cache.add(key, data['created_at'])
+        log.info('Duplicate submission rejected by DynamoDB %s', dedup.stats)
+        return False
 
-        table = dynamodb_resource().Table(table_name)
-        response = table.put_item(Item=data)
+    if key is not None:
+        dedup.cache.add(key, data['created_at'])
 
+    if log.isEnabledFor(logging.DEBUG):
         log.debug(json.dumps(response))
+    return True
+
+def bulk_write_data(table_name, event, submissions, deadline=None):
+
+    # every item keeps a copy of the request, without the body holding all the other submissions
+    event = { k: v for k, v in event.items() if k != 'body' }
+
+    statuses = [ None ] * len(submissions)
+    items = {}
+    for index, data in enumerate(submissions):
+        if isinstance(data, bulk.InvalidSubmission):
+            statuses[index] = { 'index': index, 'status': 'INVALID', 'error': str(data) }
+            continue
+        try:
+            item = prepare_item(event, schema.validate(data, dynamodb_table))
+            key = bulk.item_key(item)
+        except schema.ValidationError as e:
+            statuses[index] = { 'index': index, 'status': 'INVALID', 'error': str(e) }
+            continue
+        except KeyError as e:
+            statuses[index] = { 'index': index, 'status': 'INVALID', 'error': f'Missing field {e}' }
+            continue
+
+        # a batch can not hold the same key twice, the last submission wins as it would with put_item
+        if key in items:
+            statuses[items[key][0]] = { 'index': items[key][0], 'status': 'DUPLICATE' }
+        items[key] = (index, item)
+
+    with recorder.timer('dynamodb'):
+        failed = bulk.batch_write(dynamodb_resource(), table_name, [ item for _, item in items.values() ],
+                                  deadline=deadline, retries=dynamodb_retries())
+
+    for key, (index, _) in items.items():
+        statuses[index] = { 'index': index, 'status': 'FAILED' if key in failed else 'OK' }
+
+    return statuses
+
+def http_response(status_code, body, headers=None):
+    response = {
+        'statusCode': status_code,
+        'headers': dict({
+            'Content-Type': 'application/json'
+        }, **(headers or {})),
+        "isBase64Encoded": False,
+        'body': json.dumps(body)
+    }
+    log.debug('%s', response)
+    return response
+
+def unavailable_response(e):
+    log.error('Storage unavailable: %r', e)
+    return http_response(503, { 'error' : 'Service unavailable, try again later' }, { 'Retry-After': '1' })
+
+def too_many_requests_response(kind, wait):
+    log.info('Rate limited on %s, retry in %.1fs', kind, wait)
+    recorder.record('throttled', 1, 'Count')
+    return http_response(429, { 'error' : 'Too many requests, try again later' }, { 'Retry-After': str(max(1, math.ceil(wait))) })
+
+def bulk_handler(table_name, event, body, deadline=None):
+
+    try:
+        submissions = bulk.parse_submissions(body, formparser.Limits.from_env())
+    except bulk.InvalidSubmission as e:
+        return http_response(400, { 'error' : str(e) })
+
+    max_submissions = int(os.environ.get('MAX_BULK_SUBMISSIONS', '1000'))
+    if len(submissions) > max_submissions:
+        return http_response(413, { 'error' : f'Too many submissions, maximum is {max_submissions}' })
 
-    except botocore.exceptions.EndpointConnectionError:
-        log.error("Timeout when calling DynamoDB")
-        raise TimeoutError
+    log.debug('Writing %d submissions to dynamodb', len(submissions))
+    # items not written because DynamoDB is unavailable are FAILED, the others keep their status
+    statuses = bulk_write_data(table_name, event, submissions, deadline)
+    log.debug('Done writing to dynamodb')
+
+    written = sum(1 for s in statuses if s['status'] == 'OK')
+    return http_response(200, {
+        'status' : 'OK' if written == len(statuses) else 'PARTIAL',
+        'submissions' : len(statuses),
+        'written' : written,
+        'items' : statuses
+    })
 
+@recorder.instrument
+@logs.debug_sampling(log)
 def lambda_handler(event, context):
 
-    log.debug(event) 
+    log.debug('%s', event)
 
     # Get table name 
     try:
         DDB_TABLE_NAME = os.environ['TABLE_NAME']
-        log.info(f'Going to use table name {DDB_TABLE_NAME}')
+        log.debug('Going to use table name %s', DDB_TABLE_NAME)
     except KeyError:
         log.error("No TABLE_NAME environment variable defined, calls will fail with error code 500")
-        response = {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json'
-            },
-            "isBase64Encoded": False,
-            'body': json.dumps({ 'error' : 'Environment variable TABLE_NAME is not defined:'})
-        }
-        return response
+        return http_response(500, { 'error' : 'Environment variable TABLE_NAME is not defined:'})
 
-    body = None 
-    if event['isBase64Encoded']:
-        body = base64.b64decode(event['body']).decode('utf-8')
-    else:
-        body = event['body']
- 
-    data = parse_qs(body)
-    data = { k: v if type(v) != list else v[0] for k, v in data.items()}
-    log.debug(data)
+    # DynamoDB calls must end before the function times out, leaving time to answer
+    deadline = retry.deadline(context, int(os.environ.get('DEADLINE_MARGIN_MS', '300')))
+
+    # RATE_LIMIT_MODE, a flood from one source is turned away before its body is decoded
+    wait = ratelimit.check(ratelimit.IP, ratelimit.source_ip(event), rate_limit_table)
+    if wait:
+        return too_many_requests_response(ratelimit.IP, wait)
+
+    limits = formparser.Limits.from_env()
+    is_bulk = event.get('routeKey') == BULK_ROUTE
+    max_body_size = int(os.environ.get('MAX_BULK_BODY_SIZE', '1048576')) if is_bulk else limits.max_body_size
+
+    # limits are checked first, an oversized body is rejected before it is decoded or parsed
+    try:
+        with recorder.timer('decode'):
+            body = formparser.decode_body(event, max_body_size)
+
+        if is_bulk:
+            return bulk_handler(DDB_TABLE_NAME, event, body, deadline)
+
+        with recorder.timer('parse'):
+            media_type, parameters = formparser.content_type(event)
+            data = formparser.parse(body, media_type, parameters, limits)
+    except formparser.LimitExceeded as e:
+        return http_response(413, { 'error' : str(e) })
+    except formparser.InvalidBody as e:
+        return http_response(400, { 'error' : str(e) })
+
+    wait = ratelimit.check(ratelimit.PAGE, data.get('pk'), rate_limit_table)
+    if wait:
+        return too_many_requests_response(ratelimit.PAGE, wait)
+
+    # rejected before any DynamoDB call, unknown fields are removed
+    try:
+        with recorder.timer('validate'):
+            data = schema.validate(data, dynamodb_table)
+    except schema.ValidationError as e:
+        return http_response(400, { 'error' : str(e), 'errors' : e.errors })
+    log.debug('%s', data)
 
     log.debug('Writing to dynamodb')
-    write_data(DDB_TABLE_NAME, event, data)
+    try:
+        written = write_data(DDB_TABLE_NAME, event, data, deadline)
+    except retry.Unavailable as e:
+        return unavailable_response(e)
     log.debug('Done writing to dynamodb')
 
-    #TODO catch exceptions and return 500 
-    
-    response = {
-        'statusCode': 200,
-        'headers': {
-            'Content-Type': 'application/json'
-        },        
-        "isBase64Encoded": False,
-        'body': json.dumps({ 'status' : 'OK' })
-    }
-    log.debug(response)
-
-    return response
+    if not written:
+        return http_response(200, { 'status' : 'OK', 'duplicate' : True })
+    return http_response(200, { 'status' : 'OK' })
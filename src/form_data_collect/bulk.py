@@ -0,0 +1,141 @@
+import json
+import time
+import random
+import logging
+from urllib.parse import parse_qs
+
+from . import formparser
+from . import retry
+
+log = logging.getLogger('data-collection-form')
+
+# DynamoDB BatchWriteItem accepts at most 25 put requests per call
+BATCH_SIZE = 25
+
+class InvalidSubmission(ValueError):
+    pass
+
+def _parse_line(line):
+    if line.startswith('{'):
+        data = json.loads(line)
+    else:
+        data = parse_qs(line)
+        data = { k: v if type(v) != list else v[0] for k, v in data.items()}
+    return data
+
+def _check_fields(data, limits):
+    # JSON submissions may hold numbers, null or nested values where DynamoDB expects string keys
+    try:
+        return formparser.check_fields(data, limits)
+    except (formparser.InvalidBody, formparser.LimitExceeded) as e:
+        return InvalidSubmission(str(e))
+
+def parse_submissions(body, limits=None):
+    """ parses a JSON array, newline delimited JSON or newline delimited urlencoded forms
+
+        returns a list with one entry per submission, either a dict or an InvalidSubmission,
+        every submission is checked against the single submission limits (formparser.Limits)
+    """
+    limits = limits or formparser.Limits()
+    result = []
+
+    text = body.strip()
+    if text.startswith('['):
+        try:
+            submissions = json.loads(text)
+        except ValueError as e:
+            raise InvalidSubmission(f'Body is not a valid JSON array: {e}')
+        for data in submissions:
+            result.append(_check_fields(data, limits) if isinstance(data, dict) else InvalidSubmission('Submission is not an object'))
+        return result
+
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = _parse_line(line)
+        except ValueError as e:
+            data = InvalidSubmission(f'Submission is not valid JSON: {e}')
+        if isinstance(data, dict) and not data:
+            data = InvalidSubmission('Submission is empty')
+        elif isinstance(data, dict):
+            data = _check_fields(data, limits)
+        result.append(data if isinstance(data, (dict, InvalidSubmission)) else InvalidSubmission('Submission is not an object'))
+
+    return result
+
+# wrap in a separate function for easy mocking during tests
+def sleep(seconds):
+    time.sleep(seconds)
+
+def chunks(items, size=BATCH_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def item_key(item):
+    return (item['pk'], item['sk'])
+
+def is_rejected(error):
+    # an invalid item fails the whole BatchWriteItem call, e.g. when it is larger than 400 KB,
+    # or the serialization of the request when it holds a value DynamoDB can not store
+    from botocore.exceptions import ClientError
+
+    if isinstance(error, TypeError):
+        return True
+    return isinstance(error, ClientError) and error.response.get('Error', {}).get('Code') == 'ValidationException'
+
+def batch_write(resource, table_name, items, max_attempts=5, base_delay=0.05, deadline=None, retries=None, clock=time.monotonic):
+    """ writes items with BatchWriteItem, 25 at a time, retrying UnprocessedItems with exponential backoff
+
+        items must have distinct keys, returns the set of (pk, sk) keys that could not be written,
+        including the ones left when the deadline (a time.monotonic() value) is reached or when
+        DynamoDB is unavailable, the chunks already written keep their status
+        retries are the retry.call() arguments for failed calls, e.g. connection errors
+    """
+    failed = set()
+    retries = retries or {}
+
+    for index, chunk in enumerate(chunks(items)):
+        requests = [ { 'PutRequest': { 'Item': item } } for item in chunk ]
+
+        attempt = 0
+        while requests:
+            if deadline is not None and clock() + retries.get('attempt_budget', 0.0) > deadline:
+                log.error('No time left to write %d items', len(requests))
+                failed.update(item_key(r['PutRequest']['Item']) for r in requests)
+                break
+
+            try:
+                response = retry.call(lambda: resource.batch_write_item(RequestItems={ table_name: requests }), deadline, **retries)
+            except retry.Unavailable as e:
+                # no more attempts, this chunk and the next ones are reported failed rather than the whole request
+                remaining = items[(index + 1) * BATCH_SIZE:]
+                log.error('DynamoDB unavailable, %d items not written: %r', len(requests) + len(remaining), e)
+                failed.update(item_key(r['PutRequest']['Item']) for r in requests)
+                failed.update(item_key(item) for item in remaining)
+                return failed
+            except Exception as e:
+                if not is_rejected(e):
+                    raise
+                if len(requests) == 1:
+                    log.error('Item rejected by DynamoDB: %r', e)
+                    failed.add(item_key(requests[0]['PutRequest']['Item']))
+                else:
+                    # the other items of the chunk are written one by one, only the invalid one fails
+                    for request in requests:
+                        failed |= batch_write(resource, table_name, [ request['PutRequest']['Item'] ], max_attempts, base_delay, deadline, retries, clock)
+                break
+            requests = response.get('UnprocessedItems', {}).get(table_name, [])
+            attempt += 1
+
+            if requests and attempt >= max_attempts:
+                log.error('%d items still unprocessed after %d attempts', len(requests), attempt)
+                failed.update(item_key(r['PutRequest']['Item']) for r in requests)
+                break
+
+            if requests:
+                # exponential backoff with full jitter, as recommended for throttled batch writes
+                sleep(random.uniform(0, base_delay * (2 ** attempt)))
+
+    return failed
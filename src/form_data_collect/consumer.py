@@ -0,0 +1,66 @@
+import os
+import logging
+
+from . import app
+from . import bulk
+from . import retry
+from . import writebehind
+
+log = logging.getLogger('data-collection-form')
+
+def write_items(table_name, bodies, deadline=None):
+    """ writes queued items with BatchWriteItem, returns the indexes of the bodies which could not be written """
+    failed = []
+    latest = {}
+    indexes = {}
+    for index, body in enumerate(bodies):
+        try:
+            item = writebehind.decode_item(body)
+            key = bulk.item_key(item)
+        except (ValueError, KeyError, TypeError) as e:
+            log.error('Can not decode queued item %d: %r', index, e)
+            failed.append(index)
+            continue
+        # a batch can not hold the same key twice, the last one wins as it would with put_item
+        latest[key] = item
+        indexes.setdefault(key, []).append(index)
+
+    try:
+        failed_keys = bulk.batch_write(app.dynamodb_resource(), table_name, list(latest.values()),
+                                       deadline=deadline, retries=app.dynamodb_retries())
+    except retry.Unavailable as e:
+        # every decoded item is redelivered, the malformed ones go to the dead letter queue
+        log.error('DynamoDB unavailable, %d queued items not written: %r', len(latest), e)
+        failed_keys = latest.keys()
+    for key in failed_keys:
+        failed.extend(indexes[key])
+
+    return sorted(failed)
+
+def drain(queue, table_name, batch_size=bulk.BATCH_SIZE):
+    """ empties a LocalQueue into the table, returns the number of items written and failed """
+    written = 0
+    failed = 0
+    while True:
+        bodies = queue.receive(batch_size)
+        if not bodies:
+            return written, failed
+        errors = write_items(table_name, bodies)
+        written += len(bodies) - len(errors)
+        failed += len(errors)
+
+# SQS event source, partial batch responses make SQS redeliver failed messages only
+def lambda_handler(event, context):
+
+    table_name = os.environ['TABLE_NAME']
+    records = event['Records']
+
+    # unwritten messages are reported before the function times out, which would redeliver all of them
+    deadline = retry.deadline(context, int(os.environ.get('DEADLINE_MARGIN_MS', '300')))
+    failed = write_items(table_name, [ r['body'] for r in records ], deadline)
+    if failed:
+        log.warning('%d of %d queued items not written, they will be retried', len(failed), len(records))
+
+    return {
+        'batchItemFailures': [ { 'itemIdentifier': records[i]['messageId'] } for i in failed ]
+    }
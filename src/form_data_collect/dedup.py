@@ -0,0 +1,91 @@
+import os
+import json
+import hashlib
+from collections import OrderedDict
+
+# attributes added by the function itself, not part of what the user submitted
+IGNORED_FIELDS = ('created_at', 'expires_at', 'event', 'raw_event', 'payload_hash')
+
+def payload_hash(data):
+    # normalized: keys sorted, surrounding white space removed
+    payload = { k: v.strip() if isinstance(v, str) else v for k, v in data.items() if k not in IGNORED_FIELDS }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def fingerprint(pk, sk, data):
+    return (pk, sk, payload_hash(data))
+
+class DedupCache:
+    """ LRU of recently written submissions, with the time they were written """
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+
+    def seen(self, key, now, window):
+        written_at = self.entries.get(key)
+        if written_at is not None and now - written_at < window:
+            self.entries.move_to_end(key)
+            return True
+        return False
+
+    def add(self, key, now):
+        self.entries[key] = now
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+class DedupStats:
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.requests = 0
+        self.local_hits = 0
+        self.conditional_hits = 0
+
+    @property
+    def saved_writes(self):
+        # a duplicate rejected by a conditional write is still billed, only local hits save the write
+        return self.local_hits
+
+    @property
+    def hit_rate(self):
+        return (self.local_hits + self.conditional_hits) / self.requests if self.requests else 0.0
+
+    def as_dict(self):
+        return {
+            'requests': self.requests,
+            'local_hits': self.local_hits,
+            'conditional_hits': self.conditional_hits,
+            'saved_writes': self.saved_writes,
+            'hit_rate': self.hit_rate
+        }
+
+    # formatted only when a log line is actually emitted
+    def __repr__(self):
+        return repr(self.as_dict())
+
+def mode():
+    # off, local (in-process LRU) or conditional (LRU plus a conditional put_item)
+    return os.environ.get('DEDUP_MODE', 'off').lower()
+
+def window():
+    return int(os.environ.get('DEDUP_WINDOW', '300'))
+
+# process wide, survives across warm invocations of the same container
+cache = DedupCache(max_size=int(os.environ.get('DEDUP_CACHE_SIZE', '1024')))
+stats = DedupStats()
+
+def condition(now, digest):
+    """ put_item arguments writing the item unless the same payload was written within the window """
+    return {
+        'ConditionExpression': 'attribute_not_exists(pk) OR created_at < :cutoff OR payload_hash <> :hash',
+        'ExpressionAttributeValues': {
+            ':cutoff': now - window(),
+            ':hash': digest
+        }
+    }
@@ -0,0 +1,160 @@
+import math
+from decimal import Decimal
+
+from common import codec
+
+# A thin layer over the low level botocore DynamoDB client, exposing the few boto3 resource
+# methods we use (Table.put_item, get_item, query, scan, batch_write_item) with plain Python values.
+#
+# Importing boto3 and building a resource costs a significant part of our cold start,
+# botocore alone is enough: it is imported when the first client is built, not at import time.
+
+def serialize(value):
+    """ converts a Python value into a typed DynamoDB attribute value, e.g. 'text' -> { 'S': 'text' } """
+    if isinstance(value, str):
+        return { 'S': value }
+    if isinstance(value, bool):
+        return { 'BOOL': value }
+    if value is None:
+        return { 'NULL': True }
+    if isinstance(value, (int, Decimal)):
+        return { 'N': str(value) }
+    if isinstance(value, float):
+        if not math.isfinite(value):
+            raise TypeError(f'Infinity and NaN are not supported: {value!r}')
+        return { 'N': repr(value) }
+    if isinstance(value, (bytes, bytearray)):
+        return { 'B': bytes(value) }
+    if isinstance(value, dict):
+        return { 'M': { k: serialize(v) for k, v in value.items() } }
+    if isinstance(value, (list, tuple)):
+        return { 'L': [ serialize(v) for v in value ] }
+    if isinstance(value, (set, frozenset)) and value:
+        if all(isinstance(v, str) for v in value):
+            return { 'SS': list(value) }
+        if all(isinstance(v, (int, Decimal)) and not isinstance(v, bool) for v in value):
+            return { 'NS': [ str(v) for v in value ] }
+        if all(isinstance(v, (bytes, bytearray)) for v in value):
+            return { 'BS': [ bytes(v) for v in value ] }
+    raise TypeError(f'Unsupported type {type(value)} for value {value!r}')
+
+def serialize_item(item):
+    return { k: serialize(v) for k, v in item.items() }
+
+def _number(text):
+    try:
+        return int(text)
+    except ValueError:
+        return Decimal(text)
+
+def deserialize(attribute):
+    """ converts a typed DynamoDB attribute value into a Python value, e.g. { 'S': 'text' } -> 'text' """
+    (tag, value), = attribute.items()
+    if tag == 'S' or tag == 'BOOL':
+        return value
+    if tag == 'N':
+        return _number(value)
+    if tag == 'NULL':
+        return None
+    if tag == 'B':
+        # attributes compressed by common.codec read back as they were written
+        return codec.decode(bytes(value))
+    if tag == 'M':
+        return { k: deserialize(v) for k, v in value.items() }
+    if tag == 'L':
+        return [ deserialize(v) for v in value ]
+    if tag == 'SS':
+        return set(value)
+    if tag == 'NS':
+        return { _number(v) for v in value }
+    if tag == 'BS':
+        return { bytes(v) for v in value }
+    raise TypeError(f'Unsupported DynamoDB attribute value {attribute!r}')
+
+def deserialize_item(item):
+    return { k: deserialize(v) for k, v in item.items() }
+
+def _key(typed):
+    # our tables are keyed on pk and sk
+    return (repr(typed.get('pk')), repr(typed.get('sk')))
+
+def create_client(region_name, endpoint_url=None, config=None):
+    import botocore.session
+
+    session = botocore.session.get_session()
+    return session.create_client('dynamodb', region_name=region_name, endpoint_url=endpoint_url, config=config)
+
+class Table:
+
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def put_item(self, Item, **kwargs):
+        if 'ExpressionAttributeValues' in kwargs:
+            kwargs['ExpressionAttributeValues'] = serialize_item(kwargs['ExpressionAttributeValues'])
+        return self.client.put_item(TableName=self.name, Item=serialize_item(Item), **kwargs)
+
+    def get_item(self, Key, **kwargs):
+        response = self.client.get_item(TableName=self.name, Key=serialize_item(Key), **kwargs)
+        if 'Item' in response:
+            response['Item'] = deserialize_item(response['Item'])
+        return response
+
+    def update_item(self, Key, **kwargs):
+        if 'ExpressionAttributeValues' in kwargs:
+            kwargs['ExpressionAttributeValues'] = serialize_item(kwargs['ExpressionAttributeValues'])
+        response = self.client.update_item(TableName=self.name, Key=serialize_item(Key), **kwargs)
+        if 'Attributes' in response:
+            response['Attributes'] = deserialize_item(response['Attributes'])
+        return response
+
+    def _read(self, operation, kwargs):
+        for name in ('ExpressionAttributeValues', 'ExclusiveStartKey'):
+            if name in kwargs:
+                kwargs[name] = serialize_item(kwargs[name])
+        response = operation(TableName=self.name, **kwargs)
+        response['Items'] = [ deserialize_item(item) for item in response.get('Items', []) ]
+        if 'LastEvaluatedKey' in response:
+            response['LastEvaluatedKey'] = deserialize_item(response['LastEvaluatedKey'])
+        return response
+
+    def query(self, **kwargs):
+        """ one page of results, ExclusiveStartKey and LastEvaluatedKey are plain Python values too """
+        return self._read(self.client.query, kwargs)
+
+    def scan(self, **kwargs):
+        """ one page of results, as query() """
+        return self._read(self.client.scan, kwargs)
+
+class Resource:
+
+    def __init__(self, client):
+        self.client = client
+        self.meta = client.meta
+
+    def Table(self, name):
+        return Table(self.client, name)
+
+    def batch_write_item(self, RequestItems):
+        """ put requests only, UnprocessedItems are returned with the original Python items """
+        originals = {}
+        typed_requests = {}
+        for table_name, requests in RequestItems.items():
+            typed_requests[table_name] = []
+            for request in requests:
+                item = request['PutRequest']['Item']
+                typed = serialize_item(item)
+                originals[(table_name,) + _key(typed)] = item
+                typed_requests[table_name].append({ 'PutRequest': { 'Item': typed } })
+
+        response = self.client.batch_write_item(RequestItems=typed_requests)
+
+        unprocessed = {}
+        for table_name, requests in response.get('UnprocessedItems', {}).items():
+            unprocessed[table_name] = [
+                { 'PutRequest': { 'Item': originals[(table_name,) + _key(r['PutRequest']['Item'])] } }
+                for r in requests
+            ]
+        response['UnprocessedItems'] = unprocessed
+        return response
@@ -0,0 +1,245 @@
+import io
+import csv
+import sys
+import json
+import queue
+import base64
+import argparse
+import contextlib
+import threading
+from decimal import Decimal
+
+from common import sharding
+from . import dynamodb
+from . import query
+
+# Exports submissions to CSV, JSON lines or Parquet, one page (Query) or the whole table
+# (parallel Scan). Items are written as they are read, the export never holds more than a
+# few result pages in memory.
+#
+#   python -m form_data_collect.export --table nata-data-collection-form --format csv --output leads.csv
+#   python -m form_data_collect.export --table nata-data-collection-form --page nata.coach.landing_page --format jsonl
+
+# the bulky 'event' attribute is not exported unless asked for
+DEFAULT_FIELDS = ('pk', 'sk', 'created_at', 'name')
+
+def projection(fields):
+    """ Query / Scan arguments reading only the given attributes, names are aliased as most are reserved words """
+    names = { f'#f{i}': field for i, field in enumerate(fields) }
+    return {
+        'ProjectionExpression': ', '.join(names),
+        'ExpressionAttributeNames': names
+    }
+
+def scan_segment(table, segment, total_segments, **kwargs):
+    while True:
+        response = table.scan(Segment=segment, TotalSegments=total_segments, **kwargs)
+        yield response['Items']
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+_DONE = object()
+
+def parallel_scan(table, segments=4, **kwargs):
+    """ every item of the table, the segments are scanned by one thread each
+
+        result pages are handed over through a bounded queue: the threads wait when the
+        consumer is slower than DynamoDB, memory stays bounded by the queue size
+    """
+    pages = queue.Queue(maxsize=segments * 2)
+    stop = threading.Event()
+
+    def put(value):
+        # gives up when the consumer is gone
+        while not stop.is_set():
+            try:
+                pages.put(value, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def worker(segment):
+        try:
+            for items in scan_segment(table, segment, segments, **dict(kwargs)):
+                if not put(items):
+                    return
+        except Exception as e:
+            put(e)
+        finally:
+            put(_DONE)
+
+    threads = [ threading.Thread(target=worker, args=(segment,), daemon=True) for segment in range(segments) ]
+    for thread in threads:
+        thread.start()
+
+    running = segments
+    try:
+        while running:
+            items = pages.get()
+            if items is _DONE:
+                running -= 1
+            elif isinstance(items, Exception):
+                raise items
+            else:
+                yield from items
+    finally:
+        # the consumer stopped early or a segment failed, let the other threads end
+        stop.set()
+
+def page_items(table, pk, shard_count=None, **kwargs):
+    """ every item of a page, shard after shard when the page is sharded """
+    count = sharding.shard_count() if shard_count is None else shard_count
+    pks = sharding.shard_pks(pk, count) if sharding.is_sharded(pk, count) else [ pk ]
+    for partition in pks:
+        values = dict(kwargs.get('ExpressionAttributeValues', {}), **{ ':pk': partition })
+        arguments = dict(kwargs, KeyConditionExpression='pk = :pk', ExpressionAttributeValues=values)
+        yield from query.query_all(table, **arguments)
+
+def _plain(value):
+    # JSON friendly values: DynamoDB numbers come back as int or Decimal, binary as bytes
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (bytes, bytearray)):
+        return base64.b64encode(value).decode('ascii')
+    if isinstance(value, (set, frozenset)):
+        return sorted(_plain(v) for v in value)
+    if isinstance(value, dict):
+        return { k: _plain(v) for k, v in value.items() }
+    if isinstance(value, list):
+        return [ _plain(v) for v in value ]
+    return value
+
+class JSONLinesWriter:
+
+    def __init__(self, output, fields=None):
+        self.output = output
+
+    def write(self, item):
+        self.output.write(json.dumps(_plain(item), ensure_ascii=False) + '\n')
+
+    def close(self):
+        self.output.flush()
+
+class CSVWriter:
+    """ one column per field, nested values as JSON """
+
+    def __init__(self, output, fields=DEFAULT_FIELDS):
+        self.fields = fields
+        self.writer = csv.writer(output)
+        self.writer.writerow(fields)
+        self.output = output
+
+    def write(self, item):
+        row = []
+        for field in self.fields:
+            value = _plain(item.get(field))
+            row.append(json.dumps(value, ensure_ascii=False) if isinstance(value, (dict, list)) else value)
+        self.writer.writerow(row)
+
+    def close(self):
+        self.output.flush()
+
+class ParquetWriter:
+    """ needs pyarrow, items are written in row groups of batch_size """
+
+    def __init__(self, output, fields=DEFAULT_FIELDS, batch_size=10000):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError('Parquet export needs pyarrow, pip install pyarrow')
+        self.pyarrow = pyarrow
+        self.fields = fields
+        self.batch_size = batch_size
+        self.rows = []
+        # every column is a string, nested values as JSON, so the schema does not depend on the first rows
+        self.schema = pyarrow.schema([ (field, pyarrow.string()) for field in fields ])
+        self.writer = pyarrow.parquet.ParquetWriter(output, self.schema)
+
+    def write(self, item):
+        self.rows.append(item)
+        if len(self.rows) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if not self.rows:
+            return
+        columns = {}
+        for field in self.fields:
+            values = []
+            for item in self.rows:
+                value = _plain(item.get(field))
+                values.append(None if value is None else value if isinstance(value, str) else json.dumps(value, ensure_ascii=False))
+            columns[field] = values
+        self.writer.write_table(self.pyarrow.table(columns, schema=self.schema))
+        self.rows = []
+
+    def close(self):
+        self._flush()
+        self.writer.close()
+
+WRITERS = {
+    'jsonl': JSONLinesWriter,
+    'csv': CSVWriter,
+    'parquet': ParquetWriter,
+}
+
+def export(items, writer):
+    """ writes every item, returns their number """
+    count = 0
+    try:
+        for item in items:
+            writer.write(item)
+            count += 1
+    finally:
+        writer.close()
+    return count
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m form_data_collect.export', description='Exports form submissions')
+    parser.add_argument('--table', required=True)
+    parser.add_argument('--page', help='only export this page (pk), with a Query instead of a Scan')
+    parser.add_argument('--format', choices=sorted(WRITERS), default='jsonl')
+    parser.add_argument('--output', help='output file, standard output by default (not for parquet)')
+    parser.add_argument('--fields', default=','.join(DEFAULT_FIELDS), help="comma separated attributes, 'ALL' for all of them")
+    parser.add_argument('--segments', type=int, default=4, help='parallel Scan segments')
+    parser.add_argument('--region', default='eu-central-1')
+    parser.add_argument('--endpoint-url', help='e.g. http://localhost:8000 for DynamoDB Local')
+    args = parser.parse_args(argv)
+
+    table = dynamodb.Table(dynamodb.create_client(args.region, args.endpoint_url), args.table)
+    fields = None if args.fields.upper() == 'ALL' else tuple(f.strip() for f in args.fields.split(',') if f.strip())
+    kwargs = projection(fields) if fields else {}
+
+    if args.page:
+        items = page_items(table, args.page, **kwargs)
+    else:
+        items = parallel_scan(table, args.segments, **kwargs)
+
+    if args.format == 'parquet' and not args.output:
+        parser.error('parquet needs --output')
+    if args.format != 'jsonl' and not fields:
+        parser.error(f'{args.format} needs --fields')
+
+    # the writers only flush their output, the file is closed here
+    with contextlib.ExitStack() as stack:
+        if args.format == 'parquet':
+            output = args.output
+        elif args.output:
+            output = stack.enter_context(open(args.output, 'w', newline='', encoding='utf-8'))
+        else:
+            output = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', newline='')
+            # detached rather than closed, closing it would close standard output
+            stack.callback(output.detach)
+        if args.format == 'jsonl':
+            writer = JSONLinesWriter(output)
+        else:
+            writer = WRITERS[args.format](output, fields)
+
+        count = export(items, writer)
+    print(f'Exported {count} items', file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
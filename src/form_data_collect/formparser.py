@@ -0,0 +1,159 @@
+import os
+import json
+import math
+import base64
+from urllib.parse import unquote_plus
+
+# Form bodies are checked against size limits before they are decoded and parsed: a
+# multi-megabyte body is rejected from its length, before any base64 decoding or parsing.
+
+class InvalidBody(ValueError):
+    pass
+
+class LimitExceeded(ValueError):
+    pass
+
+class Limits:
+
+    def __init__(self, max_body_size=65536, max_fields=100, max_field_length=4096):
+        self.max_body_size = max_body_size
+        self.max_fields = max_fields
+        self.max_field_length = max_field_length
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_body_size=int(os.environ.get('MAX_BODY_SIZE', '65536')),
+            max_fields=int(os.environ.get('MAX_FIELDS', '100')),
+            max_field_length=int(os.environ.get('MAX_FIELD_LENGTH', '4096'))
+        )
+
+def content_type(event):
+    """ the media type and its parameters, e.g. ('multipart/form-data', { 'boundary': '...' }) """
+    value = (event.get('headers') or {}).get('content-type', 'application/x-www-form-urlencoded')
+    media_type, *params = value.split(';')
+    parameters = {}
+    for param in params:
+        name, _, param_value = param.strip().partition('=')
+        parameters[name.lower()] = param_value.strip('"')
+    return media_type.strip().lower(), parameters
+
+def decode_body(event, max_size):
+    """ the request body as text, LimitExceeded when it is larger than max_size bytes """
+    body = event.get('body') or ''
+    declared = (event.get('headers') or {}).get('content-length')
+    if declared is not None and declared.isdigit() and int(declared) > max_size:
+        raise LimitExceeded(f'Body is larger than {max_size} bytes')
+
+    if event.get('isBase64Encoded'):
+        # 4 base64 characters per 3 bytes, checked before decoding anything
+        if len(body) > (max_size + 2) // 3 * 4:
+            raise LimitExceeded(f'Body is larger than {max_size} bytes')
+        raw = base64.b64decode(body)
+        if len(raw) > max_size:
+            raise LimitExceeded(f'Body is larger than {max_size} bytes')
+        try:
+            return raw.decode('utf-8')
+        except UnicodeDecodeError:
+            raise InvalidBody('Body is not valid UTF-8')
+
+    # a character is 1 to 4 bytes, only count bytes when the number of characters is not conclusive
+    if len(body) > max_size or (len(body) * 4 > max_size and len(body.encode('utf-8')) > max_size):
+        raise LimitExceeded(f'Body is larger than {max_size} bytes')
+    return body
+
+def _check_field(data, name, value, limits):
+    if len(data) >= limits.max_fields:
+        raise LimitExceeded(f'More than {limits.max_fields} fields')
+    if isinstance(value, str) and len(value) > limits.max_field_length:
+        raise LimitExceeded(f'Field {name} is longer than {limits.max_field_length} characters')
+
+def parse_urlencoded(body, limits):
+    """ single pass over the body, same result as parse_qs with the first value of every field """
+    data = {}
+    for pair in body.split('&'):
+        name, _, value = pair.partition('=')
+        # as parse_qs, fields without a value are ignored
+        if not value:
+            continue
+        name = unquote_plus(name)
+        if name in data:
+            continue
+        value = unquote_plus(value)
+        _check_field(data, name, value, limits)
+        data[name] = value
+    return data
+
+def parse_multipart(body, boundary, limits):
+    if not boundary:
+        raise InvalidBody('Missing multipart boundary')
+    data = {}
+    for part in body.split(f'--{boundary}')[1:]:
+        if part.startswith('--'):
+            break
+        headers, separator, value = part.partition('\r\n\r\n')
+        if not separator:
+            raise InvalidBody('Invalid multipart part')
+        name = None
+        for header in headers.strip().split('\r\n'):
+            header_name, _, header_value = header.partition(':')
+            if header_name.strip().lower() != 'content-disposition':
+                continue
+            for param in header_value.split(';')[1:]:
+                param_name, _, param_value = param.strip().partition('=')
+                if param_name == 'filename':
+                    raise InvalidBody('File uploads are not supported')
+                if param_name == 'name':
+                    name = param_value.strip('"')
+        if name is None:
+            raise InvalidBody('Multipart part without a name')
+        # the part ends with the CRLF preceding the next boundary
+        value = value[:-2] if value.endswith('\r\n') else value
+        if name in data or not value:
+            continue
+        _check_field(data, name, value, limits)
+        data[name] = value
+    return data
+
+def _constant(name):
+    raise InvalidBody(f'Body holds {name}, which is not a number DynamoDB can store')
+
+def parse_json(body, limits):
+    try:
+        # NaN, Infinity and -Infinity are accepted by json.loads, not by DynamoDB
+        document = json.loads(body, parse_constant=_constant)
+    except InvalidBody:
+        raise
+    except ValueError:
+        raise InvalidBody('Body is not valid JSON')
+    if not isinstance(document, dict):
+        raise InvalidBody('Body must be a JSON object')
+    return check_fields(document, limits)
+
+def check_fields(document, limits):
+    """ the fields of a decoded JSON object, raises InvalidBody or LimitExceeded
+
+        the values are checked as urlencoded and multipart fields are, also used for bulk submissions
+    """
+    data = {}
+    for name, value in document.items():
+        if isinstance(value, (dict, list)):
+            raise InvalidBody(f'Field {name} must be a string, a number or a boolean')
+        # e.g. 1e400, parsed as an infinite float
+        if isinstance(value, float) and not math.isfinite(value):
+            raise InvalidBody(f'Field {name} must be a finite number')
+        _check_field(data, name, value, limits)
+        data[name] = value
+    # the keys are strings, as they always are in urlencoded and multipart bodies
+    for name in ('pk', 'sk', data.get('sk')):
+        if name in data and not isinstance(data[name], str):
+            raise InvalidBody(f'Field {name} must be a string')
+    return data
+
+def parse(body, media_type, parameters, limits):
+    """ the submitted fields as a dict, raises InvalidBody or LimitExceeded """
+    if media_type == 'multipart/form-data':
+        return parse_multipart(body, parameters.get('boundary'), limits)
+    if media_type == 'application/json':
+        return parse_json(body, limits)
+    return parse_urlencoded(body, limits)
@@ -0,0 +1,68 @@
+import os
+import json
+import zlib
+
+# what we keep from the API Gateway event by default, as dotted paths
+DEFAULT_EVENT_PROJECTION = ','.join([
+    'requestContext.http.sourceIp',
+    'requestContext.http.userAgent',
+    'requestContext.requestId',
+    'requestContext.timeEpoch',
+    'headers.referer',
+])
+
+class EventProjection:
+    """ Copies a whitelist of (possibly nested) fields from the API Gateway event
+
+        the projected event keeps the original structure, e.g. 'requestContext.http.sourceIp'
+        is stored as { 'requestContext': { 'http': { 'sourceIp': ... } } }
+    """
+
+    def __init__(self, paths):
+        self.paths = [ tuple(p.strip().split('.')) for p in paths if p.strip() ]
+
+    @classmethod
+    def from_env(cls):
+        # EVENT_PROJECTION is a comma separated list of dotted paths, or ALL to keep the full event
+        value = os.environ.get('EVENT_PROJECTION', DEFAULT_EVENT_PROJECTION)
+        if value.strip().upper() == 'ALL':
+            return None
+        return cls(value.split(','))
+
+    def project(self, event):
+        result = {}
+        for path in self.paths:
+            value = event
+            for name in path:
+                if not isinstance(value, dict) or name not in value:
+                    break
+                value = value[name]
+            else:
+                target = result
+                for name in path[:-1]:
+                    target = target.setdefault(name, {})
+                target[path[-1]] = value
+        return result
+
+_projections = {}
+
+# projection for the current EVENT_PROJECTION value, reused across warm invocations
+def projection():
+    key = os.environ.get('EVENT_PROJECTION')
+    if key not in _projections:
+        _projections[key] = EventProjection.from_env()
+    return _projections[key]
+
+def project_event(event):
+    result = projection()
+    return event if result is None else result.project(event)
+
+def compress_event(event):
+    # the raw event, zlib compressed, for the EVENT_RAW_STORAGE=compressed option
+    return zlib.compress(json.dumps(event, separators=(',', ':')).encode('utf-8'))
+
+def decompress_event(value):
+    return json.loads(zlib.decompress(bytes(value)).decode('utf-8'))
+
+def store_raw_event():
+    return os.environ.get('EVENT_RAW_STORAGE', 'none').lower() == 'compressed'
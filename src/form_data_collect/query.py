@@ -0,0 +1,58 @@
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+
+from common import sharding
+
+# Read side of the table: all the items of a page, whether its items are spread over
+# several shards or not. Tables are form_data_collect.dynamodb Table objects.
+
+# global secondary index on pk + created_at, see template.yaml
+CREATED_AT_INDEX = 'pk-created_at-index'
+
+def query_all(table, **kwargs):
+    """ every item matching a Query, following LastEvaluatedKey """
+    while True:
+        response = table.query(**kwargs)
+        yield from response['Items']
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def _query_partition(table, pk, kwargs, key_condition='pk = :pk'):
+    values = dict(kwargs.pop('ExpressionAttributeValues', {}), **{ ':pk': pk })
+    return list(query_all(table, KeyConditionExpression=key_condition, ExpressionAttributeValues=values, **kwargs))
+
+def _query_shards(table, pk, shard_count, max_workers, sort_key, kwargs, key_condition='pk = :pk'):
+    count = sharding.shard_count() if shard_count is None else shard_count
+    if not sharding.is_sharded(pk, count):
+        return _query_partition(table, pk, dict(kwargs), key_condition)
+
+    # botocore clients are thread safe, the shards share the table's connection pool
+    with ThreadPoolExecutor(max_workers=min(count, max_workers)) as pool:
+        results = list(pool.map(lambda shard: _query_partition(table, shard, dict(kwargs), key_condition),
+                                sharding.shard_pks(pk, count)))
+    # every shard comes back sorted on the sort key of the table or index
+    return list(heapq.merge(*results, key=lambda item: item[sort_key]))
+
+def query_page(table, pk, shard_count=None, max_workers=16, **kwargs):
+    """ the items of a page ordered by sort key, every shard of a sharded page is queried in parallel
+
+        kwargs are extra Query arguments, e.g. ProjectionExpression or FilterExpression
+    """
+    return _query_shards(table, pk, shard_count, max_workers, 'sk', kwargs)
+
+def query_since(table, pk, since, until=None, shard_count=None, max_workers=16, **kwargs):
+    """ the items of a page created at or after since (and before until), oldest first
+
+        reads the created_at index instead of the whole page: only the matching items are read
+        and billed, and items hold the attributes projected in the index
+    """
+    values = dict(kwargs.pop('ExpressionAttributeValues', {}), **{ ':since': since })
+    if until is None:
+        key_condition = 'pk = :pk AND created_at >= :since'
+    else:
+        # BETWEEN is inclusive on both ends
+        key_condition = 'pk = :pk AND created_at BETWEEN :since AND :until'
+        values[':until'] = until - 1
+    kwargs = dict(kwargs, IndexName=CREATED_AT_INDEX, ExpressionAttributeValues=values)
+    return _query_shards(table, pk, shard_count, max_workers, 'created_at', kwargs, key_condition)
@@ -0,0 +1,155 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+log = logging.getLogger('data-collection-form')
+
+# Rate limits, checked before anything is written: per source IP before the body is even
+# decoded, per page (pk) once the form is parsed. Every container keeps token buckets in
+# memory; with RATE_LIMIT_MODE=dynamodb, requests allowed by the local bucket also count
+# in a shared DynamoDB table, which limits the total across containers.
+
+class TokenBuckets:
+    """ One token bucket per key, in memory, the least recently used keys are forgotten """
+
+    def __init__(self, rate, burst, max_keys=4096, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.clock = clock
+        # key -> (tokens, updated)
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def acquire(self, key, cost=1):
+        """ 0 when allowed, otherwise the seconds until enough tokens are back """
+        now = self.clock()
+        with self.lock:
+            tokens, updated = self.buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= cost:
+                wait = 0.0
+                tokens -= cost
+            else:
+                wait = (cost - tokens) / self.rate if self.rate > 0 else float('inf')
+            self.buckets[key] = (tokens, now)
+            self.buckets.move_to_end(key)
+            while len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        return wait
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+class SharedCounter:
+    """ Fixed window counters in a DynamoDB table keyed on pk, shared by all containers
+
+        one conditional UpdateItem per request, items expire with the table TTL (expires_at)
+    """
+
+    def __init__(self, table, limit, window=60, clock=time.time):
+        self.table = table
+        self.limit = limit
+        self.window = window
+        self.clock = clock
+
+    def acquire(self, key, cost=1):
+        from botocore.exceptions import ClientError
+
+        now = self.clock()
+        start = int(now // self.window) * self.window
+        try:
+            self.table.update_item(
+                Key={ 'pk': f'{key}#{start}' },
+                UpdateExpression='ADD #count :cost SET expires_at = if_not_exists(expires_at, :expires)',
+                ConditionExpression='attribute_not_exists(#count) OR #count <= :last',
+                ExpressionAttributeNames={ '#count': 'count' },
+                ExpressionAttributeValues={ ':cost': cost, ':last': self.limit - cost, ':expires': start + 2 * self.window }
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return start + self.window - now
+            log.warning('Shared rate limit not checked, allowing the request: %r', e)
+        except Exception as e:
+            # the limit protects the backend, it must not take the form down with it
+            log.warning('Shared rate limit not checked, allowing the request: %r', e)
+        return 0.0
+
+class RateLimiter:
+    """ the local buckets first, the shared counter only for requests they allow """
+
+    def __init__(self, local, shared=None):
+        self.local = local
+        self.shared = shared
+
+    def acquire(self, key, cost=1):
+        wait = self.local.acquire(key, cost)
+        if wait or self.shared is None:
+            return wait
+        return self.shared.acquire(key, cost)
+
+# limit kinds, each with its own key prefix and settings
+IP = 'ip'
+PAGE = 'page'
+
+DEFAULTS = {
+    # a person submits a form now and then, a burst covers a few retries
+    IP: (0.2, 5),
+    # all the submitters of one page
+    PAGE: (20, 100),
+}
+
+def mode():
+    # off, local (per container buckets) or dynamodb (local buckets plus a shared counter)
+    return os.environ.get('RATE_LIMIT_MODE', 'off').lower()
+
+def settings(kind):
+    """ (tokens per second, burst) from RATE_LIMIT_IP_RATE / RATE_LIMIT_IP_BURST, RATE_LIMIT_PAGE_... """
+    rate, burst = DEFAULTS[kind]
+    prefix = f'RATE_LIMIT_{kind.upper()}'
+    return float(os.environ.get(f'{prefix}_RATE', rate)), float(os.environ.get(f'{prefix}_BURST', burst))
+
+_limiters = {}
+
+def limiter(kind, dynamodb_table):
+    """ limiter for the current settings, its buckets survive across warm invocations
+
+        raises ValueError when the settings are invalid: a misconfigured limit fails loudly
+        rather than silently letting everything through
+    """
+    current = mode()
+    rate, burst = settings(kind)
+    window = int(os.environ.get('RATE_LIMIT_WINDOW', '60'))
+    table_name = os.environ.get('RATE_LIMIT_TABLE_NAME')
+    key = (kind, current, rate, burst, window, table_name)
+
+    result = _limiters.get(key)
+    if result is None:
+        if current not in ('local', 'dynamodb'):
+            raise ValueError(f'Unknown RATE_LIMIT_MODE {current!r}, use off, local or dynamodb')
+        if current == 'dynamodb' and not table_name:
+            raise ValueError('RATE_LIMIT_MODE=dynamodb needs RATE_LIMIT_TABLE_NAME')
+        local = TokenBuckets(rate, burst, int(os.environ.get('RATE_LIMIT_CACHE_SIZE', '4096')))
+        shared = None
+        if current == 'dynamodb':
+            # the bucket allows burst requests then rate per second, the same over a window
+            shared = SharedCounter(dynamodb_table(table_name), int(burst + rate * window), window)
+        result = RateLimiter(local, shared)
+        _limiters[key] = result
+
+    return result
+
+def check(kind, value, dynamodb_table):
+    """ 0 when the request can go on, otherwise the seconds to wait before trying again """
+    if mode() == 'off' or value is None:
+        return 0.0
+    return limiter(kind, dynamodb_table).acquire(f'{kind}#{value}')
+
+def source_ip(event):
+    return event.get('requestContext', {}).get('http', {}).get('sourceIp')
+
+def reset():
+    _limiters.clear()
@@ -0,0 +1,32 @@
+import os
+import json
+
+from common import sharding
+
+# How long submissions are kept: items get an expires_at attribute (epoch seconds), the
+# table TTL deletes them some time after that and the stream function archives them.
+#
+# RETENTION_DAYS applies to every page, RETENTION_POLICY is an optional JSON object mapping
+# a page (pk) to its own number of days. 0 keeps the items of a page forever.
+
+DAY = 86400
+
+_policies = {}
+
+def policy():
+    key = os.environ.get('RETENTION_POLICY')
+    result = _policies.get(key)
+    if result is None:
+        result = _policies[key] = { pk: float(days) for pk, days in json.loads(key or '{}').items() }
+    return result
+
+def days(pk):
+    default = float(os.environ.get('RETENTION_DAYS', '0'))
+    return policy().get(sharding.base_pk(pk), default)
+
+def expires_at(pk, created_at):
+    """ the expires_at of an item created at created_at, None when it never expires """
+    retention = days(pk)
+    if retention <= 0:
+        return None
+    return int(created_at + retention * DAY)
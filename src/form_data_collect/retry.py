@@ -0,0 +1,72 @@
+import time
+import random
+import logging
+
+log = logging.getLogger('data-collection-form')
+
+# DynamoDB calls are retried here rather than by botocore, whose retries know nothing
+# about the Lambda timeout: an attempt is only made when it can complete before the
+# invocation deadline, otherwise the caller answers a 503 while it still has time to.
+
+# throttling and server side errors, worth another attempt
+RETRYABLE_CODES = {
+    'ProvisionedThroughputExceededException',
+    'ThrottlingException',
+    'RequestLimitExceeded',
+    'InternalServerError',
+    'ServiceUnavailable',
+    'TransactionConflictException',
+}
+
+class Unavailable(TimeoutError):
+    """ DynamoDB could not be reached, or not in time """
+
+def deadline(context, margin_ms=300, clock=time.monotonic):
+    """ the time.monotonic() value by which DynamoDB calls must be done, None without a Lambda context
+
+        margin_ms is kept to answer before the function times out
+    """
+    remaining = getattr(context, 'get_remaining_time_in_millis', None)
+    if remaining is None:
+        return None
+    return clock() + (remaining() - margin_ms) / 1000.0
+
+def is_retryable(error):
+    from botocore.exceptions import ClientError, ConnectionError, HTTPClientError
+
+    if isinstance(error, ClientError):
+        return error.response.get('Error', {}).get('Code') in RETRYABLE_CODES
+    # connect and read timeouts, refused and reset connections
+    return isinstance(error, (ConnectionError, HTTPClientError))
+
+# wrap in a separate function for easy mocking during tests
+def sleep(seconds):
+    time.sleep(seconds)
+
+def call(fn, deadline=None, max_attempts=3, base_delay=0.05, max_delay=1.0, attempt_budget=0.0, clock=time.monotonic, service='DynamoDB'):
+    """ fn() retried with exponential backoff and full jitter, raises Unavailable once attempts or time run out
+
+        attempt_budget is the longest an attempt can take (connect plus read timeouts), no attempt
+        is started unless it ends before the deadline
+    """
+    last = None
+    for attempt in range(1, max_attempts + 1):
+        if deadline is not None and clock() + attempt_budget > deadline:
+            log.warning('No time left for %s attempt %d', service, attempt)
+            break
+        try:
+            return fn()
+        except Exception as e:
+            if not is_retryable(e):
+                raise
+            log.warning('%s attempt %d failed: %r', service, attempt, e)
+            last = e
+        if attempt == max_attempts:
+            break
+        delay = random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+        if deadline is not None and clock() + delay + attempt_budget > deadline:
+            log.warning('No time left to retry %s after attempt %d', service, attempt)
+            break
+        sleep(delay)
+
+    raise Unavailable(f'{service} unavailable: {last!r}') from last
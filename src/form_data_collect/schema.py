@@ -0,0 +1,278 @@
+import os
+import re
+import json
+import math
+import time
+import logging
+
+log = logging.getLogger('data-collection-form')
+
+# Per form (pk) schemas, e.g.
+#
+#   {
+#     "nata.coach.landing_page": {
+#       "sk": "email",
+#       "fields": {
+#         "name": { "type": "string", "max_length": 100 },
+#         "email": { "type": "email", "required": true },
+#         "age": { "type": "integer", "min": 0, "max": 150 },
+#         "topic": { "type": "string", "enum": [ "coaching", "nutrition" ] }
+#       }
+#     }
+#   }
+#
+# "sk" names the field used as sort key, overriding the one named by the submission.
+# Fields not declared are removed from the item, unless "strip_unknown" is false.
+# Schemas are compiled once into a list of checks per field and cached with a TTL.
+
+EMAIL = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+# fields sent by every form, never stripped
+KEY_FIELDS = ('pk', 'sk')
+
+class ValidationError(ValueError):
+
+    def __init__(self, errors):
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+def _string(value):
+    if not isinstance(value, str):
+        raise ValueError('must be a string')
+    return value
+
+def _email(value):
+    value = _string(value).strip()
+    if not EMAIL.match(value):
+        raise ValueError('must be an email address')
+    return value
+
+def _integer(value):
+    if isinstance(value, bool):
+        raise ValueError('must be an integer')
+    try:
+        return int(value)
+    except (TypeError, ValueError, OverflowError):
+        # OverflowError for an infinite float
+        raise ValueError('must be an integer')
+
+def _number(value):
+    if isinstance(value, bool):
+        raise ValueError('must be a number')
+    try:
+        # Decimal would be exact, but DynamoDB numbers are serialized from repr() anyway
+        value = int(value) if isinstance(value, int) else float(value)
+    except (TypeError, ValueError):
+        raise ValueError('must be a number')
+    # nan and inf can not be stored, and nan passes every range check
+    if not math.isfinite(value):
+        raise ValueError('must be a number')
+    return value
+
+def _boolean(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.lower() in ('true', 'on', '1', 'yes'):
+        return True
+    if isinstance(value, str) and value.lower() in ('false', 'off', '0', 'no'):
+        return False
+    raise ValueError('must be a boolean')
+
+TYPES = {
+    'string': _string,
+    'email': _email,
+    'integer': _integer,
+    'number': _number,
+    'boolean': _boolean,
+}
+
+def _compile_field(spec):
+    """ a function converting one submitted value, raising ValueError when it is not valid """
+    if spec.get('type', 'string') not in TYPES:
+        raise ValueError(f"Unknown field type {spec['type']}")
+    checks = [ TYPES[spec.get('type', 'string')] ]
+    if 'max_length' in spec:
+        max_length = spec['max_length']
+        def check_max_length(value):
+            if len(value) > max_length:
+                raise ValueError(f'must be at most {max_length} characters')
+            return value
+        checks.append(check_max_length)
+    if 'pattern' in spec:
+        pattern = re.compile(spec['pattern'])
+        def check_pattern(value):
+            if not pattern.match(value):
+                raise ValueError('has an invalid format')
+            return value
+        checks.append(check_pattern)
+    if 'enum' in spec:
+        allowed = frozenset(spec['enum'])
+        def check_enum(value):
+            if value not in allowed:
+                raise ValueError(f'must be one of {sorted(allowed)}')
+            return value
+        checks.append(check_enum)
+    if 'min' in spec or 'max' in spec:
+        low, high = spec.get('min'), spec.get('max')
+        def check_range(value):
+            if (low is not None and value < low) or (high is not None and value > high):
+                raise ValueError(f'must be between {low} and {high}')
+            return value
+        checks.append(check_range)
+
+    if len(checks) == 1:
+        return checks[0]
+    def convert(value):
+        for check in checks:
+            value = check(value)
+        return value
+    return convert
+
+class Validator:
+    """ Compiled schema of one form """
+
+    def __init__(self, spec):
+        self.sk = spec.get('sk')
+        self.strip_unknown = spec.get('strip_unknown', True)
+        fields = spec.get('fields', {})
+        self.fields = { name: _compile_field(field) for name, field in fields.items() }
+        self.required = [ name for name, field in fields.items() if field.get('required') ]
+
+    def validate(self, data):
+        """ the submission with converted values and without unknown fields, raises ValidationError """
+        sk = self.sk if self.sk is not None else data.get('sk')
+        check_keys(dict(data, sk=sk) if sk is not None else data)
+
+        errors = []
+        # the sort key field is kept even when the schema does not declare it
+        result = { 'pk': data['pk'], 'sk': sk, sk: data[sk] }
+        for name in self.required:
+            if name not in data or data[name] == '':
+                errors.append(f'{name} is required')
+        for name, value in data.items():
+            convert = self.fields.get(name)
+            if convert is None:
+                if not self.strip_unknown and name not in KEY_FIELDS:
+                    result[name] = value
+                continue
+            try:
+                result[name] = convert(value)
+            except ValueError as e:
+                errors.append(f'{name} {e}')
+        if errors:
+            raise ValidationError(errors)
+        # the schema may convert the sort key field, e.g. to an integer
+        check_keys(result)
+        return result
+
+def _check_key(data, name, role):
+    # DynamoDB keys are strings here, anything else would fail the write with a 500
+    if name not in data:
+        raise ValidationError([ f'{name} is required{role}' ])
+    value = data[name]
+    if not isinstance(value, str) or not value:
+        raise ValidationError([ f'{name} must be a non empty string{role}' ])
+
+def check_keys(data):
+    """ every submission names its page (pk) and the field holding its sort key (sk) """
+    _check_key(data, 'pk', '')
+    _check_key(data, 'sk', '')
+    _check_key(data, data['sk'], ', it is the sort key')
+
+def compile_schemas(document):
+    return { pk: Validator(spec) for pk, spec in document.items() }
+
+def file_loader(path):
+    def load():
+        with open(path) as f:
+            if path.endswith(('.yaml', '.yml')):
+                # optional, only needed for YAML schema files
+                import yaml
+                return yaml.safe_load(f)
+            return json.load(f)
+    return load
+
+def dynamodb_loader(table, key):
+    # a config item holding the JSON document in its 'schemas' attribute
+    def load():
+        item = table.get_item(Key=key).get('Item')
+        if item is None:
+            raise KeyError(f'No schema item {key}')
+        return json.loads(item['schemas'])
+    return load
+
+class SchemaRegistry:
+    """ Validators per pk, reloaded from their source once the TTL is over """
+
+    def __init__(self, loader, ttl=300, clock=time.monotonic, reject_unknown_forms=False, reserved_pk=None):
+        self.loader = loader
+        self.ttl = ttl
+        self.clock = clock
+        self.reject_unknown_forms = reject_unknown_forms
+        # the pk of the config item holding the schemas, never written by a submission
+        self.reserved_pk = reserved_pk
+        self.validators = None
+        self.loaded_at = None
+
+    def _refresh(self):
+        now = self.clock()
+        if self.validators is not None and now - self.loaded_at < self.ttl:
+            return
+        try:
+            self.validators = compile_schemas(self.loader())
+        except Exception:
+            if self.validators is None:
+                raise
+            # keep serving the last good schemas, the source is retried after another TTL
+            log.exception('Can not reload form schemas, using the previous ones')
+        self.loaded_at = now
+
+    def validate(self, data):
+        _check_key(data, 'pk', '')
+        if data['pk'] == self.reserved_pk:
+            raise ValidationError([ f"pk {data['pk']} is reserved" ])
+        self._refresh()
+        validator = self.validators.get(data['pk'])
+        if validator is None:
+            if self.reject_unknown_forms:
+                raise ValidationError([ f"Unknown form {data['pk']}" ])
+            check_keys(data)
+            return data
+        return validator.validate(data)
+
+def from_env(dynamodb_table=None):
+    # SCHEMA_SOURCE is none (no validation besides the keys), file or dynamodb
+    source = os.environ.get('SCHEMA_SOURCE', 'none').lower()
+    if source == 'none':
+        return None
+    reserved_pk = None
+    if source == 'dynamodb':
+        table = dynamodb_table(os.environ.get('SCHEMA_TABLE_NAME', os.environ.get('TABLE_NAME')))
+        reserved_pk = os.environ.get('SCHEMA_ITEM_PK', 'config')
+        loader = dynamodb_loader(table, { 'pk': reserved_pk, 'sk': 'schemas' })
+    else:
+        loader = file_loader(os.environ.get('SCHEMA_FILE', os.path.join(os.path.dirname(__file__), 'schemas.json')))
+    return SchemaRegistry(
+        loader,
+        ttl=int(os.environ.get('SCHEMA_TTL', '300')),
+        reject_unknown_forms=os.environ.get('SCHEMA_UNKNOWN_FORMS', 'accept').lower() == 'reject',
+        # the config item usually lives in the submissions table, submissions can not overwrite it
+        reserved_pk=reserved_pk
+    )
+
+_registries = {}
+
+# registry for the current configuration, its compiled validators survive across warm invocations
+def registry(dynamodb_table=None):
+    key = tuple(os.environ.get(name) for name in
+                ('SCHEMA_SOURCE', 'SCHEMA_FILE', 'SCHEMA_TABLE_NAME', 'TABLE_NAME', 'SCHEMA_ITEM_PK', 'SCHEMA_TTL', 'SCHEMA_UNKNOWN_FORMS'))
+    if key not in _registries:
+        _registries[key] = from_env(dynamodb_table)
+    return _registries[key]
+
+def validate(data, dynamodb_table=None):
+    result = registry(dynamodb_table)
+    if result is None:
+        check_keys(data)
+        return data
+    return result.validate(data)
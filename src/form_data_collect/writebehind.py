@@ -0,0 +1,58 @@
+import os
+import json
+import base64
+import threading
+from collections import deque
+
+# Write-behind buffer: in write-behind mode the form function enqueues validated items
+# and returns, a separate consumer drains the queue into DynamoDB with BatchWriteItem.
+
+def encode_item(item):
+    # JSON has no bytes (e.g. raw_event), they travel base64 encoded
+    def default(value):
+        if isinstance(value, (bytes, bytearray)):
+            return { '__b64__': base64.b64encode(bytes(value)).decode('ascii') }
+        raise TypeError(f'Unsupported type {type(value)}')
+    return json.dumps(item, default=default, separators=(',', ':'))
+
+def decode_item(body):
+    def object_hook(value):
+        if len(value) == 1 and '__b64__' in value:
+            return base64.b64decode(value['__b64__'])
+        return value
+    return json.loads(body, object_hook=object_hook)
+
+class LocalQueue:
+    """ In-process stand-in for SQS, for tests and load tests """
+
+    def __init__(self):
+        self.messages = deque()
+        self.lock = threading.Lock()
+
+    def send(self, item):
+        with self.lock:
+            self.messages.append(encode_item(item))
+
+    def receive(self, max_messages):
+        with self.lock:
+            count = min(max_messages, len(self.messages))
+            return [ self.messages.popleft() for _ in range(count) ]
+
+    def __len__(self):
+        return len(self.messages)
+
+class SQSQueue:
+
+    def __init__(self, client, queue_url):
+        self.client = client
+        self.queue_url = queue_url
+
+    def send(self, item):
+        self.client.send_message(QueueUrl=self.queue_url, MessageBody=encode_item(item))
+
+def mode():
+    # sync (put_item before returning) or write-behind
+    return os.environ.get('WRITE_MODE', 'sync').lower()
+
+# the process wide local queue, used when WRITE_QUEUE=local
+local_queue = LocalQueue()
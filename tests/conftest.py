@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the Lambda functions are deployed from src/, where the shared 'common' package is a top level package
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
@@ -0,0 +1,233 @@
+# local stand-ins for AWS services used by the tests and benchmarks
+import json
+import time
+import uuid
+import hashlib
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+PUBLISH_RESPONSE = '''<PublishResponse xmlns="http://sns.amazonaws.com/doc/2010-03-31/">
+  <PublishResult><MessageId>{message_id}</MessageId></PublishResult>
+  <ResponseMetadata><RequestId>{request_id}</RequestId></ResponseMetadata>
+</PublishResponse>'''
+
+PUBLISH_BATCH_RESPONSE = '''<PublishBatchResponse xmlns="http://sns.amazonaws.com/doc/2010-03-31/">
+  <PublishBatchResult><Successful>{members}</Successful><Failed/></PublishBatchResult>
+  <ResponseMetadata><RequestId>{request_id}</RequestId></ResponseMetadata>
+</PublishBatchResponse>'''
+
+class _SNSHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get('content-length', 0))
+        params = parse_qs(self.rfile.read(length).decode('utf-8'))
+        self.server.published.append(params)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        if params.get('Action') == [ 'PublishBatch' ]:
+            ids = [ v[0] for k, v in sorted(params.items()) if k.startswith('PublishBatchRequestEntries.member.') and k.endswith('.Id') ]
+            members = ''.join(f'<member><Id>{i}</Id><MessageId>{uuid.uuid4()}</MessageId></member>' for i in ids)
+            body = PUBLISH_BATCH_RESPONSE.format(members=members, request_id=uuid.uuid4()).encode('utf-8')
+        else:
+            body = PUBLISH_RESPONSE.format(message_id=uuid.uuid4(), request_id=uuid.uuid4()).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class _StandIn:
+
+    def __init__(self, handler, latency=0.0):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.server.daemon_threads = True
+        self.server.published = []
+        self.server.latency = latency
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def endpoint(self):
+        host, port = self.server.server_address
+        return f'http://{host}:{port}'
+
+    @property
+    def published(self):
+        return self.server.published
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+class SNSStandIn(_StandIn):
+    """ Minimal SNS Publish and PublishBatch endpoint, records the parameters of every request """
+
+    def __init__(self, latency=0.0):
+        super().__init__(_SNSHandler, latency)
+
+class _SQSHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get('content-length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        operation = self.headers.get('X-Amz-Target', '').split('.')[-1]
+        self.server.published.append((operation, request))
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        if operation == 'SendMessageBatch':
+            body = { 'Successful': [ {
+                'Id': entry['Id'], 'MessageId': str(uuid.uuid4()),
+                'MD5OfMessageBody': hashlib.md5(entry['MessageBody'].encode('utf-8')).hexdigest()
+            } for entry in request.get('Entries', []) ], 'Failed': [] }
+        else:
+            body = { 'MessageId': str(uuid.uuid4()), 'MD5OfMessageBody': hashlib.md5(request.get('MessageBody', '').encode('utf-8')).hexdigest() }
+
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-amz-json-1.0')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+class SQSStandIn(_StandIn):
+    """ Minimal SQS SendMessage and SendMessageBatch endpoint, records (operation, request) """
+
+    def __init__(self, latency=0.0):
+        super().__init__(_SQSHandler, latency)
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get('content-length', 0))
+        self.server.published.append((self.path, dict(self.headers), json.loads(self.rfile.read(length) or b'null')))
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        status = self.server.status
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+class WebhookStandIn(_StandIn):
+    """ HTTP endpoint answering every POST with status, records (path, headers, JSON body) """
+
+    def __init__(self, latency=0.0, status=204):
+        super().__init__(_WebhookHandler, latency)
+        self.server.status = status
+
+DYNAMODB_ERRORS = {
+    'throttle': (400, 'ProvisionedThroughputExceededException'),
+    'error': (500, 'InternalServerError'),
+    'conditional': (400, 'ConditionalCheckFailedException'),
+}
+
+class _DynamoDBHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get('content-length', 0))
+        request = self.rfile.read(length)
+        operation = self.headers.get('X-Amz-Target', '').split('.')[-1]
+        fault = self.server.next_fault()
+        self.server.requests.append((operation, fault))
+
+        if fault == 'drop':
+            # connection closed without an answer
+            self.close_connection = True
+            self.connection.shutdown(socket.SHUT_RDWR)
+            return
+        if fault == 'slow':
+            time.sleep(self.server.latency)
+
+        if fault in DYNAMODB_ERRORS:
+            status, code = DYNAMODB_ERRORS[fault]
+            body = { '__type': f'com.amazonaws.dynamodb.v20120810#{code}', 'message': f'injected {fault}' }
+        elif operation == 'UpdateItem':
+            status, body = self.server.update(json.loads(request))
+        else:
+            status = 200
+            body = { 'UnprocessedItems': {} } if operation == 'BatchWriteItem' else {}
+
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/x-amz-json-1.0')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+class DynamoDBStandIn:
+    """ Minimal DynamoDB write endpoint injecting faults, UpdateItem keeps atomic counters
+
+        faults is the script of what the following requests get: None (success), 'throttle',
+        'error' (500), 'conditional', 'slow' (success after latency seconds) or 'drop' (connection
+        closed); once it is exhausted, requests get default
+    """
+
+    def __init__(self, faults=(), default=None, latency=2.0):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _DynamoDBHandler)
+        self.server.daemon_threads = True
+        self.server.requests = []
+        self.server.latency = latency
+        script = list(faults)
+        lock = threading.Lock()
+        def next_fault():
+            with lock:
+                return script.pop(0) if script else default
+        self.server.next_fault = next_fault
+        self.server.counters = {}
+        def update(request):
+            # counters only: 'ADD #count :cost', refused when ':last' is given and the counter is above it
+            key = json.dumps(request['Key'], sort_keys=True)
+            values = request.get('ExpressionAttributeValues', {})
+            cost = int(values.get(':cost', { 'N': '1' })['N'])
+            with lock:
+                count = self.server.counters.get(key, 0)
+                if ':last' in values and count > int(values[':last']['N']):
+                    return 400, { '__type': 'com.amazonaws.dynamodb.v20120810#ConditionalCheckFailedException', 'message': 'count' }
+                self.server.counters[key] = count + cost
+            return 200, {}
+        self.server.update = update
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def endpoint(self):
+        host, port = self.server.server_address
+        return f'http://{host}:{port}'
+
+    @property
+    def requests(self):
+        return self.server.requests
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,179 @@
+import json
+import pytest
+
+from src.form_data_collect import bulk, formparser, retry
+
+class FakeResource:
+    """ BatchWriteItem stand-in, leaves the last item of every call unprocessed for a number of calls """
+
+    def __init__(self, unprocessed_calls=0):
+        self.calls = []
+        self.unprocessed_calls = unprocessed_calls
+
+    def batch_write_item(self, RequestItems):
+        self.calls.append(RequestItems)
+        (table_name, requests), = RequestItems.items()
+        if len(self.calls) <= self.unprocessed_calls:
+            return { 'UnprocessedItems': { table_name: requests[-1:] } }
+        return { 'UnprocessedItems': {} }
+
+class RejectingResource(FakeResource):
+    """ BatchWriteItem stand-in failing every call holding an item without a string sort key """
+
+    def batch_write_item(self, RequestItems):
+        from botocore.exceptions import ClientError
+
+        (table_name, requests), = RequestItems.items()
+        if any(not isinstance(r['PutRequest']['Item']['sk'], str) for r in requests):
+            self.calls.append(RequestItems)
+            raise ClientError({ 'Error': { 'Code': 'ValidationException', 'Message': 'Invalid key' } }, 'BatchWriteItem')
+        return super().batch_write_item(RequestItems)
+
+class ThrottledResource(FakeResource):
+    """ BatchWriteItem stand-in throttling every call after a number of calls """
+
+    def __init__(self, available_calls):
+        super().__init__()
+        self.available_calls = available_calls
+
+    def batch_write_item(self, RequestItems):
+        from botocore.exceptions import ClientError
+
+        if len(self.calls) >= self.available_calls:
+            self.calls.append(RequestItems)
+            raise ClientError({ 'Error': { 'Code': 'ThrottlingException', 'Message': 'Slow down' } }, 'BatchWriteItem')
+        return super().batch_write_item(RequestItems)
+
+def items(count):
+    return [ { 'pk': 'page', 'sk': f'user{i}@example.com' } for i in range(count) ]
+
+def test_parse_json_array():
+
+    submissions = bulk.parse_submissions(json.dumps([{ 'pk': 'page', 'sk': 'email' }, 'junk']))
+
+    assert submissions[0] == { 'pk': 'page', 'sk': 'email' }
+    assert isinstance(submissions[1], bulk.InvalidSubmission)
+
+def test_parse_newline_delimited():
+
+    body = '{"pk": "page", "sk": "email"}\n\npk=page&sk=email&name=seb\n{not json\n'
+    submissions = bulk.parse_submissions(body)
+
+    assert len(submissions) == 3
+    assert submissions[0]['sk'] == 'email'
+    assert submissions[1]['name'] == 'seb'
+    assert isinstance(submissions[2], bulk.InvalidSubmission)
+
+def test_parse_invalid_array():
+
+    with pytest.raises(bulk.InvalidSubmission):
+        bulk.parse_submissions('[{"pk": ')
+
+def test_batch_write_chunks():
+
+    resource = FakeResource()
+    failed = bulk.batch_write(resource, 'table', items(60))
+
+    assert failed == set()
+    assert [ len(c['table']) for c in resource.calls ] == [25, 25, 10]
+
+def test_batch_write_retries_unprocessed(mocker):
+
+    sleep = mocker.patch.object(bulk, 'sleep')
+    resource = FakeResource(unprocessed_calls=2)
+    failed = bulk.batch_write(resource, 'table', items(3))
+
+    assert failed == set()
+    assert len(resource.calls) == 3
+    assert resource.calls[-1]['table'] == [ { 'PutRequest': { 'Item': items(3)[-1] } } ]
+    assert sleep.call_count == 2
+
+def test_batch_write_gives_up(mocker):
+
+    mocker.patch.object(bulk, 'sleep')
+    resource = FakeResource(unprocessed_calls=10)
+    failed = bulk.batch_write(resource, 'table', items(3), max_attempts=3)
+
+    assert failed == { ('page', 'user2@example.com') }
+    assert len(resource.calls) == 3
+
+def test_parse_invalid_keys():
+
+    body = json.dumps([{ 'pk': 5, 'sk': 'email', 'email': 'a@b.c' }, { 'pk': 'page', 'sk': 'x', 'x': { 'a': 1 } },
+                       { 'pk': 'page', 'sk': [ 'email' ], 'email': 'a@b.c' }, { 'pk': 'page', 'sk': 'email', 'email': 'a@b.c' }])
+    submissions = bulk.parse_submissions(body)
+
+    assert [ str(s) for s in submissions[:3] ] == [ 'Field pk must be a string', 'Field x must be a string, a number or a boolean', 'Field sk must be a string, a number or a boolean' ]
+    assert submissions[3] == { 'pk': 'page', 'sk': 'email', 'email': 'a@b.c' }
+    submission, = bulk.parse_submissions('{"pk": "page", "sk": "age", "age": 42}')
+    assert isinstance(submission, bulk.InvalidSubmission)
+
+def test_batch_write_isolates_rejected_items():
+
+    resource = RejectingResource()
+    batch = items(30)
+    batch[3]['sk'] = 3
+
+    failed = bulk.batch_write(resource, 'table', batch)
+
+    assert failed == { ('page', 3) }
+    # the rejected chunk is written again one item at a time, the next chunk as usual
+    assert [ len(c['table']) for c in resource.calls ] == [ 25 ] + [ 1 ] * 25 + [ 5 ]
+
+def test_batch_write_unavailable(mocker):
+
+    mocker.patch.object(retry, 'sleep')
+    resource = ThrottledResource(available_calls=1)
+
+    failed = bulk.batch_write(resource, 'table', items(60))
+
+    # the first chunk is written, the next ones are reported failed
+    assert failed == { ('page', f'user{i}@example.com') for i in range(25, 60) }
+    assert [ len(c['table']) for c in resource.calls ] == [ 25, 25, 25, 25 ]
+
+def test_batch_write_unavailable_last_chunk(mocker, caplog):
+
+    mocker.patch.object(retry, 'sleep')
+    resource = ThrottledResource(available_calls=1)
+
+    failed = bulk.batch_write(resource, 'table', items(30))
+
+    assert len(failed) == 5
+    assert 'DynamoDB unavailable, 5 items not written' in caplog.text
+
+def test_parse_applies_field_checks():
+
+    limits = formparser.Limits(max_fields=4, max_field_length=10)
+    body = '\n'.join([
+        '{"pk": "page", "sk": "email", "email": "a@b.c", "score": NaN}',
+        '{"pk": "page", "sk": "email", "email": "a@b.c", "tags": ["a"]}',
+        '{"pk": "page", "sk": "email", "email": "a@b.c", "meta": {"a": 1}}',
+        '{"pk": "page", "sk": "email", "email": "a@b.c", "a": 1, "b": 2}',
+        'pk=page&sk=email&email=a@b.c&name=' + 'x' * 11,
+        '{"pk": "page", "sk": "email", "email": "a@b.c", "score": 1e400}',
+        'pk=page&sk=email&email=a@b.c',
+    ])
+
+    submissions = bulk.parse_submissions(body, limits)
+
+    assert [ type(s).__name__ for s in submissions ] == [ 'InvalidSubmission' ] * 6 + [ 'dict' ]
+    # the same checks in a JSON array
+    submissions = bulk.parse_submissions('[{"pk": "page", "sk": "email", "email": "a@b.c", "x": NaN}, {"pk": "page"}]', limits)
+    assert isinstance(submissions[0], bulk.InvalidSubmission)
+    assert submissions[1] == { 'pk': 'page' }
+
+def test_batch_write_isolates_unserializable_items():
+
+    class SerializingResource(FakeResource):
+        def batch_write_item(self, RequestItems):
+            (table_name, requests), = RequestItems.items()
+            if any(r['PutRequest']['Item'].get('score') != r['PutRequest']['Item'].get('score') for r in requests):
+                raise TypeError('Infinity and NaN are not supported')
+            return super().batch_write_item(RequestItems)
+
+    batch = items(5)
+    batch[2]['score'] = float('nan')
+
+    failed = bulk.batch_write(SerializingResource(), 'table', batch)
+
+    assert failed == { ('page', 'user2@example.com') }
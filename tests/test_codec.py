@@ -0,0 +1,112 @@
+import os
+import json
+import zlib
+import base64
+import pytest
+
+from common import codec
+from src.database_stream import decoder
+from src.form_data_collect import app, dynamodb
+
+EVENTS = os.path.join(os.path.dirname(__file__), '..', 'events')
+
+TEXT = 'Bonjour, je voudrais plus d\'informations sur le coaching. ' * 40
+
+def test_round_trip():
+
+    event = { 'requestContext': { 'http': { 'sourceIp': '1.2.3.4' } }, 'body': TEXT, 'list': [ 1, True, None ] }
+
+    for value in (TEXT, event, [ TEXT ]):
+        encoded = codec.encode(value, threshold=100)
+        assert codec.is_encoded(encoded)
+        assert len(encoded) < len(json.dumps(value))
+        assert codec.decode(encoded) == value
+
+def test_small_and_incompressible_values_are_kept():
+
+    assert codec.encode('short', threshold=100) == 'short'
+    # compressed, it would be larger
+    assert codec.encode('short', threshold=0) == 'short'
+    assert codec.encode(42, threshold=0) == 42
+
+def test_other_binary_values_are_kept():
+
+    raw = zlib.compress(b'{"raw": "event"}')
+
+    assert codec.decode(raw) is raw
+    assert codec.decode('text') == 'text'
+
+def test_zstd_without_zstandard(mocker):
+
+    try:
+        import zstandard
+        pytest.skip('zstandard is installed')
+    except ImportError:
+        pass
+    mocker.patch.dict(os.environ, { 'COMPRESSION': 'zstd' })
+
+    with pytest.raises(RuntimeError):
+        codec.Codec.from_env()
+
+def test_zstd_round_trip():
+
+    pytest.importorskip('zstandard')
+
+    encoded = codec.encode(TEXT, threshold=100, algorithm=codec.ZSTD)
+
+    assert encoded[len(codec.MAGIC)] == codec.ZSTD
+    assert codec.decode(encoded) == TEXT
+
+def test_codec_from_env(mocker):
+
+    mocker.patch.dict(os.environ, { 'COMPRESSION': 'off' })
+    assert codec.codec() is None
+    mocker.patch.dict(os.environ, { 'COMPRESSION': 'zlib', 'COMPRESSION_THRESHOLD': '200' })
+    assert codec.codec().threshold == 200
+    mocker.patch.dict(os.environ, { 'COMPRESSION': 'lz4' })
+    with pytest.raises(ValueError):
+        codec.codec()
+
+def test_keys_are_not_compressed():
+
+    item = { 'pk': TEXT, 'sk': TEXT, 'email': TEXT, 'message': TEXT, 'created_at': 1603709167 }
+
+    encoded = codec.Codec(threshold=100).encode_item(item)
+
+    assert [ k for k, v in encoded.items() if codec.is_encoded(v) ] == [ 'message' ]
+    assert codec.decode_item(encoded) == item
+
+def test_read_helpers_decode():
+
+    item = { 'pk': 'page', 'sk': 'a@example.com', 'message': TEXT, 'event': { 'body': TEXT } }
+    typed = dynamodb.serialize_item(codec.Codec(threshold=100).encode_item(item))
+
+    assert 'B' in typed['message'] and 'B' in typed['event']
+    assert dynamodb.deserialize_item(typed) == item
+
+def test_stream_decoder_decodes():
+
+    encoded = codec.Codec(threshold=100).encode_item({ 'pk': 'page', 'message': TEXT, 'event': { 'body': TEXT } })
+    # binary values are base64 encoded in stream records
+    typed = { k: { 'B': base64.b64encode(v).decode('ascii') } if isinstance(v, bytes) else { 'S': v } for k, v in encoded.items() }
+
+    image = decoder.Image(typed)
+
+    assert image['message'] == TEXT
+    assert image['event'] == { 'body': TEXT }
+    assert image.to_dict()['pk'] == 'page'
+
+def test_prepare_item_compresses(mocker):
+
+    mocker.patch.dict(os.environ, { 'COMPRESSION': 'zlib', 'COMPRESSION_THRESHOLD': '512', 'EVENT_PROJECTION': 'ALL' })
+    mocker.patch.object(app, 'now', return_value=1603709167)
+    with open(os.path.join(EVENTS, 'event-api.json')) as f:
+        event = json.load(f)
+    data = { 'pk': 'nata.coach.landing_page', 'sk': 'email', 'email': 'seb@example.com', 'message': TEXT }
+
+    item = app.prepare_item(event, data)
+
+    assert item is data
+    assert codec.is_encoded(item['message']) and codec.is_encoded(item['event'])
+    assert item['sk'] == 'seb@example.com'
+    assert codec.decode(item['event']) == event
@@ -681,3 +681,141 @@ def test_no_sns_env_var(ddb_event, mocker):
     assert 'status' in ret
     assert 'ERROR' in ret['status']
     assert 'SNS_TOPIC_ARN' in ret['status']
+
+def test_sns_client_is_cached(mocker):
+
+    import botocore.session
+    app.reset_cache()
+    session = mocker.spy(botocore.session, 'Session')
+
+    first = app.sns_client()
+    second = app.sns_client()
+
+    assert first is second
+    assert session.call_count == 1
+
+def test_sns_client_config(mocker):
+
+    mocker.patch.dict(os.environ, {'SNS_MAX_POOL_CONNECTIONS':'32', 'SNS_MAX_ATTEMPTS':'5', 'SNS_READ_TIMEOUT':'0.5'})
+    app.reset_cache()
+
+    config = app.sns_client().meta.config
+
+    assert config.max_pool_connections == 32
+    assert config.retries['total_max_attempts'] == 5
+    assert config.read_timeout == 0.5
+    app.reset_cache()
+
+def test_sqs_client_config(mocker):
+
+    mocker.patch.dict(os.environ, {'SQS_MAX_POOL_CONNECTIONS':'4', 'SQS_READ_TIMEOUT':'5', 'SNS_READ_TIMEOUT':'0.5'})
+    app.reset_cache()
+
+    config = app.sqs_client().meta.config
+
+    # SNS settings do not apply to SQS
+    assert config.max_pool_connections == 4
+    assert config.read_timeout == 5
+    app.reset_cache()
+
+def test_publish_rendered_message(ddb_event_multiple, mocker):
+
+    mocker.patch.dict(os.environ, {'SNS_TOPIC_ARN':'arn:aws:sns:eu-central-1:401955065246:DataCollectionTopic'})
+    client = mocker.patch.object(app, 'sns_client').return_value
+
+    ret = app.lambda_handler(ddb_event_multiple, "")
+
+    assert ret['status'] == 'OK'
+    assert ret['messages'] == 2
+    client.publish.assert_called_once()
+    kwargs = client.publish.call_args.kwargs
+    assert kwargs['Subject'] == 'You have 2 new subscriptions'
+    assert kwargs['Message'].count('Page :') == 2
+
+def test_digest_mode(ddb_event_multiple, tmp_path, mocker):
+
+    mocker.patch.dict(os.environ, {
+        'SNS_TOPIC_ARN':'arn:aws:sns:eu-central-1:401955065246:DataCollectionTopic',
+        'DIGEST_MODE':'on',
+        'DIGEST_WINDOW':'600',
+        'DIGEST_FILE':str(tmp_path / 'digest.json')
+    })
+    client = mocker.patch.object(app, 'sns_client').return_value
+    clock = mocker.patch.object(app, 'now')
+
+    # two batches inside the window are buffered
+    clock.return_value = 1000
+    ret = app.lambda_handler(ddb_event_multiple, "")
+    assert ret['status'] == 'OK'
+    assert ret['notifications'] == 0
+    clock.return_value = 1300
+    ret = app.lambda_handler(ddb_event_multiple, "")
+    assert ret['notifications'] == 0
+    client.publish.assert_not_called()
+
+    # a scheduled invocation after the window sends one summary for the page
+    clock.return_value = 1600
+    ret = app.lambda_handler({ 'source': 'aws.events' }, "")
+    assert ret['status'] == 'OK'
+    assert ret['notifications'] == 1
+    client.publish.assert_called_once()
+    assert client.publish.call_args.kwargs['Subject'] == 'You have 4 new subscriptions'
+
+def test_digest_mode_ignores_routes(ddb_event_multiple, tmp_path, mocker, caplog):
+
+    topic = 'arn:aws:sns:eu-central-1:401955065246:DataCollectionTopic'
+    mocker.patch.dict(os.environ, {
+        'SNS_TOPIC_ARN': topic,
+        'DIGEST_MODE': 'on',
+        'DIGEST_WINDOW': '0',
+        'DIGEST_FILE': str(tmp_path / 'digest.json'),
+        'NOTIFICATION_ROUTES': json.dumps({ '*': [ { 'type': 'webhook', 'url': 'http://localhost/ignored' } ] })
+    })
+    client = mocker.patch.object(app, 'sns_client').return_value
+    mocker.patch.object(app, '_ignored_routes', set())
+
+    app.lambda_handler(ddb_event_multiple, "")
+    app.lambda_handler(ddb_event_multiple, "")
+
+    assert client.publish.call_args.kwargs['TopicArn'] == topic
+    assert sum('NOTIFICATION_ROUTES does not apply' in r.getMessage() for r in caplog.records) == 1
+
+def test_poison_record(ddb_event_multiple, mocker):
+
+    mocker.patch.dict(os.environ, {'SNS_TOPIC_ARN':'arn:aws:sns:eu-central-1:401955065246:DataCollectionTopic'})
+    client = mocker.patch.object(app, 'sns_client').return_value
+
+    records = ddb_event_multiple['Records']
+    poison = { 'eventID': 'poison', 'eventName': 'INSERT', 'dynamodb': { 'SequenceNumber': '3133900000000004608185000' } }
+    ddb_event_multiple['Records'] = records[:2] + [ poison ] + records[2:]
+
+    ret = app.lambda_handler(ddb_event_multiple, "")
+
+    # the first record is notified, the batch is retried from the poison record
+    assert ret['status'] == 'PARTIAL'
+    assert ret['messages'] == 1
+    assert ret['checkpoint'] == records[1]['dynamodb']['SequenceNumber']
+    assert ret['batchItemFailures'] == [ { 'itemIdentifier': '3133900000000004608185000' } ]
+    assert client.publish.call_args.kwargs['Subject'] == 'You have 1 new subscription'
+
+def test_no_failure(ddb_event_multiple, mocker):
+
+    mocker.patch.dict(os.environ, {'SNS_TOPIC_ARN':'arn:aws:sns:eu-central-1:401955065246:DataCollectionTopic'})
+    mocker.patch.object(app, 'sns_client')
+
+    ret = app.lambda_handler(ddb_event_multiple, "")
+
+    assert ret['batchItemFailures'] == []
+    assert ret['checkpoint'] == ddb_event_multiple['Records'][-1]['dynamodb']['SequenceNumber']
+
+def test_publish_failure(ddb_event_multiple, mocker):
+
+    mocker.patch.dict(os.environ, {'SNS_TOPIC_ARN':'arn:aws:sns:eu-central-1:401955065246:DataCollectionTopic'})
+    client = mocker.patch.object(app, 'sns_client').return_value
+    client.publish.side_effect = Exception('boom')
+
+    ret = app.lambda_handler(ddb_event_multiple, "")
+
+    assert 'ERROR' in ret['status']
+    first = ddb_event_multiple['Records'][0]['dynamodb']['SequenceNumber']
+    assert ret['batchItemFailures'] == [ { 'itemIdentifier': first } ]
@@ -0,0 +1,73 @@
+import json
+import os
+import pytest
+from decimal import Decimal
+
+from boto3.dynamodb.types import TypeDeserializer
+
+from src.database_stream import decoder
+
+EVENTS = os.path.join(os.path.dirname(__file__), '..', 'events')
+
+@pytest.fixture()
+def new_images():
+    with open(os.path.join(EVENTS, 'event-streaming-multiple.json')) as f:
+        event = json.load(f)
+    return [ r['dynamodb']['NewImage'] for r in event['Records'] ]
+
+def test_same_values_as_boto3(new_images):
+
+    deserializer = TypeDeserializer()
+    for typed in new_images:
+        expected = { k: deserializer.deserialize(v) for k, v in typed.items() }
+        assert decoder.Image(typed).to_dict() == expected
+
+def test_lazy_decoding(new_images, mocker):
+
+    decode = mocker.spy(decoder, 'decode')
+    image = decoder.Image(new_images[0])
+
+    assert image['pk'] == 'nata.coach.landing_page'
+    assert image.get('name') == 'stormacq'
+    decode.assert_not_called()
+
+    assert image['created_at'] == 1603709167
+    assert image['created_at'] == 1603709167
+    assert decode.call_count == 1
+
+    # nested maps are decoded one level at a time
+    event = image['event']
+    assert isinstance(event, decoder.Image)
+    assert event['requestContext']['http']['sourceIp'] == '54.239.6.177'
+
+def test_missing_attribute():
+
+    image = decoder.Image({ 'pk': { 'S': 'page' } })
+
+    assert image.get('name') is None
+    assert image.get('name', '') == ''
+    assert 'name' not in image
+    with pytest.raises(KeyError):
+        image['name']
+
+def test_types():
+
+    image = decoder.Image({
+        'n': { 'N': '1.5' },
+        'b': { 'B': 'aGVsbG8=' },
+        'bool': { 'BOOL': False },
+        'null': { 'NULL': True },
+        'l': { 'L': [ { 'S': 'a' }, { 'N': '1' } ] },
+        'ss': { 'SS': [ 'a', 'b' ] },
+        'ns': { 'NS': [ '1', '2' ] },
+    })
+
+    assert image.to_dict() == {
+        'n': Decimal('1.5'),
+        'b': b'hello',
+        'bool': False,
+        'null': None,
+        'l': [ 'a', 1 ],
+        'ss': { 'a', 'b' },
+        'ns': { 1, 2 },
+    }
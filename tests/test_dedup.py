@@ -0,0 +1,44 @@
+from src.form_data_collect import dedup
+
+def test_payload_hash_is_normalized():
+
+    first = dedup.payload_hash({ 'pk': 'page', 'name': ' seb ', 'email': 'seb@stormacq.com' })
+    second = dedup.payload_hash({ 'email': 'seb@stormacq.com', 'name': 'seb', 'pk': 'page', 'created_at': 1 })
+
+    assert first == second
+    assert first != dedup.payload_hash({ 'pk': 'page', 'name': 'nata', 'email': 'seb@stormacq.com' })
+
+def test_cache_window():
+
+    cache = dedup.DedupCache()
+    cache.add('key', 1000)
+
+    assert cache.seen('key', 1100, window=300)
+    assert not cache.seen('key', 1300, window=300)
+    assert not cache.seen('other', 1100, window=300)
+
+def test_cache_is_bounded():
+
+    cache = dedup.DedupCache(max_size=2)
+    cache.add('a', 0)
+    cache.add('b', 0)
+    cache.seen('a', 0, window=300)
+    cache.add('c', 0)
+
+    # 'b' is the least recently used
+    assert list(cache.entries) == ['a', 'c']
+
+def test_stats():
+
+    stats = dedup.DedupStats()
+    stats.requests = 4
+    stats.local_hits = 1
+    stats.conditional_hits = 1
+
+    assert stats.as_dict() == {
+        'requests': 4,
+        'local_hits': 1,
+        'conditional_hits': 1,
+        'saved_writes': 1,
+        'hit_rate': 0.5
+    }
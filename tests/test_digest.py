@@ -0,0 +1,67 @@
+import pytest
+
+from src.database_stream import digest
+
+class Clock:
+    def __init__(self, now=1000):
+        self.now = now
+    def __call__(self):
+        return self.now
+
+def image(pk, email):
+    return { 'pk': { 'S': pk }, 'sk': { 'S': email }, 'name': { 'S': email.split('@')[0] } }
+
+@pytest.fixture()
+def clock():
+    return Clock()
+
+@pytest.fixture()
+def buffer(tmp_path, clock):
+    return digest.Digest(digest.FileDigestStore(str(tmp_path / 'digest.json')), window=600, max_size=3, clock=clock)
+
+def test_flush_after_window(buffer, clock):
+
+    buffer.add([ image('page.a', 'a1@example.com'), image('page.b', 'b1@example.com') ])
+    clock.now += 300
+    buffer.add([ image('page.a', 'a2@example.com') ])
+
+    assert buffer.flush() == []
+
+    clock.now += 300
+    flushed = dict(buffer.flush())
+
+    assert [ i['sk']['S'] for i in flushed['page.a'] ] == ['a1@example.com', 'a2@example.com']
+    assert [ i['sk']['S'] for i in flushed['page.b'] ] == ['b1@example.com']
+    assert buffer.flush(force=True) == []
+
+def test_flush_on_size(buffer):
+
+    buffer.add([ image('page.a', f'a{i}@example.com') for i in range(3) ])
+    buffer.add([ image('page.b', 'b1@example.com') ])
+
+    flushed = buffer.flush()
+
+    assert [ pk for pk, _ in flushed ] == ['page.a']
+    assert len(flushed[0][1]) == 3
+
+def test_restore(buffer, clock):
+
+    buffer.add([ image('page.a', 'a1@example.com') ])
+    (pk, images), = buffer.flush(force=True)
+    buffer.restore(pk, images)
+
+    assert buffer.store.pending() == { 'page.a': (clock.now - 600, 1) }
+    assert buffer.ready() == ['page.a']
+
+def test_dynamodb_store(mocker):
+
+    table = mocker.Mock()
+    table.scan.return_value = { 'Items': [ { 'pk': 'page.a', 'since': 1000, 'image_count': 2 } ] }
+    table.delete_item.return_value = { 'Attributes': { 'images': [ 'x', 'y' ] } }
+    store = digest.DynamoDBDigestStore(table)
+
+    store.add('page.a', [ 'x', 'y' ], 1000)
+
+    assert table.update_item.call_args.kwargs['ExpressionAttributeValues'][':count'] == 2
+    assert store.pending() == { 'page.a': (1000, 2) }
+    assert store.take('page.a') == [ 'x', 'y' ]
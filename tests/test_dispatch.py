@@ -0,0 +1,146 @@
+import os
+import json
+import copy
+import pytest
+
+from tests.standins import SNSStandIn, SQSStandIn, WebhookStandIn
+from src.database_stream import app, dispatch
+from src.database_stream.decoder import Image
+from src.database_stream.notification import NotificationRenderer
+
+TOPIC = 'arn:aws:sns:eu-central-1:401955065246:DataCollectionTopic'
+EVENTS = os.path.join(os.path.dirname(__file__), '..', 'events')
+
+@pytest.fixture()
+def records():
+    with open(os.path.join(EVENTS, 'event-streaming-multiple.json')) as f:
+        inserts = [ r for r in json.load(f)['Records'] if r['eventName'] == 'INSERT' ]
+    # two records of the landing page, one of the webinar
+    webinar = copy.deepcopy(inserts[0])
+    webinar['dynamodb']['NewImage']['pk'] = { 'S': 'nata.coach.webinar' }
+    webinar['dynamodb']['SequenceNumber'] = '3133900000000004608185999'
+    return inserts + [ webinar ]
+
+@pytest.fixture()
+def environment(mocker):
+    mocker.patch.dict(os.environ, { 'SNS_TOPIC_ARN': TOPIC, 'AWS_ACCESS_KEY_ID': 'local', 'AWS_SECRET_ACCESS_KEY': 'local' })
+    mocker.patch.dict(os.environ)
+    os.environ.pop('UNIT_TEST_PROFILE', None)
+    app.reset_cache()
+    yield
+    app.reset_cache()
+
+def entries(records):
+    return [ (i, Image(r['dynamodb']['NewImage']), '') for i, r in enumerate(records) ]
+
+def test_default_route(records):
+
+    router = dispatch.Router({}, TOPIC, None, None)
+    groups = dispatch.route(router, entries(records))
+
+    assert len(groups) == 1
+    (target, group), = groups.items()
+    assert target.name == f'sns:{TOPIC}'
+    assert len(group.images) == 3
+
+def test_routes_group_records_per_target(records, mocker):
+
+    hook = { 'type': 'webhook', 'url': 'http://localhost/hook' }
+    router = dispatch.Router({
+        'nata.coach.landing_page': [ { 'type': 'sqs', 'queue_url': 'q' }, hook ],
+        'nata.coach.webinar': [ hook ],
+    }, TOPIC, None, None)
+    groups = dispatch.route(router, entries(records))
+
+    counts = { target.name: (group.first, len(group.images)) for target, group in groups.items() }
+    assert counts == { 'sqs:q': (0, 2), 'webhook:localhost': (0, 3) }
+    # sharded pages follow their page route
+    mocker.patch.dict(os.environ, { 'SHARD_COUNT': '4' })
+    assert router.targets_for('nata.coach.webinar#3') == router.targets_for('nata.coach.webinar')
+
+def test_unknown_target_type():
+
+    with pytest.raises(ValueError):
+        dispatch.Router({ 'page': [ { 'type': 'email' } ] }, TOPIC, None, None)
+
+def test_payload_is_plain_json():
+
+    image = Image({ 'pk': { 'S': 'p' }, 'created_at': { 'N': '1.5' }, 'tags': { 'SS': [ 'b', 'a' ] },
+                    'meta': { 'M': { 'n': { 'N': '2' } } }, 'event': { 'M': {} } })
+
+    assert json.loads(dispatch.to_json(dispatch.item(image))) == { 'pk': 'p', 'created_at': 1.5, 'tags': [ 'a', 'b' ], 'meta': { 'n': 2 } }
+
+def test_handler_delivers_to_every_target(records, environment, mocker):
+
+    with SNSStandIn() as sns, SQSStandIn() as sqs, WebhookStandIn() as webhook:
+        mocker.patch.dict(os.environ, {
+            'SNS_ENDPOINT_URL': sns.endpoint,
+            'SQS_ENDPOINT_URL': sqs.endpoint,
+            'NOTIFICATION_ROUTES': json.dumps({
+                'nata.coach.landing_page': [ { 'type': 'sns', 'topic_arn': TOPIC, 'format': 'json' },
+                                             { 'type': 'sqs', 'queue_url': f'{sqs.endpoint}/000000000000/crm' } ],
+                'nata.coach.webinar': [ { 'type': 'webhook', 'url': f'{webhook.endpoint}/hook', 'headers': { 'X-Token': 's3cr3t' } } ],
+                '*': [ { 'type': 'sns', 'topic_arn': TOPIC } ],
+            })
+        })
+
+        ret = app.lambda_handler({ 'Records': records }, "")
+
+    assert ret['status'] == 'OK'
+    assert ret['notifications'] == 2 + 2 + 1
+    assert [ t['records'] for t in ret['targets'] ] == [ 2, 2, 1 ]
+    assert all(t['ms'] >= 0 for t in ret['targets'])
+
+    # one PublishBatch call with both items
+    params, = sns.published
+    assert params['Action'] == [ 'PublishBatch' ]
+    assert json.loads(params['PublishBatchRequestEntries.member.1.Message'][0])['pk'] == 'nata.coach.landing_page'
+    (operation, request), = sqs.published
+    assert operation == 'SendMessageBatch'
+    assert len(request['Entries']) == 2
+    path, headers, body = webhook.published[0]
+    assert path == '/hook'
+    assert headers['X-Token'] == 's3cr3t'
+    assert body['subject'] == 'You have 1 new subscription'
+    assert body['items'][0]['pk'] == 'nata.coach.webinar'
+
+def test_batch_calls_are_chunked(mocker):
+
+    client = mocker.Mock()
+    client.send_message_batch.return_value = { 'Successful': [], 'Failed': [] }
+    group = dispatch.Group(0)
+    for i in range(25):
+        group.add(Image({ 'pk': { 'S': 'p' }, 'sk': { 'S': str(i) } }), '')
+
+    assert dispatch.SQSTarget(lambda: client, 'q').send(group, NotificationRenderer()) == 25
+    assert [ len(c.kwargs['Entries']) for c in client.send_message_batch.call_args_list ] == [ 10, 10, 5 ]
+    assert client.send_message_batch.call_args_list[2].kwargs['Entries'][0]['Id'] == '20'
+
+def test_failed_target_retries_from_its_first_record(records, environment, mocker):
+
+    client = mocker.patch.object(app, 'sns_client').return_value
+    client.publish_batch.return_value = { 'Successful': [], 'Failed': [ { 'Id': '0', 'Code': 'InternalError' } ] }
+    mocker.patch.dict(os.environ, { 'NOTIFICATION_ROUTES': json.dumps({
+        'nata.coach.webinar': [ { 'type': 'sns', 'topic_arn': 'arn:aws:sns:eu-central-1:401955065246:Webinar', 'format': 'json' } ],
+    }) })
+
+    ret = app.lambda_handler({ 'Records': records }, "")
+
+    assert 'ERROR' in ret['status']
+    assert 'DeliveryError' in ret['exception']
+    # the landing page summary went out, the retry starts at the webinar record
+    client.publish.assert_called_once()
+    assert ret['batchItemFailures'] == [ { 'itemIdentifier': records[2]['dynamodb']['SequenceNumber'] } ]
+    assert [ 'error' in t for t in ret['targets'] ] == [ False, True ]
+
+def test_webhook_error(records, environment):
+
+    with WebhookStandIn(status=500) as webhook:
+        target = dispatch.WebhookTarget(f'{webhook.endpoint}/hook', timeout=1)
+        group = dispatch.Group(0)
+        group.add(Image(records[0]['dynamodb']['NewImage']), '')
+
+        result = dispatch.dispatch({ target: group }, NotificationRenderer())[0]
+
+    assert result.error is not None
+    assert '500' in repr(result.error)
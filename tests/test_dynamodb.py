@@ -0,0 +1,57 @@
+from decimal import Decimal
+
+from boto3.dynamodb.types import TypeSerializer
+
+from src.form_data_collect import dynamodb
+
+def test_same_values_as_boto3():
+
+    item = {
+        'pk': 'page',
+        'created_at': 1603709167,
+        'price': Decimal('1.5'),
+        'ok': True,
+        'nothing': None,
+        'raw_event': b'\x00\x01',
+        'event': { 'headers': { 'referer': 'https://nata.coach/' }, 'cookies': [ 'a', 'b' ] },
+        'tags': { 'x', 'y' },
+    }
+    serializer = TypeSerializer()
+    expected = { k: serializer.serialize(v) for k, v in item.items() }
+    actual = dynamodb.serialize_item(item)
+
+    expected['tags']['SS'].sort()
+    actual['tags']['SS'].sort()
+    assert actual == expected
+
+def test_float():
+
+    assert dynamodb.serialize(1.5) == { 'N': '1.5' }
+
+def test_batch_write_returns_original_items(mocker):
+
+    client = mocker.Mock()
+    items = [ { 'pk': 'page', 'sk': f'user{i}@example.com', 'n': i } for i in range(3) ]
+    client.batch_write_item.return_value = {
+        'UnprocessedItems': { 'table': [ { 'PutRequest': { 'Item': dynamodb.serialize_item(items[1]) } } ] }
+    }
+
+    response = dynamodb.Resource(client).batch_write_item(RequestItems={ 'table': [ { 'PutRequest': { 'Item': i } } for i in items ] })
+
+    sent = client.batch_write_item.call_args.kwargs['RequestItems']['table']
+    assert sent[0]['PutRequest']['Item']['n'] == { 'N': '0' }
+    assert response['UnprocessedItems'] == { 'table': [ { 'PutRequest': { 'Item': items[1] } } ] }
+
+def test_put_item(mocker):
+
+    client = mocker.Mock()
+    dynamodb.Table(client, 'table').put_item(Item={ 'pk': 'page' }, ConditionExpression='c', ExpressionAttributeValues={ ':v': 1 })
+
+    client.put_item.assert_called_once_with(TableName='table', Item={ 'pk': { 'S': 'page' } },
+                                            ConditionExpression='c', ExpressionAttributeValues={ ':v': { 'N': '1' } })
+
+def test_deserialize_round_trip():
+
+    item = { 'pk': 'page', 'n': 1, 'd': Decimal('1.5'), 'b': b'\x00', 'm': { 'l': [ True, None, 'x' ] }, 's': { 'a' } }
+
+    assert dynamodb.deserialize_item(dynamodb.serialize_item(item)) == item
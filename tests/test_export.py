@@ -0,0 +1,111 @@
+import io
+import csv
+import json
+import pytest
+from decimal import Decimal
+
+from src.form_data_collect import app, bulk, export
+
+class FakeTable:
+    """ 10 items per segment, in pages of 3 """
+
+    def __init__(self, segments=4, fail_segment=None):
+        self.items = [ [ { 'pk': 'page', 'sk': f's{s}u{i}', 'created_at': Decimal(i) } for i in range(10) ] for s in range(segments) ]
+        self.fail_segment = fail_segment
+        self.calls = []
+
+    def scan(self, Segment, TotalSegments, **kwargs):
+        self.calls.append(dict(kwargs, Segment=Segment))
+        if Segment == self.fail_segment:
+            raise IOError('segment failed')
+        start = kwargs.get('ExclusiveStartKey', { 'index': 0 })['index']
+        response = { 'Items': self.items[Segment][start:start + 3] }
+        if start + 3 < len(self.items[Segment]):
+            response['LastEvaluatedKey'] = { 'index': start + 3 }
+        return response
+
+def test_parallel_scan():
+
+    table = FakeTable()
+
+    items = list(export.parallel_scan(table, 4, **export.projection(('pk', 'sk', 'name'))))
+
+    assert sorted(i['sk'] for i in items) == sorted(f's{s}u{i}' for s in range(4) for i in range(10))
+    assert len(table.calls) == 16
+    assert table.calls[0]['ProjectionExpression'] == '#f0, #f1, #f2'
+    assert table.calls[0]['ExpressionAttributeNames']['#f2'] == 'name'
+
+def test_parallel_scan_failure():
+
+    with pytest.raises(IOError):
+        list(export.parallel_scan(FakeTable(fail_segment=2), 4))
+
+def test_parallel_scan_stops_early():
+
+    items = export.parallel_scan(FakeTable(), 4)
+    first = next(items)
+    items.close()
+
+    assert first['pk'] == 'page'
+
+def test_writers():
+
+    items = [
+        { 'pk': 'page', 'sk': 'seb@stormacq.com', 'created_at': Decimal('1603709167'), 'name': 'sébastien', 'event': { 'a': [ Decimal('1.5') ] }, 'raw_event': b'\x00' },
+        { 'pk': 'page', 'sk': 'nata@example.com', 'created_at': Decimal('1603709168') },
+    ]
+
+    output = io.StringIO()
+    assert export.export(iter(items), export.CSVWriter(output, ('pk', 'sk', 'created_at', 'name', 'event'))) == 2
+    rows = list(csv.reader(io.StringIO(output.getvalue())))
+    assert rows[0] == [ 'pk', 'sk', 'created_at', 'name', 'event' ]
+    assert rows[1] == [ 'page', 'seb@stormacq.com', '1603709167', 'sébastien', '{"a": [1.5]}' ]
+    assert rows[2] == [ 'page', 'nata@example.com', '1603709168', '', '' ]
+
+    output = io.StringIO()
+    export.export(iter(items), export.JSONLinesWriter(output))
+    first = json.loads(output.getvalue().splitlines()[0])
+    assert first['created_at'] == 1603709167 and first['raw_event'] == 'AA=='
+
+def test_parquet(tmp_path):
+
+    pyarrow_parquet = pytest.importorskip('pyarrow.parquet')
+    path = str(tmp_path / 'export.parquet')
+    items = [ { 'pk': 'page', 'sk': f'user{i}', 'created_at': Decimal(i) } for i in range(25) ]
+
+    export.export(iter(items), export.ParquetWriter(path, ('pk', 'sk', 'created_at'), batch_size=10))
+
+    table = pyarrow_parquet.read_table(path)
+    assert table.num_rows == 25
+    assert table.column('created_at').to_pylist()[3] == '3'
+
+def test_main_closes_output(tmp_path, mocker):
+
+    mocker.patch.object(export.dynamodb, 'create_client')
+    mocker.patch.object(export.dynamodb, 'Table', return_value=FakeTable())
+    files = []
+    def tracked(*args, **kwargs):
+        files.append(open(*args, **kwargs))
+        return files[-1]
+    mocker.patch.object(export, 'open', side_effect=tracked, create=True)
+    output = tmp_path / 'all.jsonl'
+
+    export.main([ '--table', 'nata-data-collection-form', '--output', str(output) ])
+
+    assert files[0].closed
+    assert len(output.read_text().splitlines()) == 40
+
+def test_export_page_from_dynamodb(tmp_path):
+
+    # DynamoDB Local
+    app.reset_cache()
+    items = [ { 'pk': 'test.export_page', 'sk': f'user{i}@example.com', 'created_at': i, 'name': f'user {i}', 'event': { 'big': 'x' * 100 } } for i in range(30) ]
+    assert bulk.batch_write(app.dynamodb_resource(), 'nata-data-collection-form', items) == set()
+
+    output = tmp_path / 'page.csv'
+    export.main([ '--table', 'nata-data-collection-form', '--page', 'test.export_page', '--format', 'csv',
+                  '--output', str(output), '--endpoint-url', 'http://localhost:8000' ])
+
+    rows = list(csv.DictReader(open(output)))
+    assert len(rows) == 30
+    assert set(rows[0]) == { 'pk', 'sk', 'created_at', 'name' }
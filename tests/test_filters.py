@@ -0,0 +1,157 @@
+import os
+import json
+import copy
+import pytest
+
+from src.database_stream import app
+from src.database_stream import filters
+from src.database_stream.filters import RecordFilter
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+
+@pytest.fixture()
+def records():
+    with open(os.path.join(ROOT, 'events', 'event-streaming-multiple.json')) as f:
+        return json.load(f)['Records']
+
+def template():
+    yaml = pytest.importorskip('yaml')
+
+    # CloudFormation tags are kept as { tag: value }, e.g. !Ref X as { 'Ref': 'X' }
+    def tag(loader, suffix, node):
+        if isinstance(node, yaml.SequenceNode):
+            return { suffix: loader.construct_sequence(node, deep=True) }
+        if isinstance(node, yaml.MappingNode):
+            return { suffix: loader.construct_mapping(node, deep=True) }
+        return { suffix: loader.construct_scalar(node) }
+
+    class Loader(yaml.SafeLoader):
+        pass
+    Loader.add_multi_constructor('!', tag)
+    with open(os.path.join(ROOT, 'template.yaml')) as f:
+        return yaml.load(f, Loader=Loader)
+
+def template_pattern(name='StreamFilterPattern'):
+    return template()['Parameters'][name]['Default']
+
+def record(name='INSERT', **image):
+    return { 'eventName': name, 'dynamodb': { 'NewImage': { k: { 'S': v } for k, v in image.items() } } }
+
+def test_default_keeps_inserts(records):
+
+    kept = RecordFilter(filters.parse(None)).apply(records)
+
+    assert [ r['eventName'] for r in kept ] == [ 'INSERT', 'INSERT' ]
+
+def test_template_pattern(records):
+
+    keep = RecordFilter(filters.parse(template_pattern())).matches
+
+    assert [ keep(r) for r in records ] == [ r['eventName'] == 'INSERT' for r in records ]
+    assert keep(record(pk='nata.coach.landing_page#3', sk='a@example.com'))
+    # every page is notified by default
+    assert keep(record(pk='bench.load_page', sk='a@example.com'))
+    assert not keep(record('MODIFY', pk='nata.coach.landing_page', sk='a@example.com'))
+    assert not keep({ 'eventName': 'REMOVE', 'dynamodb': { 'Keys': { 'pk': { 'S': 'nata.coach.landing_page' } } } })
+
+def test_template_page_prefix():
+
+    resource = template()['Resources']['DDBStreamFunction']['Properties']
+    condition, prefixed, default = resource['Events']['DDBEvent']['Properties']['FilterCriteria']['Filters'][0]['Pattern']['If']
+    environment = resource['Environment']['Variables']['STREAM_FILTER']['If']
+    pattern = prefixed['Sub'].replace('${NotifiedPagePrefix}', 'nata.coach.')
+    keep = RecordFilter(filters.parse(pattern)).matches
+
+    assert condition == 'HasNotifiedPagePrefix' and environment[0] == condition
+    assert default == { 'Ref': 'StreamFilterPattern' }
+    # the function evaluates the pattern of its event source mapping
+    assert environment[1]['Sub'].startswith(f'[{prefixed["Sub"]}, ')
+    assert keep(record(pk='nata.coach.landing_page', sk='a@example.com'))
+    assert not keep(record(pk='bench.load_page', sk='a@example.com'))
+    assert not keep(record('MODIFY', pk='nata.coach.landing_page', sk='a@example.com'))
+
+def test_template_archive_pattern(records):
+
+    # STREAM_FILTER of the stream function: either event source mapping
+    keep = RecordFilter(filters.parse(f'[{template_pattern()}, {template_pattern("ArchiveFilterPattern")}]')).matches
+    removed = { 'eventName': 'REMOVE', 'dynamodb': { 'Keys': { 'pk': { 'S': 'nata.coach.landing_page' } } } }
+    expired = dict(removed, userIdentity={ 'type': 'Service', 'principalId': 'dynamodb.amazonaws.com' })
+
+    assert keep(record(pk='nata.coach.landing_page', sk='a@example.com'))
+    assert keep(expired)
+    assert not keep(removed)
+
+@pytest.mark.parametrize('rules,value,expected', [
+    ([ 'a', 'b' ], 'b', True),
+    ([ 'a' ], 'ab', False),
+    ([ 1 ], 1, True),
+    ([ 1 ], '1', False),
+    ([ None ], None, True),
+    ([ True ], True, True),
+    ([ { 'prefix': 'na' } ], 'nata', True),
+    ([ { 'suffix': '.com' } ], 'a@b.com', True),
+    ([ { 'equals-ignore-case': 'insert' } ], 'INSERT', True),
+    ([ { 'anything-but': [ 'REMOVE', 'MODIFY' ] } ], 'INSERT', True),
+    ([ { 'anything-but': 'REMOVE' } ], 'REMOVE', False),
+    ([ { 'anything-but': { 'prefix': 'bench.' } } ], 'bench.page', False),
+    ([ { 'numeric': [ '>', 0, '<=', 10 ] } ], 10, True),
+    ([ { 'numeric': [ '>', 0, '<=', 10 ] } ], 11, False),
+    ([ { 'numeric': [ '=', 1 ] } ], '1', False),
+    ([ 'x' ], [ 'a', 'x' ], True),
+    ([ { 'exists': True } ], '', True),
+    ([ { 'exists': False } ], '', False),
+])
+def test_matchers(rules, value, expected):
+
+    assert RecordFilter([ { 'field': rules } ]).matches({ 'field': value }) is expected
+
+def test_exists():
+
+    present = RecordFilter([ { 'a': { 'b': [ { 'exists': True } ] } } ])
+    absent = RecordFilter([ { 'a': { 'b': [ { 'exists': False } ] } } ])
+
+    assert present.matches({ 'a': { 'b': 1 } })
+    assert not present.matches({ 'a': {} })
+    assert absent.matches({ 'a': {} })
+    # a missing parent object
+    assert absent.matches({})
+    assert not present.matches({})
+
+def test_patterns_are_or_ed():
+
+    keep = RecordFilter(filters.parse('[{"eventName": ["INSERT"]}, {"eventName": ["REMOVE"]}]'))
+
+    assert keep.matches({ 'eventName': 'REMOVE' })
+    assert not keep.matches({ 'eventName': 'MODIFY' })
+
+@pytest.mark.parametrize('pattern', [
+    {},
+    { 'a': 'INSERT' },
+    { 'a': [] },
+    { 'a': [ { 'prefix': 'x', 'suffix': 'y' } ] },
+    { 'a': [ { 'wildcard': '*' } ] },
+    { 'a': [ { 'numeric': [ '>' ] } ] },
+])
+def test_invalid_patterns(pattern):
+
+    with pytest.raises(ValueError):
+        RecordFilter([ pattern ])
+
+def test_handler_skips_filtered_records(records, mocker):
+
+    mocker.patch.dict(os.environ, {
+        'SNS_TOPIC_ARN': 'arn:aws:sns:eu-central-1:401955065246:DataCollectionTopic',
+        'STREAM_FILTER': template_pattern(),
+    })
+    client = mocker.patch.object(app, 'sns_client').return_value
+    other = copy.deepcopy(records[0])
+    other['eventName'] = 'MODIFY'
+
+    ret = app.lambda_handler({ 'Records': records + [ other ] }, "")
+
+    assert ret['status'] == 'OK'
+    assert ret['messages'] == 2
+    assert ret['skipped'] == 2
+    # skipped records are checkpointed too
+    assert ret['checkpoint'] == other['dynamodb']['SequenceNumber']
+    assert client.publish.call_args.kwargs['Subject'] == 'You have 2 new subscriptions'
@@ -4,6 +4,7 @@ import pytest
 from pytest_mock import mocker
 
 import boto3 
+from botocore.exceptions import ClientError
 
 from src.form_data_collect import app
 
@@ -112,3 +113,349 @@ def test_happy_path_dynamodb(apigw_event, mocker):
     assert record['name'] == 'seb'
 
     # assert "location" in data.dict_keys()
+
+def test_table_is_cached(mocker):
+
+    app.reset_cache()
+    create_client = mocker.spy(app.dynamodb, 'create_client')
+
+    first = app.dynamodb_table('nata-data-collection-form')
+    second = app.dynamodb_table('nata-data-collection-form')
+
+    assert first is second
+    assert create_client.call_count == 1
+
+    # a different table reuses the client but gets its own Table object
+    other = app.dynamodb_table('another-table')
+    assert other is not first
+    assert create_client.call_count == 1
+
+def test_reset_cache(mocker):
+
+    first = app.dynamodb_table('nata-data-collection-form')
+    app.reset_cache()
+    second = app.dynamodb_table('nata-data-collection-form')
+
+    assert first is not second
+
+def test_bulk_route(apigw_event, mocker):
+
+    mocker.patch.dict(os.environ, {'TABLE_NAME':'nata-data-collection-form'})
+    resource = mocker.patch.object(app, 'dynamodb_resource').return_value
+    resource.batch_write_item.return_value = { 'UnprocessedItems': {} }
+
+    apigw_event['routeKey'] = 'POST /form/bulk'
+    apigw_event['isBase64Encoded'] = False
+    apigw_event['body'] = '\n'.join([
+        'pk=nata.coach.landing_page&sk=email&name=seb&email=seb%40stormacq.com',
+        'pk=nata.coach.landing_page&sk=email&name=nata',
+        'pk=nata.coach.landing_page&sk=email&name=seb2&email=seb%40stormacq.com',
+    ])
+
+    ret = app.lambda_handler(apigw_event, "")
+    data = json.loads(ret['body'])
+
+    assert ret['statusCode'] == 200
+    assert data['status'] == 'PARTIAL'
+    assert data['written'] == 1
+    assert [ i['status'] for i in data['items'] ] == ['DUPLICATE', 'INVALID', 'OK']
+
+    request = resource.batch_write_item.call_args.kwargs['RequestItems']['nata-data-collection-form']
+    assert len(request) == 1
+    assert request[0]['PutRequest']['Item']['name'] == 'seb2'
+    assert 'body' not in request[0]['PutRequest']['Item']['event']
+
+def test_bulk_route_invalid_keys(apigw_event, mocker):
+
+    mocker.patch.dict(os.environ, {'TABLE_NAME':'nata-data-collection-form'})
+    resource = mocker.patch.object(app, 'dynamodb_resource').return_value
+    resource.batch_write_item.return_value = { 'UnprocessedItems': {} }
+
+    apigw_event['routeKey'] = 'POST /form/bulk'
+    apigw_event['isBase64Encoded'] = False
+    apigw_event['body'] = json.dumps([
+        { 'pk': 'nata.coach.landing_page', 'sk': { 'a': 1 }, 'email': 'seb@stormacq.com' },
+        { 'pk': 'nata.coach.landing_page', 'sk': 'age', 'age': 3 },
+        { 'pk': 'nata.coach.landing_page', 'sk': 'email', 'email': 'seb@stormacq.com' },
+    ])
+
+    ret = app.lambda_handler(apigw_event, "")
+    data = json.loads(ret['body'])
+
+    assert ret['statusCode'] == 200
+    assert [ i['status'] for i in data['items'] ] == ['INVALID', 'INVALID', 'OK']
+    request = resource.batch_write_item.call_args.kwargs['RequestItems']['nata-data-collection-form']
+    assert len(request) == 1
+
+def test_bulk_route_nan(apigw_event, mocker):
+
+    mocker.patch.dict(os.environ, {'TABLE_NAME':'nata-data-collection-form'})
+    resource = mocker.patch.object(app, 'dynamodb_resource').return_value
+    resource.batch_write_item.return_value = { 'UnprocessedItems': {} }
+
+    apigw_event['routeKey'] = 'POST /form/bulk'
+    apigw_event['isBase64Encoded'] = False
+    apigw_event['body'] = '[{"pk": "p", "sk": "email", "email": "a@b.co", "x": NaN}, {"pk": "p", "sk": "email", "email": "c@d.co"}]'
+
+    ret = app.lambda_handler(apigw_event, "")
+
+    assert ret['statusCode'] == 200
+    assert [ i['status'] for i in json.loads(ret['body'])['items'] ] == ['INVALID', 'OK']
+
+def test_bulk_route_too_many(apigw_event, mocker):
+
+    mocker.patch.dict(os.environ, {'TABLE_NAME':'nata-data-collection-form', 'MAX_BULK_SUBMISSIONS':'1'})
+
+    apigw_event['routeKey'] = 'POST /form/bulk'
+    apigw_event['isBase64Encoded'] = False
+    apigw_event['body'] = '[{"pk": "page", "sk": "email"}, {"pk": "page", "sk": "email"}]'
+
+    ret = app.lambda_handler(apigw_event, "")
+
+    assert ret['statusCode'] == 413
+
+def test_projected_event(apigw_event, mocker):
+
+    mocker.patch.dict(os.environ, {'TABLE_NAME':'nata-data-collection-form', 'EVENT_RAW_STORAGE':'compressed'})
+    table = mocker.patch.object(app, 'dynamodb_table').return_value
+    table.put_item.return_value = {}
+
+    app.lambda_handler(apigw_event, "")
+
+    item = table.put_item.call_args.kwargs['Item']
+    assert item['event']['requestContext']['http']['sourceIp'] == '86.245.187.149'
+    assert 'body' not in item['event']
+    assert 'headers' in item['event'] and 'host' not in item['event']['headers']
+    assert app.projection.decompress_event(item['raw_event']) == apigw_event
+
+def test_dedup_local(apigw_event, mocker):
+
+    mocker.patch.dict(os.environ, {'TABLE_NAME':'nata-data-collection-form', 'DEDUP_MODE':'local', 'METRICS_SINK':'local'})
+    table = mocker.patch.object(app, 'dynamodb_table').return_value
+    table.put_item.return_value = {}
+    app.dedup.cache.clear()
+    app.dedup.stats.reset()
+    app.metrics.local_sink.clear()
+
+    first = app.lambda_handler(apigw_event, "")
+    second = app.lambda_handler(apigw_event, "")
+
+    assert json.loads(first['body']) == { 'status': 'OK' }
+    assert json.loads(second['body']) == { 'status': 'OK', 'duplicate': True }
+    assert table.put_item.call_count == 1
+    assert app.dedup.stats.saved_writes == 1
+    assert 'dedup_local_hit' not in app.metrics.local_sink.documents[0]
+    assert app.metrics.local_sink.documents[1]['dedup_local_hit'] == 1
+    app.dedup.cache.clear()
+
+def test_dedup_conditional(apigw_event, mocker):
+
+    mocker.patch.dict(os.environ, {'TABLE_NAME':'nata-data-collection-form', 'DEDUP_MODE':'conditional', 'METRICS_SINK':'local'})
+    table = mocker.patch.object(app, 'dynamodb_table').return_value
+    table.put_item.side_effect = ClientError(
+        { 'Error': { 'Code': 'ConditionalCheckFailedException' } }, 'PutItem')
+    app.dedup.cache.clear()
+    app.dedup.stats.reset()
+    app.metrics.local_sink.clear()
+
+    ret = app.lambda_handler(apigw_event, "")
+
+    assert json.loads(ret['body'])['duplicate']
+    assert 'ConditionExpression' in table.put_item.call_args.kwargs
+    assert app.dedup.stats.conditional_hits == 1
+    assert app.metrics.local_sink.documents[-1]['dedup_conditional_hit'] == 1
+    app.dedup.cache.clear()
+
+def test_handler_module_does_not_import_boto3():
+
+    # a fresh interpreter, importing the handler must not pull boto3 nor botocore
+    import subprocess
+    import sys
+    code = 'import sys; import src.form_data_collect.app; print(sorted(m for m in sys.modules if m.split(".")[0] in ("boto3", "botocore")))'
+    root = os.path.join(os.path.dirname(__file__), '..')
+    env = dict(os.environ, PYTHONPATH=os.path.join(root, 'src'))
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=root, env=env, text=True, stderr=subprocess.DEVNULL)
+
+    assert output.strip() == '[]'
+
+def test_write_behind(apigw_event, mocker):
+
+    mocker.patch.dict(os.environ, {'TABLE_NAME':'nata-data-collection-form', 'WRITE_MODE':'write-behind', 'WRITE_QUEUE':'local'})
+    table = mocker.patch.object(app, 'dynamodb_table').return_value
+    queue = mocker.patch.object(app.writebehind, 'local_queue', app.writebehind.LocalQueue())
+
+    ret = app.lambda_handler(apigw_event, "")
+
+    assert ret['statusCode'] == 200
+    table.put_item.assert_not_called()
+    item = app.writebehind.decode_item(queue.receive(1)[0])
+    assert item['sk'] == 'seb@stormacq.com'
+
+def test_write_behind_unavailable(apigw_event, mocker):
+
+    from botocore.exceptions import ClientError, EndpointConnectionError
+
+    mocker.patch.dict(os.environ, {'TABLE_NAME':'nata-data-collection-form', 'WRITE_MODE':'write-behind', 'WRITE_QUEUE_URL':'https://sqs.eu-central-1.amazonaws.com/0/q'})
+    mocker.patch.object(app.retry, 'sleep')
+    create_client = mocker.patch('botocore.session.Session.create_client')
+    client = create_client.return_value
+    app.reset_cache()
+
+    client.send_message.side_effect = EndpointConnectionError(endpoint_url='https://sqs.eu-central-1.amazonaws.com')
+    ret = app.lambda_handler(apigw_event, "")
+
+    assert ret['statusCode'] == 503
+    assert ret['headers']['Retry-After'] == '1'
+    assert client.send_message.call_count == 3
+    config = create_client.call_args.kwargs['config']
+    assert (config.connect_timeout, config.read_timeout) == (0.5, 1.0)
+
+    client.send_message.side_effect = ClientError({ 'Error': { 'Code': 'AccessDenied' } }, 'SendMessage')
+    ret = app.lambda_handler(apigw_event, "")
+
+    assert ret['statusCode'] == 503
+    app.reset_cache()
+
+def test_metrics(apigw_event, mocker):
+
+    mocker.patch.dict(os.environ, {'TABLE_NAME':'nata-data-collection-form', 'METRICS_SINK':'local'})
+    table = mocker.patch.object(app, 'dynamodb_table').return_value
+    table.put_item.return_value = {}
+    app.metrics.local_sink.clear()
+
+    app.lambda_handler(apigw_event, "")
+
+    document = app.metrics.local_sink.documents[-1]
+    names = [ m['Name'] for m in document['_aws']['CloudWatchMetrics'][0]['Metrics'] ]
+    assert sorted(names) == ['decode', 'dynamodb', 'handler', 'parse', 'validate']
+    assert document['Function'] == 'FormDataCollectFunction'
+    assert document['handler'] >= document['dynamodb']
+    assert document['percentiles']['handler']['count'] >= 1
+
+def test_body_too_large(apigw_event, mocker):
+
+    mocker.patch.dict(os.environ, {'TABLE_NAME':'nata-data-collection-form', 'MAX_BODY_SIZE':'16'})
+    table = mocker.patch.object(app, 'dynamodb_table').return_value
+
+    ret = app.lambda_handler(apigw_event, "")
+
+    assert ret['statusCode'] == 413
+    table.put_item.assert_not_called()
+
+def test_json_body(apigw_event, mocker):
+
+    mocker.patch.dict(os.environ, {'TABLE_NAME':'nata-data-collection-form'})
+    table = mocker.patch.object(app, 'dynamodb_table').return_value
+    table.put_item.return_value = {}
+
+    apigw_event['headers']['content-type'] = 'application/json'
+    apigw_event['headers'].pop('content-length')
+    apigw_event['isBase64Encoded'] = False
+    apigw_event['body'] = '{"pk": "nata.coach.landing_page", "sk": "email", "name": "seb", "email": "seb@stormacq.com"}'
+
+    ret = app.lambda_handler(apigw_event, "")
+
+    assert ret['statusCode'] == 200
+    assert table.put_item.call_args.kwargs['Item']['sk'] == 'seb@stormacq.com'
+
+def test_json_body_numeric_pk(apigw_event, mocker):
+
+    mocker.patch.dict(os.environ, {'TABLE_NAME':'nata-data-collection-form'})
+    table = mocker.patch.object(app, 'dynamodb_table').return_value
+    apigw_event['headers']['content-type'] = 'application/json'
+    apigw_event['headers'].pop('content-length')
+    apigw_event['isBase64Encoded'] = False
+    apigw_event['body'] = '{"pk": 5, "sk": "email", "email": "seb@stormacq.com"}'
+
+    ret = app.lambda_handler(apigw_event, "")
+
+    assert ret['statusCode'] == 400
+    assert json.loads(ret['body'])['error'] == 'Field pk must be a string'
+    table.put_item.assert_not_called()
+
+def test_json_body_nan(apigw_event, mocker):
+
+    mocker.patch.dict(os.environ, {'TABLE_NAME':'nata-data-collection-form'})
+    table = mocker.patch.object(app, 'dynamodb_table').return_value
+    apigw_event['headers']['content-type'] = 'application/json'
+    apigw_event['headers'].pop('content-length')
+    apigw_event['isBase64Encoded'] = False
+    apigw_event['body'] = '{"pk": "p", "sk": "email", "email": "a@b.co", "x": NaN}'
+
+    ret = app.lambda_handler(apigw_event, "")
+
+    assert ret['statusCode'] == 400
+    table.put_item.assert_not_called()
+
+def test_invalid_body(apigw_event, mocker):
+
+    mocker.patch.dict(os.environ, {'TABLE_NAME':'nata-data-collection-form'})
+
+    apigw_event['headers']['content-type'] = 'application/json'
+    apigw_event['isBase64Encoded'] = False
+    apigw_event['body'] = 'pk=page'
+
+    ret = app.lambda_handler(apigw_event, "")
+
+    assert ret['statusCode'] == 400
+
+def test_missing_sort_key_field(apigw_event, mocker):
+
+    mocker.patch.dict(os.environ, {'TABLE_NAME':'nata-data-collection-form'})
+    table = mocker.patch.object(app, 'dynamodb_table').return_value
+    apigw_event['isBase64Encoded'] = False
+    apigw_event['body'] = 'pk=nata.coach.landing_page&sk=email&name=seb'
+
+    ret = app.lambda_handler(apigw_event, "")
+
+    assert ret['statusCode'] == 400
+    assert 'email' in json.loads(ret['body'])['error']
+    table.put_item.assert_not_called()
+
+@pytest.mark.parametrize('body', [
+    '{"pk": 5, "sk": "email", "email": "seb@stormacq.com"}',
+    '{"pk": "nata.coach.landing_page", "sk": "age", "age": 3}',
+    '{"pk": "nata.coach.landing_page", "sk": "x", "x": null}',
+    '{"pk": "nata.coach.landing_page", "sk": "email", "email": ""}',
+    '{"pk": {"S": "nata.coach.landing_page"}, "sk": "email", "email": "seb@stormacq.com"}',
+    '{"pk": "nata.coach.landing_page", "sk": "email", "email": ["seb@stormacq.com"]}',
+])
+def test_invalid_key_types(apigw_event, mocker, body):
+
+    mocker.patch.dict(os.environ, {'TABLE_NAME':'nata-data-collection-form'})
+    table = mocker.patch.object(app, 'dynamodb_table').return_value
+    apigw_event['headers']['content-type'] = 'application/json'
+    apigw_event['headers'].pop('content-length')
+    apigw_event['isBase64Encoded'] = False
+    apigw_event['body'] = body
+
+    ret = app.lambda_handler(apigw_event, "")
+
+    assert ret['statusCode'] == 400
+    table.put_item.assert_not_called()
+
+def test_schema_config_item_can_not_be_submitted(apigw_event, mocker):
+
+    mocker.patch.dict(os.environ, {'TABLE_NAME':'nata-data-collection-form', 'SCHEMA_SOURCE':'dynamodb'})
+    table = mocker.patch.object(app, 'dynamodb_table').return_value
+    apigw_event['isBase64Encoded'] = False
+    apigw_event['body'] = 'pk=config&sk=x&x=schemas&schemas=%7B%7D'
+
+    ret = app.lambda_handler(apigw_event, "")
+
+    assert ret['statusCode'] == 400
+    table.put_item.assert_not_called()
+    table.get_item.assert_not_called()
+
+def test_schema_strips_unknown_fields(apigw_event, mocker):
+
+    mocker.patch.dict(os.environ, {'TABLE_NAME':'nata-data-collection-form', 'SCHEMA_SOURCE':'file'})
+    table = mocker.patch.object(app, 'dynamodb_table').return_value
+    table.put_item.return_value = {}
+    apigw_event['isBase64Encoded'] = False
+    apigw_event['body'] = 'pk=nata.coach.landing_page&sk=email&name=seb&email=seb%40stormacq.com&utm_source=junk'
+
+    ret = app.lambda_handler(apigw_event, "")
+
+    assert ret['statusCode'] == 200
+    assert 'utm_source' not in table.put_item.call_args.kwargs['Item']
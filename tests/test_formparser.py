@@ -0,0 +1,80 @@
+import base64
+import pytest
+from urllib.parse import parse_qs
+
+from src.form_data_collect import formparser
+
+LIMITS = formparser.Limits(max_body_size=1024, max_fields=5, max_field_length=30)
+
+def test_urlencoded_same_as_parse_qs():
+
+    body = 'pk=nata.coach.landing_page&sk=email&name=s%C3%A9b+s&email=seb%40stormacq.com&name=other&empty='
+
+    expected = { k: v[0] for k, v in parse_qs(body).items() }
+    assert formparser.parse_urlencoded(body, LIMITS) == expected
+
+def test_limits():
+
+    with pytest.raises(formparser.LimitExceeded):
+        formparser.parse_urlencoded('&'.join(f'f{i}=v' for i in range(6)), LIMITS)
+    with pytest.raises(formparser.LimitExceeded):
+        formparser.parse_urlencoded('name=' + 'x' * 31, LIMITS)
+    with pytest.raises(formparser.LimitExceeded):
+        formparser.parse_json('{"name": "' + 'x' * 31 + '"}', LIMITS)
+
+def test_decode_body_rejects_before_decoding(mocker):
+
+    b64decode = mocker.spy(formparser.base64, 'b64decode')
+    body = base64.b64encode(b'x' * 2000).decode('ascii')
+
+    with pytest.raises(formparser.LimitExceeded):
+        formparser.decode_body({ 'body': body, 'isBase64Encoded': True }, 1024)
+    b64decode.assert_not_called()
+
+    with pytest.raises(formparser.LimitExceeded):
+        formparser.decode_body({ 'body': 'x', 'isBase64Encoded': False, 'headers': { 'content-length': '5000' } }, 1024)
+    with pytest.raises(formparser.LimitExceeded):
+        formparser.decode_body({ 'body': 'é' * 600, 'isBase64Encoded': False }, 1024)
+
+    assert formparser.decode_body({ 'body': base64.b64encode(b'a=1').decode(), 'isBase64Encoded': True }, 3) == 'a=1'
+
+def test_multipart():
+
+    boundary = '----WebKitFormBoundary7MA4YWxkTrZu0gW'
+    body = (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="pk"\r\n\r\nnata.coach.landing_page\r\n'
+        f'--{boundary}\r\nContent-Disposition: form-data; name="name"\r\n\r\nline 1\r\nline 2\r\n'
+        f'--{boundary}--\r\n'
+    )
+    media_type, parameters = formparser.content_type({ 'headers': { 'content-type': f'multipart/form-data; boundary={boundary}' } })
+
+    assert formparser.parse(body, media_type, parameters, LIMITS) == { 'pk': 'nata.coach.landing_page', 'name': 'line 1\r\nline 2' }
+
+def test_multipart_rejects_files():
+
+    body = '--b\r\nContent-Disposition: form-data; name="cv"; filename="cv.pdf"\r\n\r\n%PDF\r\n--b--\r\n'
+
+    with pytest.raises(formparser.InvalidBody):
+        formparser.parse_multipart(body, 'b', LIMITS)
+
+def test_json():
+
+    assert formparser.parse('{"pk": "page", "age": 42}', 'application/json', {}, LIMITS) == { 'pk': 'page', 'age': 42 }
+    with pytest.raises(formparser.InvalidBody):
+        formparser.parse('[1, 2]', 'application/json', {}, LIMITS)
+    with pytest.raises(formparser.InvalidBody):
+        formparser.parse('{"tags": ["a"]}', 'application/json', {}, LIMITS)
+
+def test_json_keys_are_strings():
+
+    for body in ('{"pk": 5, "sk": "email", "email": "a@b.c"}', '{"pk": "page", "sk": true, "email": "a@b.c"}',
+                 '{"pk": "page", "sk": "age", "age": 42}', '{"pk": "page", "sk": "x", "x": null}'):
+        with pytest.raises(formparser.InvalidBody, match='must be a string'):
+            formparser.parse(body, 'application/json', {}, LIMITS)
+
+def test_json_non_finite_numbers():
+
+    for value in ('NaN', 'Infinity', '-Infinity', '1e400'):
+        with pytest.raises(formparser.InvalidBody):
+            formparser.parse(f'{{"pk": "page", "x": {value}}}', 'application/json', {}, LIMITS)
+    assert formparser.parse('{"pk": "page", "x": 1e300}', 'application/json', {}, LIMITS)['x'] == 1e300
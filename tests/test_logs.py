@@ -0,0 +1,38 @@
+import logging
+
+from common import logs
+
+def test_level_from_env(mocker):
+
+    mocker.patch.dict('os.environ', { 'LOG_LEVEL': 'warning' })
+    assert logs.get_logger('test-logs').level == logging.WARNING
+
+    mocker.patch.dict('os.environ', { 'LOG_LEVEL': 'verbose' })
+    assert logs.level() == logging.INFO
+
+def test_debug_sampling(mocker):
+
+    mocker.patch.dict('os.environ', { 'LOG_LEVEL': 'INFO', 'LOG_DEBUG_SAMPLE_RATE': '0.1' })
+    log = logging.getLogger('test-sampling')
+    draws = iter([ 0.05, 0.5 ])
+    levels = []
+
+    @logs.debug_sampling(log, random=lambda: next(draws))
+    def handler(event, context):
+        levels.append(log.getEffectiveLevel())
+
+    handler({}, None)
+    handler({}, None)
+
+    assert levels == [ logging.DEBUG, logging.INFO ]
+
+def test_debug_arguments_not_formatted_at_info(mocker):
+
+    mocker.patch.dict('os.environ', { 'LOG_LEVEL': 'INFO', 'LOG_DEBUG_SAMPLE_RATE': '0' })
+
+    class Expensive:
+        def __str__(self):
+            raise AssertionError('formatted')
+
+    log = logs.get_logger('test-lazy')
+    log.debug('%s', Expensive())
@@ -0,0 +1,75 @@
+import json
+
+from common import metrics
+
+class Clock:
+    def __init__(self):
+        self.value = 0.0
+    def __call__(self):
+        return self.value
+
+def test_timer_and_document(mocker):
+
+    clock = Clock()
+    recorder = metrics.Recorder('TestFunction', clock=clock)
+
+    with recorder.timer('parse'):
+        clock.value += 0.25
+    for _ in range(2):
+        with recorder.timer('publish'):
+            clock.value += 0.5
+    recorder.record('records', 3, 'Count')
+
+    document = recorder.document()
+
+    assert document['Function'] == 'TestFunction'
+    assert document['parse'] == 250.0
+    assert document['publish'] == [500.0, 500.0]
+    assert document['records'] == 3
+    definition = document['_aws']['CloudWatchMetrics'][0]
+    assert definition['Dimensions'] == [['Function']]
+    assert { 'Name': 'records', 'Unit': 'Count' } in definition['Metrics']
+
+def test_percentiles_across_invocations(mocker):
+
+    mocker.patch.dict('os.environ', { 'METRICS_SINK': 'local' })
+    metrics.local_sink.clear()
+    recorder = metrics.Recorder('TestFunction', window=100)
+
+    for value in range(1, 201):
+        recorder.record('dynamodb', float(value))
+        recorder.flush()
+
+    assert len(metrics.local_sink.documents) == 200
+    # only the last 100 samples are kept
+    assert recorder.percentiles()['dynamodb'] == { 'p50': 151.0, 'p90': 190.0, 'p99': 199.0, 'count': 100 }
+    assert metrics.local_sink.metric('dynamodb') == [ float(v) for v in range(1, 201) ]
+
+def test_instrument_flushes_on_error(mocker):
+
+    mocker.patch.dict('os.environ', { 'METRICS_SINK': 'local' })
+    metrics.local_sink.clear()
+    recorder = metrics.Recorder('TestFunction')
+
+    @recorder.instrument
+    def handler(event, context):
+        raise ValueError('boom')
+
+    try:
+        handler({}, None)
+    except ValueError:
+        pass
+
+    assert 'handler' in metrics.local_sink.documents[0]
+    assert recorder.current == {}
+
+def test_stdout_sink(mocker, capsys):
+
+    mocker.patch.dict('os.environ', { 'METRICS_SINK': 'stdout', 'METRICS_NAMESPACE': 'test' })
+    recorder = metrics.Recorder('TestFunction')
+    recorder.record('parse', 1.5)
+    recorder.flush()
+
+    document = json.loads(capsys.readouterr().out)
+    assert document['_aws']['CloudWatchMetrics'][0]['Namespace'] == 'test'
+    assert document['parse'] == 1.5
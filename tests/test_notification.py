@@ -0,0 +1,94 @@
+import json
+import os
+import pytest
+
+from src.database_stream.decoder import Image
+from src.database_stream.notification import NotificationRenderer, Template
+
+EVENTS = os.path.join(os.path.dirname(__file__), '..', 'events')
+
+@pytest.fixture()
+def images():
+    with open(os.path.join(EVENTS, 'event-streaming-multiple.json')) as f:
+        event = json.load(f)
+    return [ Image(r['dynamodb']['NewImage']) for r in event['Records'] if r['eventName'] == 'INSERT' ]
+
+def test_default_template(images, mocker):
+
+    # the default template of a batch of string attributes is not rendered field by field
+    mocker.patch.object(Template, 'render', side_effect=AssertionError)
+    subject, message = NotificationRenderer().render(images)
+
+    # same output as the original string concatenation
+    expected = ""
+    for data in images:
+        expected = expected + f"Page :\t{data.typed['pk']['S']}\nName :\t{data.typed['name']['S']}\nEmail :\t{data.typed['sk']['S']}\n\n"
+    expected = expected + "\nSent with ❤️ from the ☁️"
+
+    assert subject == 'You have 2 new subscriptions'
+    assert message == expected
+
+def test_template_per_pk(images):
+
+    renderer = NotificationRenderer({ 'nata.coach.landing_page': '{name} <{sk}>\n' })
+    subject, message = renderer.render(images[:1])
+
+    assert subject == 'You have 1 new subscription'
+    assert message.startswith(f"{images[0]['name']} <{images[0]['sk']}>\n")
+
+def test_template_from_env(images, mocker):
+
+    mocker.patch.dict(os.environ, {'NOTIFICATION_TEMPLATES': json.dumps({ 'other.page': '{sk}\n' })})
+    renderer = NotificationRenderer.from_env()
+
+    assert renderer.template_for('other.page').fields == ('sk',)
+    assert renderer.template_for('nata.coach.landing_page') is renderer.default
+
+def test_nothing_to_render():
+
+    assert NotificationRenderer().render([]) == (None, None)
+
+def test_missing_attribute():
+
+    subject, message = NotificationRenderer().render([ Image({ 'pk': { 'S': 'page' }, 'sk': { 'S': 'seb@stormacq.com' } }) ])
+
+    assert message.startswith("Page :\tpage\nName :\t\nEmail :\tseb@stormacq.com\n")
+
+def test_default_template_fallbacks(images, mocker):
+
+    renderer = NotificationRenderer()
+    unusual = [
+        Image({ 'pk': { 'S': 'page' }, 'sk': { 'S': 'a@b.c' }, 'name': { 'N': '42' } }),
+        Image({ 'pk': { 'S': 'page' }, 'sk': { 'S': 'a@b.c' }, 'name': { 'S': 'seb' }, 'page': { 'S': 'home' } }),
+    ]
+
+    # the batch renders like its items one by one, whatever the attributes
+    for image in unusual:
+        assert renderer.render(images + [ image ])[1] == ''.join(map(renderer.render_one, images + [ image ])) + renderer.footer
+    assert renderer.render(unusual[:1])[1].startswith("Page :\tpage\nName :\t42\n")
+    assert renderer.render(unusual[1:])[1].startswith("Page :\thome\n")
+
+    sharded = Image({ 'pk': { 'S': 'nata.coach.landing_page#3' }, 'sk': { 'S': 'a@b.c' }, 'name': { 'S': 'seb' } })
+    mocker.patch.dict(os.environ, { 'SHARD_COUNT': '4' })
+    assert renderer.render([ sharded ])[1].startswith("Page :\tnata.coach.landing_page\n")
+
+def test_format_specifications():
+
+    renderer = NotificationRenderer({ 'page': '{name!r:>8}|{age:>3}|{{{sk}}}' })
+    image = Image({ 'pk': { 'S': 'page' }, 'sk': { 'S': 'a@b.c' }, 'name': { 'S': 'seb' }, 'age': { 'N': '42' } })
+
+    assert renderer.render_one(image) == "   'seb'| 42|{a@b.c}"
+    with pytest.raises(ValueError):
+        NotificationRenderer({ 'page': '{name:{width}}' })
+
+def test_sharded_page_name(mocker):
+
+    image = Image({ 'pk': { 'S': 'nata.coach.landing_page#3' }, 'sk': { 'S': 'seb@stormacq.com' }, 'name': { 'S': 'seb' } })
+    # a page that is not sharded is shown as is
+    assert NotificationRenderer().render_one(image).startswith("Page :\tnata.coach.landing_page#3\n")
+
+    mocker.patch.dict(os.environ, { 'SHARD_COUNT': '4' })
+
+    assert NotificationRenderer().render_one(image).startswith("Page :\tnata.coach.landing_page\n")
+    # the shard is still available to templates
+    assert NotificationRenderer({ 'nata.coach.landing_page': '{pk} {page}' }).render_one(image) == 'nata.coach.landing_page#3 nata.coach.landing_page'
@@ -0,0 +1,55 @@
+import json
+import os
+import pytest
+
+from src.form_data_collect import projection
+
+EVENTS = os.path.join(os.path.dirname(__file__), '..', 'events')
+
+@pytest.fixture()
+def apigw_event():
+    with open(os.path.join(EVENTS, 'event-api.json')) as f:
+        return json.load(f)
+
+def test_default_projection(apigw_event, mocker):
+
+    mocker.patch.dict(os.environ)
+    os.environ.pop('EVENT_PROJECTION', None)
+
+    projected = projection.project_event(apigw_event)
+
+    assert projected == {
+        'requestContext': {
+            'http': {
+                'sourceIp': '86.245.187.149',
+                'userAgent': apigw_event['requestContext']['http']['userAgent']
+            },
+            'requestId': 'U-tsUilQFiAEMXQ=',
+            'timeEpoch': 1603650331593
+        },
+        'headers': {
+            'referer': 'http://localhost:1313/'
+        }
+    }
+
+def test_custom_projection(apigw_event, mocker):
+
+    mocker.patch.dict(os.environ, {'EVENT_PROJECTION': 'routeKey, headers.origin, headers.missing, body.nested'})
+
+    assert projection.project_event(apigw_event) == {
+        'routeKey': 'POST /form',
+        'headers': { 'origin': 'http://localhost:1313' }
+    }
+
+def test_full_event(apigw_event, mocker):
+
+    mocker.patch.dict(os.environ, {'EVENT_PROJECTION': 'ALL'})
+
+    assert projection.project_event(apigw_event) is apigw_event
+
+def test_compressed_raw_event(apigw_event):
+
+    compressed = projection.compress_event(apigw_event)
+
+    assert len(compressed) < len(json.dumps(apigw_event))
+    assert projection.decompress_event(compressed) == apigw_event
@@ -0,0 +1,93 @@
+import os
+
+from src.form_data_collect import app, query
+
+class FakeTable:
+    """ pages of 2 items per partition key """
+
+    def __init__(self, items):
+        self.items = items
+        self.calls = []
+
+    def query(self, **kwargs):
+        self.calls.append(kwargs)
+        pk = kwargs['ExpressionAttributeValues'][':pk']
+        items = sorted((i for i in self.items if i['pk'] == pk), key=lambda i: i['sk'])
+        start = kwargs.get('ExclusiveStartKey', { 'index': 0 })['index']
+        response = { 'Items': items[start:start + 2] }
+        if start + 2 < len(items):
+            response['LastEvaluatedKey'] = { 'index': start + 2 }
+        return response
+
+def test_query_page_not_sharded():
+
+    table = FakeTable([ { 'pk': 'page', 'sk': f'user{i}' } for i in range(5) ] + [ { 'pk': 'other', 'sk': 'x' } ])
+
+    items = query.query_page(table, 'page', shard_count=1, ProjectionExpression='pk, sk')
+
+    assert [ i['sk'] for i in items ] == [ f'user{i}' for i in range(5) ]
+    assert len(table.calls) == 3
+    assert all(c['ProjectionExpression'] == 'pk, sk' for c in table.calls)
+
+def test_query_page_merges_shards():
+
+    items = [ { 'pk': f'page#{i % 4}', 'sk': f'user{i:02}' } for i in range(20) ]
+    table = FakeTable(items)
+
+    result = query.query_page(table, 'page', shard_count=4)
+
+    assert [ i['sk'] for i in result ] == [ f'user{i:02}' for i in range(20) ]
+    assert { c['ExpressionAttributeValues'][':pk'] for c in table.calls } == { 'page#0', 'page#1', 'page#2', 'page#3' }
+
+def test_sharded_writes_read_back(mocker):
+
+    # DynamoDB Local
+    mocker.patch.dict(os.environ, { 'SHARD_COUNT': '4', 'SHARDED_PAGES': 'test.sharded_page' })
+    app.reset_cache()
+    emails = [ f'user{i}@example.com' for i in range(20) ]
+    for email in emails:
+        app.write_data('nata-data-collection-form', {}, { 'pk': 'test.sharded_page', 'sk': 'email', 'email': email })
+
+    items = query.query_page(app.dynamodb_table('nata-data-collection-form'), 'test.sharded_page')
+
+    assert sorted(i['sk'] for i in items) == sorted(emails)
+    assert len({ i['pk'] for i in items }) == 4
+
+class FakeIndex:
+
+    def __init__(self, items):
+        self.items = items
+        self.calls = []
+
+    def query(self, **kwargs):
+        self.calls.append(kwargs)
+        values = kwargs['ExpressionAttributeValues']
+        until = values.get(':until', float('inf'))
+        items = sorted((i for i in self.items if i['pk'] == values[':pk'] and values[':since'] <= i['created_at'] <= until),
+                       key=lambda i: i['created_at'])
+        return { 'Items': items }
+
+def test_query_since_merges_shards_by_time():
+
+    items = [ { 'pk': f'page#{i % 3}', 'sk': f'user{i}', 'created_at': 1000 + i } for i in range(30) ]
+    table = FakeIndex(items)
+
+    result = query.query_since(table, 'page', 1010, until=1020, shard_count=3)
+
+    assert [ i['created_at'] for i in result ] == list(range(1010, 1020))
+    assert all(c['IndexName'] == query.CREATED_AT_INDEX for c in table.calls)
+    assert 'BETWEEN' in table.calls[0]['KeyConditionExpression']
+
+def test_query_since_dynamodb(mocker):
+
+    # DynamoDB Local, with the created_at index of create_table.sh
+    app.reset_cache()
+    now = mocker.patch.object(app, 'now')
+    for i in range(10):
+        now.return_value = 1603709000 + i * 60
+        app.write_data('nata-data-collection-form', {}, { 'pk': 'test.since_page', 'sk': 'email', 'email': f'user{i}@example.com', 'name': f'user {i}' })
+
+    items = query.query_since(app.dynamodb_table('nata-data-collection-form'), 'test.since_page', 1603709000 + 7 * 60)
+
+    assert [ i['email'] for i in items ] == [ 'user7@example.com', 'user8@example.com', 'user9@example.com' ]
+    assert 'event' not in items[0]
@@ -0,0 +1,167 @@
+import os
+import json
+import pytest
+from botocore.exceptions import ClientError
+
+from src.form_data_collect import app, formparser, ratelimit
+from src.form_data_collect.ratelimit import TokenBuckets, SharedCounter, RateLimiter
+
+EVENTS = os.path.join(os.path.dirname(__file__), '..', 'events')
+
+class Clock:
+    def __init__(self, value=0.0):
+        self.value = value
+    def __call__(self):
+        return self.value
+
+@pytest.fixture()
+def apigw_event():
+    with open(os.path.join(EVENTS, 'event-api.json')) as f:
+        return json.load(f)
+
+@pytest.fixture()
+def limited(mocker):
+    mocker.patch.dict(os.environ, { 'TABLE_NAME': 'nata-data-collection-form', 'RATE_LIMIT_MODE': 'local',
+                                    'RATE_LIMIT_IP_RATE': '1', 'RATE_LIMIT_IP_BURST': '2' })
+    ratelimit.reset()
+    table = mocker.patch.object(app, 'dynamodb_table').return_value
+    table.put_item.return_value = {}
+    yield table
+    ratelimit.reset()
+
+def test_token_bucket():
+
+    clock = Clock()
+    buckets = TokenBuckets(rate=2, burst=3, clock=clock)
+
+    assert [ buckets.acquire('a') for _ in range(3) ] == [ 0, 0, 0 ]
+    assert buckets.acquire('a') == pytest.approx(0.5)
+    # other keys have their own bucket
+    assert buckets.acquire('b') == 0
+    clock.value = 0.5
+    assert buckets.acquire('a') == 0
+    # refilled up to the burst only
+    clock.value = 100
+    assert [ buckets.acquire('a') for _ in range(4) ][-1] > 0
+
+def test_token_bucket_forgets_old_keys():
+
+    buckets = TokenBuckets(rate=1, burst=1, max_keys=2, clock=Clock())
+    for key in 'abc':
+        buckets.acquire(key)
+
+    assert list(buckets.buckets) == [ 'b', 'c' ]
+    # a forgotten key starts again with a full bucket
+    assert buckets.acquire('a') == 0
+
+def test_shared_counter(mocker):
+
+    table = mocker.Mock()
+    counter = SharedCounter(table, limit=10, window=60, clock=Clock(130))
+
+    assert counter.acquire('ip#1.2.3.4') == 0
+    kwargs = table.update_item.call_args.kwargs
+    assert kwargs['Key'] == { 'pk': 'ip#1.2.3.4#120' }
+    assert kwargs['ExpressionAttributeValues'] == { ':cost': 1, ':last': 9, ':expires': 240 }
+
+    table.update_item.side_effect = ClientError({ 'Error': { 'Code': 'ConditionalCheckFailedException' } }, 'UpdateItem')
+    assert counter.acquire('ip#1.2.3.4') == 50
+
+def test_shared_counter_fails_open(mocker):
+
+    table = mocker.Mock()
+    table.update_item.side_effect = ClientError({ 'Error': { 'Code': 'ProvisionedThroughputExceededException' } }, 'UpdateItem')
+
+    assert SharedCounter(table, limit=10).acquire('ip#1.2.3.4') == 0
+
+def test_shared_counter_only_sees_allowed_requests(mocker):
+
+    shared = mocker.Mock()
+    shared.acquire.return_value = 0
+    limiter = RateLimiter(TokenBuckets(rate=1, burst=2, clock=Clock()), shared)
+
+    waits = [ limiter.acquire('k') for _ in range(5) ]
+
+    assert waits[:2] == [ 0, 0 ] and all(waits[2:])
+    assert shared.acquire.call_count == 2
+
+def test_off_by_default(apigw_event, mocker):
+
+    mocker.patch.dict(os.environ, { 'TABLE_NAME': 'nata-data-collection-form' })
+    os.environ.pop('RATE_LIMIT_MODE', None)
+    table = mocker.patch.object(app, 'dynamodb_table').return_value
+    table.put_item.return_value = {}
+
+    statuses = [ app.lambda_handler(apigw_event, "")['statusCode'] for _ in range(10) ]
+
+    assert statuses == [ 200 ] * 10
+
+def test_source_ip_limited_before_decoding(apigw_event, limited, mocker):
+
+    decode = mocker.spy(formparser, 'decode_body')
+
+    statuses = [ app.lambda_handler(apigw_event, "")['statusCode'] for _ in range(3) ]
+
+    assert statuses == [ 200, 200, 429 ]
+    assert decode.call_count == 2
+    assert limited.put_item.call_count == 2
+    ret = app.lambda_handler(apigw_event, "")
+    assert ret['headers']['Retry-After'] == '1'
+    assert 'error' in json.loads(ret['body'])
+
+    # another source is not limited
+    apigw_event['requestContext']['http']['sourceIp'] = '10.0.0.1'
+    assert app.lambda_handler(apigw_event, "")['statusCode'] == 200
+
+def test_page_limited_after_parsing(apigw_event, limited, mocker):
+
+    mocker.patch.dict(os.environ, { 'RATE_LIMIT_IP_BURST': '100', 'RATE_LIMIT_PAGE_RATE': '0.01', 'RATE_LIMIT_PAGE_BURST': '1' })
+
+    first = app.lambda_handler(apigw_event, "")
+    second = app.lambda_handler(apigw_event, "")
+
+    assert (first['statusCode'], second['statusCode']) == (200, 429)
+    assert int(second['headers']['Retry-After']) == 100
+    assert limited.put_item.call_count == 1
+
+def test_dynamodb_mode(apigw_event, limited, mocker):
+
+    mocker.patch.dict(os.environ, { 'RATE_LIMIT_MODE': 'dynamodb', 'RATE_LIMIT_TABLE_NAME': 'rate-limit' })
+    shared = mocker.patch.object(app, 'rate_limit_table').return_value
+    shared.update_item.side_effect = [ {}, {}, ClientError({ 'Error': { 'Code': 'ConditionalCheckFailedException' } }, 'UpdateItem') ]
+
+    ret = app.lambda_handler(apigw_event, "")
+    assert ret['statusCode'] == 200
+    # the source IP and the page
+    assert [ c.kwargs['Key']['pk'].split('#')[0] for c in shared.update_item.call_args_list ] == [ 'ip', 'page' ]
+
+    # the shared counter of another container's requests is full
+    assert app.lambda_handler(apigw_event, "")['statusCode'] == 429
+    app.rate_limit_table.assert_any_call('rate-limit')
+    limited.update_item.assert_not_called()
+
+def test_rate_limit_table_timeouts(mocker):
+
+    create_client = mocker.patch.object(app.dynamodb, 'create_client')
+    app.reset_cache()
+
+    app.rate_limit_table('rate-limit')
+
+    config = create_client.call_args.args[2]
+    assert (config.connect_timeout, config.read_timeout) == (0.2, 0.3)
+    assert config.retries['total_max_attempts'] == 1
+    app.reset_cache()
+
+@pytest.mark.parametrize('environment', [
+    { 'RATE_LIMIT_MODE': 'dynamodb' },
+    { 'RATE_LIMIT_MODE': 'dynamodb', 'RATE_LIMIT_TABLE_NAME': '' },
+    { 'RATE_LIMIT_MODE': 'shared' },
+])
+def test_invalid_configuration(apigw_event, limited, mocker, environment):
+
+    os.environ.pop('RATE_LIMIT_TABLE_NAME', None)
+    mocker.patch.dict(os.environ, environment)
+
+    with pytest.raises(ValueError):
+        app.lambda_handler(apigw_event, "")
+    limited.put_item.assert_not_called()
@@ -0,0 +1,176 @@
+import os
+import json
+import gzip
+import copy
+import pytest
+
+from src.database_stream import app, archive
+from src.database_stream.archive import Archive, LocalStore
+from src.form_data_collect import app as collect
+from src.form_data_collect import retention
+
+EVENTS = os.path.join(os.path.dirname(__file__), '..', 'events')
+TOPIC = 'arn:aws:sns:eu-central-1:401955065246:DataCollectionTopic'
+CREATED_AT = 1603709167
+
+def expired_record(record, sequence_number, **image):
+    """ the REMOVE record the table TTL makes of an INSERT record """
+    old = dict(record['dynamodb']['NewImage'], **{ k: { 'S': v } for k, v in image.items() })
+    result = copy.deepcopy(record)
+    result['eventName'] = 'REMOVE'
+    result['userIdentity'] = dict(archive.TTL_IDENTITY)
+    result['dynamodb'] = {
+        'ApproximateCreationDateTime': CREATED_AT + 86400,
+        'Keys': { 'pk': old['pk'], 'sk': old['sk'] },
+        'OldImage': old,
+        'SequenceNumber': sequence_number,
+    }
+    return result
+
+@pytest.fixture()
+def records():
+    with open(os.path.join(EVENTS, 'event-streaming-multiple.json')) as f:
+        inserts = [ r for r in json.load(f)['Records'] if r['eventName'] == 'INSERT' ]
+    return inserts + [ expired_record(inserts[0], '3133900000000004608185901'),
+                       expired_record(inserts[1], '3133900000000004608185902', message='bonjour') ]
+
+@pytest.fixture()
+def environment(mocker, tmp_path):
+    mocker.patch.dict(os.environ, { 'SNS_TOPIC_ARN': TOPIC, 'STREAM_FILTER': json.dumps([
+        { 'eventName': [ 'INSERT' ] },
+        { 'eventName': [ 'REMOVE' ], 'userIdentity': { 'type': [ 'Service' ], 'principalId': [ 'dynamodb.amazonaws.com' ] } },
+    ]), 'ARCHIVE_MODE': 'local', 'ARCHIVE_DIRECTORY': str(tmp_path) })
+    app.reset_cache()
+    yield tmp_path
+    app.reset_cache()
+
+def read(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return [ json.loads(line) for line in f ]
+
+def test_expires_at(mocker):
+
+    mocker.patch.dict(os.environ, { 'RETENTION_DAYS': '30', 'RETENTION_POLICY': json.dumps({ 'nata.coach.webinar': 0, 'nata.coach.contact': 365, 'promo#2024': 7 }) })
+
+    assert retention.expires_at('nata.coach.landing_page', CREATED_AT) == CREATED_AT + 30 * 86400
+    assert retention.expires_at('promo#2024', CREATED_AT) == CREATED_AT + 7 * 86400
+    mocker.patch.dict(os.environ, { 'SHARD_COUNT': '4' })
+    assert retention.expires_at('nata.coach.contact#2', CREATED_AT) == CREATED_AT + 365 * 86400
+    assert retention.expires_at('nata.coach.webinar', CREATED_AT) is None
+    mocker.patch.dict(os.environ, { 'RETENTION_DAYS': '0', 'RETENTION_POLICY': '' })
+    assert retention.expires_at('nata.coach.landing_page', CREATED_AT) is None
+
+def test_prepare_item(mocker):
+
+    mocker.patch.dict(os.environ, { 'RETENTION_DAYS': '730' })
+    mocker.patch.object(collect, 'now', return_value=CREATED_AT)
+    with open(os.path.join(EVENTS, 'event-api.json')) as f:
+        event = json.load(f)
+
+    item = collect.prepare_item(event, { 'pk': 'nata.coach.landing_page', 'sk': 'email', 'email': 'seb@example.com', 'expires_at': 1 })
+    assert item['expires_at'] == CREATED_AT + 730 * 86400
+
+    # the submission does not decide when its item is deleted
+    mocker.patch.dict(os.environ, { 'RETENTION_DAYS': '0' })
+    item = collect.prepare_item(event, { 'pk': 'nata.coach.landing_page', 'sk': 'email', 'email': 'seb@example.com', 'expires_at': 1 })
+    assert 'expires_at' not in item
+
+def test_is_expiry(records):
+
+    assert [ archive.is_expiry(r) for r in records ] == [ False, False, True, True ]
+    deleted = dict(records[2], userIdentity=None)
+    assert not archive.is_expiry(deleted)
+
+def test_archive_parts(records, tmp_path):
+
+    expired = [ expired_record(records[0], str(3133900000000004608186000 + i), message='x' * 100) for i in range(10) ]
+    size = len(archive.line(expired[0]).encode('utf-8'))
+
+    keys = Archive(LocalStore(str(tmp_path)), max_bytes=size * 4).write(expired)
+
+    assert keys == [ f'expired/2020/10/27/3133900000000004608186000-3133900000000004608186009-{part:04d}.jsonl.gz' for part in range(3) ]
+    lines = [ line for key in keys for line in read(tmp_path / key) ]
+    assert [ line['sequence_number'] for line in lines ] == [ r['dynamodb']['SequenceNumber'] for r in expired ]
+    assert lines[0]['item']['message'] == 'x' * 100
+    assert lines[0]['deleted_at'] == CREATED_AT + 86400
+    assert not list(tmp_path.rglob('*.tmp'))
+
+def test_handler_archives_expired_items(records, environment, mocker):
+
+    client = mocker.patch.object(app, 'sns_client').return_value
+
+    ret = app.lambda_handler({ 'Records': records }, "")
+
+    assert ret['status'] == 'OK'
+    assert ret['messages'] == 2
+    assert ret['archived'] == 2
+    # the expired items are not notified
+    assert client.publish.call_count == 1
+    path, = environment.rglob('*.jsonl.gz')
+    lines = read(path)
+    assert [ line['item']['sk'] for line in lines ] == [ records[2]['dynamodb']['Keys']['sk']['S'], records[3]['dynamodb']['Keys']['sk']['S'] ]
+    assert lines[1]['item']['message'] == 'bonjour'
+
+def test_handler_archive_off(records, environment, mocker):
+
+    mocker.patch.dict(os.environ, { 'ARCHIVE_MODE': 'off' })
+    mocker.patch.object(app, 'sns_client')
+
+    ret = app.lambda_handler({ 'Records': records }, "")
+
+    assert ret['status'] == 'OK'
+    assert ret['archived'] == 0
+    assert not list(environment.rglob('*.jsonl.gz'))
+
+def test_archive_failure_retries(records, environment, mocker):
+
+    client = mocker.patch.object(app, 'sns_client').return_value
+    mocker.patch.object(LocalStore, 'put', side_effect=OSError('disk full'))
+
+    ret = app.lambda_handler({ 'Records': records[2:] + records[:2] }, "")
+
+    assert 'ERROR' in ret['status']
+    # the retry starts at the first expired record, the inserts after it are notified again
+    assert ret['batchItemFailures'] == [ { 'itemIdentifier': records[2]['dynamodb']['SequenceNumber'] } ]
+    client.publish.assert_called_once()
+
+def test_delivery_failure_archives_before_the_retry_point(records, environment, mocker):
+
+    webinar_topic = 'arn:aws:sns:eu-central-1:401955065246:Webinar'
+    def publish(TopicArn, **kwargs):
+        if TopicArn == webinar_topic:
+            raise RuntimeError('throttled')
+    client = mocker.patch.object(app, 'sns_client').return_value
+    client.publish.side_effect = publish
+    mocker.patch.dict(os.environ, { 'NOTIFICATION_ROUTES': json.dumps({
+        'nata.coach.webinar': [ { 'type': 'sns', 'topic_arn': webinar_topic } ],
+    }) })
+    webinar = copy.deepcopy(records[1])
+    webinar['dynamodb']['NewImage']['pk'] = { 'S': 'nata.coach.webinar' }
+    webinar['dynamodb']['SequenceNumber'] = '3133900000000004608185999'
+    batch = [ records[0], records[2], webinar, records[3] ]
+
+    ret = app.lambda_handler({ 'Records': batch }, "")
+
+    # the webinar is retried, the expired record before it is archived, the one after it comes back with the retry
+    assert ret['batchItemFailures'] == [ { 'itemIdentifier': webinar['dynamodb']['SequenceNumber'] } ]
+    path, = environment.rglob('*.jsonl.gz')
+    assert [ line['sequence_number'] for line in read(path) ] == [ records[2]['dynamodb']['SequenceNumber'] ]
+
+    # the retry archives the other one under its own name
+    client.publish.side_effect = None
+    ret = app.lambda_handler({ 'Records': batch[2:] }, "")
+    assert ret['status'] == 'OK'
+    assert sorted(line['sequence_number'] for path in environment.rglob('*.jsonl.gz') for line in read(path)) == \
+        [ records[2]['dynamodb']['SequenceNumber'], records[3]['dynamodb']['SequenceNumber'] ]
+
+def test_retried_batch_overwrites_its_archive(records, environment, mocker):
+
+    mocker.patch.object(app, 'sns_client')
+
+    # a retry starting earlier in the shard archives the same expired records under the same name
+    app.lambda_handler({ 'Records': records[2:] }, "")
+    app.lambda_handler({ 'Records': records }, "")
+
+    path, = environment.rglob('*.jsonl.gz')
+    assert len(read(path)) == 2
@@ -0,0 +1,129 @@
+import os
+import json
+import time
+import pytest
+from botocore.exceptions import ClientError, EndpointConnectionError
+
+from tests.standins import DynamoDBStandIn
+from src.form_data_collect import app, retry
+
+def throttled():
+    return ClientError({ 'Error': { 'Code': 'ProvisionedThroughputExceededException' } }, 'PutItem')
+
+class Clock:
+    def __init__(self):
+        self.value = 0.0
+    def __call__(self):
+        return self.value
+
+class LambdaContext:
+    def __init__(self, remaining_ms):
+        self.end = time.monotonic() + remaining_ms / 1000.0
+    def get_remaining_time_in_millis(self):
+        return int((self.end - time.monotonic()) * 1000)
+
+def test_call_retries_retryable_errors(mocker):
+
+    sleep = mocker.patch.object(retry, 'sleep')
+    fn = mocker.Mock(side_effect=[ throttled(), EndpointConnectionError(endpoint_url='http://dynamodb'), 'ok' ])
+
+    assert retry.call(fn, max_attempts=3) == 'ok'
+    assert sleep.call_count == 2
+
+def test_call_does_not_retry_other_errors(mocker):
+
+    fn = mocker.Mock(side_effect=ClientError({ 'Error': { 'Code': 'ValidationException' } }, 'PutItem'))
+
+    with pytest.raises(ClientError):
+        retry.call(fn)
+    assert fn.call_count == 1
+
+def test_call_gives_up(mocker):
+
+    mocker.patch.object(retry, 'sleep')
+    fn = mocker.Mock(side_effect=throttled())
+
+    with pytest.raises(retry.Unavailable):
+        retry.call(fn, max_attempts=4)
+    assert fn.call_count == 4
+
+def test_call_respects_deadline(mocker):
+
+    clock = Clock()
+    mocker.patch.object(retry, 'sleep', side_effect=lambda s: setattr(clock, 'value', clock.value + s))
+    def fn():
+        clock.value += 1.0
+        raise throttled()
+    calls = mocker.Mock(side_effect=fn)
+
+    # each attempt may take 1.5 secs, only the first one fits
+    with pytest.raises(retry.Unavailable):
+        retry.call(calls, deadline=2.4, max_attempts=5, attempt_budget=1.5, clock=clock)
+    assert calls.call_count == 1
+
+    # no time at all, nothing is attempted
+    with pytest.raises(retry.Unavailable):
+        retry.call(calls, deadline=1.0, attempt_budget=1.5, clock=clock)
+    assert calls.call_count == 1
+
+def test_deadline():
+
+    assert retry.deadline("") is None
+    assert retry.deadline(LambdaContext(3000), margin_ms=300, clock=lambda: 10.0) == pytest.approx(12.7, abs=0.05)
+
+@pytest.fixture()
+def post_event():
+    return {
+        'routeKey': 'POST /form',
+        'headers': { 'content-type': 'application/x-www-form-urlencoded' },
+        'isBase64Encoded': False,
+        'body': 'pk=test.retry_page&sk=email&name=seb&email=seb%40stormacq.com'
+    }
+
+def stand_in_env(mocker, stand_in, **extra):
+    mocker.patch.dict(os.environ, dict({
+        'TABLE_NAME': 'nata-data-collection-form',
+        'DYNAMODB_ENDPOINT_URL': stand_in.endpoint,
+        'DYNAMODB_CONNECT_TIMEOUT': '0.2',
+        'DYNAMODB_READ_TIMEOUT': '0.2',
+    }, **extra))
+    app.reset_cache()
+
+def test_handler_recovers_from_faults(post_event, mocker):
+
+    with DynamoDBStandIn([ 'throttle', 'error', 'drop' ]) as stand_in:
+        stand_in_env(mocker, stand_in, DYNAMODB_MAX_ATTEMPTS='4')
+        ret = app.lambda_handler(post_event, LambdaContext(3000))
+
+    app.reset_cache()
+    assert ret['statusCode'] == 200
+    assert [ fault for _, fault in stand_in.requests ] == [ 'throttle', 'error', 'drop', None ]
+
+def test_handler_answers_503_before_the_deadline(post_event, mocker):
+
+    with DynamoDBStandIn(default='slow', latency=1.0) as stand_in:
+        stand_in_env(mocker, stand_in, DYNAMODB_MAX_ATTEMPTS='10')
+        start = time.monotonic()
+        ret = app.lambda_handler(post_event, LambdaContext(1000))
+        elapsed = time.monotonic() - start
+
+    app.reset_cache()
+    assert ret['statusCode'] == 503
+    assert ret['headers']['Retry-After'] == '1'
+    assert 'error' in json.loads(ret['body'])
+    # 0.4 secs per attempt, 0.3 secs margin: 1 attempt, maybe 2, never the Lambda timeout
+    assert elapsed < 0.7
+    assert 1 <= len(stand_in.requests) <= 2
+
+def test_bulk_handler_reports_unavailable_items(post_event, mocker):
+
+    post_event['routeKey'] = 'POST /form/bulk'
+    with DynamoDBStandIn(default='error') as stand_in:
+        stand_in_env(mocker, stand_in)
+        mocker.patch.object(retry, 'sleep')
+        ret = app.lambda_handler(post_event, LambdaContext(3000))
+
+    app.reset_cache()
+    assert ret['statusCode'] == 200
+    assert [ i['status'] for i in json.loads(ret['body'])['items'] ] == [ 'FAILED' ]
+    assert len(stand_in.requests) == 3
@@ -0,0 +1,124 @@
+import json
+import pytest
+
+from src.form_data_collect import schema
+
+SCHEMAS = {
+    'page': {
+        'sk': 'email',
+        'fields': {
+            'name': { 'type': 'string', 'max_length': 10 },
+            'email': { 'type': 'email', 'required': True },
+            'age': { 'type': 'integer', 'min': 18 },
+            'topic': { 'enum': [ 'coaching', 'nutrition' ] },
+            'newsletter': { 'type': 'boolean' }
+        }
+    },
+    'loose': { 'strip_unknown': False }
+}
+
+class Clock:
+    def __init__(self):
+        self.value = 0
+    def __call__(self):
+        return self.value
+
+def registry(loader=lambda: SCHEMAS, **kwargs):
+    return schema.SchemaRegistry(loader, **kwargs)
+
+def test_valid_submission_is_converted_and_stripped():
+
+    data = { 'pk': 'page', 'sk': 'name', 'name': 'seb', 'email': ' seb@stormacq.com ', 'age': '42', 'newsletter': 'on', 'utm_junk': 'x' * 1000 }
+
+    assert registry().validate(data) == {
+        'pk': 'page', 'sk': 'email', 'name': 'seb', 'email': 'seb@stormacq.com', 'age': 42, 'newsletter': True
+    }
+
+def test_invalid_submission():
+
+    data = { 'pk': 'page', 'name': 'x' * 11, 'email': 'seb', 'age': '12', 'topic': 'other' }
+
+    with pytest.raises(schema.ValidationError) as e:
+        registry().validate(data)
+    assert len(e.value.errors) == 4
+
+def test_non_finite_numbers():
+
+    validator = schema.Validator({ 'sk': 'email', 'fields': { 'score': { 'type': 'number', 'min': 0, 'max': 10 }, 'age': { 'type': 'integer' } } })
+
+    for value in ('nan', 'inf', '-Infinity', float('nan'), float('inf')):
+        with pytest.raises(schema.ValidationError, match='score must be a number'):
+            validator.validate({ 'pk': 'page', 'email': 'a@b.c', 'score': value })
+        with pytest.raises(schema.ValidationError, match='age must be an integer'):
+            validator.validate({ 'pk': 'page', 'email': 'a@b.c', 'age': value })
+    assert validator.validate({ 'pk': 'page', 'email': 'a@b.c', 'score': '2.5' })['score'] == 2.5
+
+def test_missing_sort_key():
+
+    with pytest.raises(schema.ValidationError, match='email is required'):
+        schema.check_keys({ 'pk': 'other', 'sk': 'email', 'name': 'seb' })
+    with pytest.raises(schema.ValidationError, match='email is required'):
+        registry().validate({ 'pk': 'page', 'name': 'seb' })
+
+def test_key_types():
+
+    for data in ({ 'pk': 5, 'sk': 'email', 'email': 'a@b.c' },
+                 { 'pk': 'other', 'sk': 'age', 'age': 3 },
+                 { 'pk': 'other', 'sk': 'x', 'x': None },
+                 { 'pk': 'other', 'sk': { 'a': 1 }, 'email': 'a@b.c' },
+                 { 'pk': 'other', 'sk': 'x', 'x': [ 'a' ] }):
+        with pytest.raises(schema.ValidationError, match='must be a non empty string'):
+            schema.check_keys(data)
+    with pytest.raises(schema.ValidationError, match='pk must be a non empty string'):
+        registry().validate({ 'pk': { 'a': 1 }, 'sk': 'email', 'email': 'a@b.c' })
+
+def test_unknown_forms():
+
+    data = { 'pk': 'other', 'sk': 'email', 'email': 'seb@stormacq.com', 'x': '1' }
+
+    assert registry().validate(data) == data
+    assert registry().validate(dict(data, pk='loose')) == dict(data, pk='loose')
+    with pytest.raises(schema.ValidationError):
+        registry(reject_unknown_forms=True).validate(data)
+
+def test_ttl_refresh():
+
+    clock = Clock()
+    loads = []
+    def loader():
+        loads.append(clock.value)
+        if len(loads) == 3:
+            raise IOError('unavailable')
+        return SCHEMAS
+    schemas = registry(loader, ttl=60, clock=clock)
+
+    for clock.value in (0, 30, 59, 60, 100, 120, 150):
+        schemas.validate({ 'pk': 'page', 'email': 'seb@stormacq.com' })
+
+    # a failed reload keeps the previous validators until the next TTL
+    assert loads == [ 0, 60, 120 ]
+
+def test_file_and_dynamodb_loaders(tmp_path, mocker):
+
+    path = tmp_path / 'schemas.json'
+    path.write_text(json.dumps(SCHEMAS))
+    assert schema.file_loader(str(path))() == SCHEMAS
+
+    table = mocker.Mock()
+    table.get_item.return_value = { 'Item': { 'pk': 'config', 'sk': 'schemas', 'schemas': json.dumps(SCHEMAS) } }
+    assert schema.dynamodb_loader(table, { 'pk': 'config', 'sk': 'schemas' })() == SCHEMAS
+
+def test_config_item_is_reserved():
+
+    loader = lambda: pytest.fail('the schemas are not loaded for a reserved pk')
+
+    with pytest.raises(schema.ValidationError, match='reserved'):
+        registry(loader, reserved_pk='config').validate({ 'pk': 'config', 'sk': 'x', 'x': 'schemas', 'schemas': '{}' })
+
+def test_bundled_schemas():
+
+    validators = schema.compile_schemas(json.load(open(schema.os.path.join(schema.os.path.dirname(schema.__file__), 'schemas.json'))))
+
+    assert validators['nata.coach.landing_page'].validate(
+        { 'pk': 'nata.coach.landing_page', 'sk': 'email', 'name': 'seb', 'email': 'seb@stormacq.com' }
+    ) == { 'pk': 'nata.coach.landing_page', 'sk': 'email', 'name': 'seb', 'email': 'seb@stormacq.com' }
@@ -0,0 +1,34 @@
+from common import sharding
+
+def test_shard_is_stable_per_sort_key():
+
+    pks = { sharding.shard_pk('page', f'user{i}@example.com', 8) for i in range(200) }
+
+    assert pks == set(sharding.shard_pks('page', 8))
+    assert sharding.shard_pk('page', 'seb@stormacq.com', 8) == sharding.shard_pk('page', 'seb@stormacq.com', 8)
+
+def test_base_pk(mocker):
+
+    mocker.patch.dict('os.environ', { 'SHARD_COUNT': '4' })
+    assert sharding.base_pk('nata.coach.landing_page#3') == 'nata.coach.landing_page'
+    assert sharding.base_pk('nata.coach.landing_page') == 'nata.coach.landing_page'
+    assert sharding.base_pk('page#draft') == 'page#draft'
+    assert sharding.base_pk('promo#2024') == 'promo#2024'
+
+    # only the pks of sharded pages have a shard suffix
+    mocker.patch.dict('os.environ', { 'SHARDED_PAGES': 'viral' })
+    assert sharding.base_pk('viral#3') == 'viral'
+    assert sharding.base_pk('promo#3') == 'promo#3'
+    mocker.patch.dict('os.environ', { 'SHARD_COUNT': '1' })
+    assert sharding.base_pk('viral#3') == 'viral#3'
+
+def test_opt_in(mocker):
+
+    assert not sharding.is_sharded('page')
+
+    mocker.patch.dict('os.environ', { 'SHARD_COUNT': '4' })
+    assert sharding.is_sharded('page')
+
+    mocker.patch.dict('os.environ', { 'SHARDED_PAGES': 'viral, other' })
+    assert sharding.is_sharded('viral')
+    assert not sharding.is_sharded('page')
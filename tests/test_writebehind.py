@@ -0,0 +1,68 @@
+import pytest
+
+from src.form_data_collect import writebehind, consumer
+
+class FakeResource:
+    def __init__(self):
+        self.calls = []
+    def batch_write_item(self, RequestItems):
+        self.calls.append(RequestItems)
+        return { 'UnprocessedItems': {} }
+
+@pytest.fixture()
+def resource(mocker):
+    resource = FakeResource()
+    mocker.patch.object(consumer.app, 'dynamodb_resource', return_value=resource)
+    return resource
+
+def test_encode_decode():
+
+    item = { 'pk': 'page', 'sk': 'seb@stormacq.com', 'created_at': 1, 'raw_event': b'\x00\x01', 'event': { 'a': [1] } }
+
+    assert writebehind.decode_item(writebehind.encode_item(item)) == item
+
+def test_drain_local_queue(resource):
+
+    queue = writebehind.LocalQueue()
+    for i in range(30):
+        queue.send({ 'pk': 'page', 'sk': f'user{i}@example.com' })
+
+    assert consumer.drain(queue, 'table') == (30, 0)
+    assert len(queue) == 0
+    assert [ len(c['table']) for c in resource.calls ] == [25, 5]
+
+def test_sqs_handler(resource, mocker):
+
+    mocker.patch.dict('os.environ', { 'TABLE_NAME': 'table' })
+    records = [
+        { 'messageId': 'm1', 'body': writebehind.encode_item({ 'pk': 'page', 'sk': 'a', 'name': 'first' }) },
+        { 'messageId': 'm2', 'body': 'not json' },
+        { 'messageId': 'm3', 'body': writebehind.encode_item({ 'pk': 'page', 'sk': 'a', 'name': 'second' }) },
+    ]
+
+    ret = consumer.lambda_handler({ 'Records': records }, None)
+
+    assert ret == { 'batchItemFailures': [ { 'itemIdentifier': 'm2' } ] }
+    written = resource.calls[0]['table']
+    assert [ r['PutRequest']['Item']['name'] for r in written ] == ['second']
+
+def test_sqs_handler_unavailable(mocker):
+
+    from botocore.exceptions import ClientError
+
+    mocker.patch.dict('os.environ', { 'TABLE_NAME': 'table' })
+    mocker.patch.object(consumer.retry, 'sleep')
+    resource = mocker.patch.object(consumer.app, 'dynamodb_resource').return_value
+    resource.batch_write_item.side_effect = ClientError({ 'Error': { 'Code': 'ThrottlingException' } }, 'BatchWriteItem')
+    records = [ { 'messageId': f'm{i}', 'body': writebehind.encode_item({ 'pk': 'page', 'sk': f'user{i}' }) } for i in range(30) ]
+
+    ret = consumer.lambda_handler({ 'Records': records }, None)
+
+    # every message is redelivered, no exception fails the invocation
+    assert ret == { 'batchItemFailures': [ { 'itemIdentifier': f'm{i}' } for i in range(30) ] }
+
+def test_write_items_unavailable(resource, mocker):
+
+    mocker.patch.object(consumer.bulk, 'batch_write', side_effect=consumer.retry.Unavailable('down'))
+
+    assert consumer.write_items('table', [ writebehind.encode_item({ 'pk': 'page', 'sk': 'a' }), 'not json' ]) == [ 0, 1 ]